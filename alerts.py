@@ -0,0 +1,193 @@
+"""
+Bounded alert dispatcher.
+
+Alert side effects (sound, saving the image, email, database rows) run on a
+fixed pool of worker threads per channel, fed by bounded queues, so a burst
+of detections can neither spawn unbounded threads nor stall the camera loop.
+When a channel's queue is full its drop policy decides what happens:
+
+- 'drop_newest': the incoming alert is dropped for that channel
+- 'drop_oldest': the oldest queued alert is evicted to make room
+- 'block':       wait up to `block_timeout` seconds for room (backpressure), then drop
+
+Each channel keeps counters for submitted/completed/failed/dropped alerts,
+its queue depth and the latency from dispatch to handler completion.
+"""
+
+import itertools
+import queue
+import threading
+import time
+
+
+class Alert:
+    """One alert and everything its side effects need."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, label, confidence, camera, user_id, frame=None, track_id=None):
+        self.alert_id = next(self._ids)
+        self.label = label
+        self.confidence = confidence
+        self.camera_id = camera['id']
+        self.location = camera['location']
+        self.user_id = user_id
+        self.frame = frame
+        self.track_id = track_id
+        self.created_at = time.time()
+        self.image_path = None
+        # Encoded JPEG (imagestore.DetectionImage) shared by the disk writer, email and viewers
+        self.image = None
+        # Set once the image channel has finished with this alert (saved or not)
+        self.image_ready = threading.Event()
+
+
+class AlertChannel:
+    """A bounded queue drained by a fixed number of worker threads."""
+
+    POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+    def __init__(self, name, handler, workers=1, queue_size=16, drop_policy='drop_newest',
+                 block_timeout=0.05, on_drop=None):
+        if drop_policy not in self.POLICIES:
+            raise ValueError(f"Unknown drop policy for channel '{name}': {drop_policy}")
+        self.name = name
+        self.handler = handler
+        self.on_drop = on_drop
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.counters = {'submitted': 0, 'completed': 0, 'failed': 0, 'dropped': 0}
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'alert-{name}-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def submit(self, alert):
+        """Queue an alert; returns False if it was dropped."""
+        self._count('submitted')
+        try:
+            if self.drop_policy == 'block':
+                self._queue.put(alert, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            pass
+
+        if self.drop_policy == 'drop_oldest':
+            try:
+                evicted = self._queue.get_nowait()
+                self._queue.task_done()
+                self._dropped(evicted)
+                self._count('dropped')
+                self._queue.put_nowait(alert)
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        self._dropped(alert)
+        self._count('dropped')
+        return False
+
+    def _dropped(self, alert):
+        if self.on_drop is not None:
+            self.on_drop(alert)
+
+    def _worker(self):
+        while True:
+            try:
+                alert = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            try:
+                self.handler(alert)
+                self._count('completed')
+            except Exception as e:
+                self._count('failed')
+                print(f"⚠️  Alert channel '{self.name}' failed: {e}")
+            finally:
+                latency = time.time() - alert.created_at
+                with self._lock:
+                    self.latency_avg += 0.2 * (latency - self.latency_avg)
+                    self.latency_max = max(self.latency_max, latency)
+                self._queue.task_done()
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.counters)
+            data.update({
+                'channel': self.name,
+                'queue_depth': self._queue.qsize(),
+                'latency_avg': self.latency_avg,
+                'latency_max': self.latency_max,
+            })
+            return data
+
+    def close(self, timeout=5):
+        """Let workers finish queued alerts for up to `timeout` seconds, then stop them."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        for t in self._threads:
+            t.join(timeout=max(0.0, deadline - time.time()) + 0.5)
+
+
+class AlertDispatcher:
+    """Fans each alert out to the registered channels without blocking the caller."""
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.channels = {}
+
+    def add_channel(self, name, handler, on_drop=None):
+        """Register a channel using its settings from ALERT_CONFIG['channels'][name].
+
+        `on_drop` is called with an alert this channel had to drop.
+        """
+        settings = self.config.get('channels', {}).get(name, {})
+        self.channels[name] = AlertChannel(
+            name,
+            handler,
+            workers=settings.get('workers', 1),
+            queue_size=settings.get('queue_size', 16),
+            drop_policy=settings.get('drop_policy', 'drop_newest'),
+            block_timeout=settings.get('block_timeout', 0.05),
+            on_drop=on_drop,
+        )
+
+    def dispatch(self, alert):
+        """Submit an alert to every channel; returns the names of channels that dropped it."""
+        if 'image' not in self.channels:
+            alert.image_ready.set()
+        return [name for name, channel in self.channels.items() if not channel.submit(alert)]
+
+    def stats(self):
+        return [channel.snapshot() for channel in self.channels.values()]
+
+    def format_stats(self):
+        parts = []
+        for s in self.stats():
+            text = f"{s['channel']} q={s['queue_depth']} {s['latency_avg'] * 1000:.0f}ms"
+            if s['dropped'] or s['failed']:
+                text += f" (dropped={s['dropped']}, failed={s['failed']})"
+            parts.append(text)
+        return 'alerts: ' + (' | '.join(parts) if parts else 'no channels')
+
+    def shutdown(self, timeout=5):
+        deadline = time.time() + timeout
+        for channel in self.channels.values():
+            channel.close(max(0.0, deadline - time.time()))
@@ -1,15 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, Response
-from database import create_user, authenticate_user, get_user_by_email, get_user_detections, get_user_alerts, get_all_users, add_upload, get_user_uploads
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, jsonify, Request
+from database import (create_user, authenticate_user, get_user_by_email, get_all_users, add_upload, get_user_uploads,
+                      get_db_stats, get_detections_page, get_alerts_page, get_user_animal_types,
+                      get_detection_trend, get_detection_totals)
 from werkzeug.utils import secure_filename
-from camera import start_detection_background, stop_detection_background
+from camera import (start_detection_background, stop_detection_background, get_detection_status,
+                    get_detection_events, detection_owner, get_frame_reader, get_workers_status)
+from retention import RetentionWorker
+from export import export, FORMATS as EXPORT_FORMATS
+from dataset_ingest import DatasetIngestor
 from PIL import Image
 import io
 import os
-from datetime import datetime
-import zipfile
-import shutil
+import threading
+from datetime import datetime, timedelta
+import time
+
+
+class LargeDatasetRequest(Request):
+    """Dataset ZIPs may be far larger than the MAX_CONTENT_LENGTH every other upload is held to."""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'admin_upload_dataset':
+            return DATASET_MAX_UPLOAD
+        return super().max_content_length
+
 
 app = Flask(__name__, template_folder='templates')
+app.request_class = LargeDatasetRequest
 # Minimal secret key for session (replace for production)
 app.secret_key = 'dev-secret'
 
@@ -24,9 +42,49 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Live stream: frames per second sent to each viewer
+try:
+    from config import STREAM_CONFIG
+    STREAM_CLIENT_FPS = STREAM_CONFIG.get('client_fps', 10)
+except ImportError:
+    STREAM_CLIENT_FPS = 10
+
+# Archive old rows, evict old detection images and compact the database in the background
+try:
+    from config import RETENTION_CONFIG
+except ImportError:
+    RETENTION_CONFIG = {'enabled': False}
+# Started with the first request (see start_background_jobs), not on import
+retention_worker = None
+_background_lock = threading.Lock()
+
+# History / alerts pages: rows per page, and the most a client may ask for
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Analytics: longest range a chart may ask for, in days
+ANALYTICS_MAX_DAYS = 366
+
 # Dataset configuration
 DATASET_FOLDER = os.path.join(os.path.dirname(__file__), 'dataset')
 ALLOWED_DATASET_EXT = {'zip', 'png', 'jpg', 'jpeg', 'bmp', 'gif'}
+try:
+    from config import DATASET_CONFIG
+except ImportError:
+    DATASET_CONFIG = {}
+DATASET_MAX_UPLOAD = int(DATASET_CONFIG.get('max_upload_mb', 2048) * 1024 * 1024)
+# ZIPs wait here (outside dataset/) until the background ingestion has read them
+DATASET_INCOMING = os.path.join(os.path.dirname(__file__), 'dataset_incoming')
+# Created on first use (see get_dataset_ingestor)
+dataset_ingestor = None
+
+
+def get_dataset_ingestor():
+    global dataset_ingestor
+    with _background_lock:
+        if dataset_ingestor is None:
+            dataset_ingestor = DatasetIngestor(DATASET_FOLDER, DATASET_CONFIG)
+    return dataset_ingestor
 
 def is_allowed_dataset_file(filename):
     return '.' in filename and filename.rsplit('.',1)[1].lower() in ALLOWED_DATASET_EXT
@@ -36,6 +94,72 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _parse_day(value, next_day=False):
+    """'YYYY-MM-DD' from a filter to a timestamp bound (the following midnight if `next_day`)."""
+    if not value:
+        return None
+    day = datetime.strptime(value, '%Y-%m-%d')
+    if next_day:
+        day += timedelta(days=1)
+    return day.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _page_args():
+    """Cursor, limit and date range of a history / alerts request; raises ValueError on bad input."""
+    limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    return {
+        'cursor': request.args.get('cursor') or None,
+        'limit': limit,
+        'since': _parse_day(request.args.get('since')),
+        'until': _parse_day(request.args.get('until'), next_day=True),
+    }
+
+
+def _analytics(user_id):
+    """Trend (?period=hourly|daily&days=&animal=) or totals (?by=animal_type|location&days=) from the rollups."""
+    days = min(max(int(request.args.get('days', 7)), 1), ANALYTICS_MAX_DAYS)
+    since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+    if request.args.get('by'):
+        return {'since': since, 'totals': get_detection_totals(user_id, since=since, group_by=request.args['by'])}
+    period = request.args.get('period', 'daily')
+    return {'since': since, 'period': period,
+            'trend': get_detection_trend(user_id, period, since=since, animal_type=request.args.get('animal') or None)}
+
+
+def _dashboard_trend(user_id, days=7):
+    """Per-day totals and per-animal totals of the last `days` days, for the dashboard charts."""
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    per_day = {}
+    for row in get_detection_trend(user_id, 'daily', since=since):
+        per_day[row['bucket']] = per_day.get(row['bucket'], 0) + row['count']
+    day_list = [(datetime.utcnow() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+    daily = [{'day': day, 'count': per_day.get(day, 0)} for day in day_list]
+    animals = get_detection_totals(user_id, since=since)
+    return {
+        'daily': daily,
+        'daily_max': max([d['count'] for d in daily] + [1]),
+        'animals': animals,
+        'animals_max': max([a['count'] for a in animals] + [1]),
+    }
+
+
+def _export_response(user_id):
+    """Stream ?table=detections|alerts&format=csv|jsonl|parquet&since=&until=&kind=&archive=1 as a download."""
+    table = request.args.get('table', 'detections')
+    fmt = request.args.get('format', 'csv')
+    try:
+        chunks = export(table, fmt, user_id=user_id, since=_parse_day(request.args.get('since')),
+                        until=_parse_day(request.args.get('until'), next_day=True),
+                        kind=request.args.get('kind') or None, include_archive=request.args.get('archive') == '1')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = f"{table}-{user_id if user_id is not None else 'all'}-{datetime.now().strftime('%Y%m%d')}.{ext}"
+    # No Content-Length: the body is sent with chunked transfer as it is produced
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Cache-Control': 'no-store'})
+
+
 def convert_to_jpg(image_file):
     """Convert uploaded image to JPG format and return the converted image file."""
     try:
@@ -117,7 +241,7 @@ def user_login():
 def user_dashboard():
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
-    return render_template('user_dashboard.html')
+    return render_template('user_dashboard.html', trend=_dashboard_trend(session['user_id']))
 
 
 @app.route('/user/history')
@@ -125,8 +249,14 @@ def user_history():
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
     user_id = session['user_id']
-    detections = get_user_detections(user_id)
-    return render_template('user_history.html', detections=detections)
+    animal = request.args.get('animal') or None
+    try:
+        detections, next_cursor = get_detections_page(user_id, animal_type=animal, **_page_args())
+    except ValueError:
+        flash('Invalid filter')
+        return redirect(url_for('user_history'))
+    return render_template('user_history.html', detections=detections, next_cursor=next_cursor,
+                           animal_types=get_user_animal_types(user_id), filters=request.args)
 
 
 @app.route('/user/alerts')
@@ -134,8 +264,57 @@ def user_alerts():
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
     user_id = session['user_id']
-    alerts = get_user_alerts(user_id)
-    return render_template('user_alerts.html', alerts=alerts)
+    try:
+        alerts, next_cursor = get_alerts_page(user_id, alert_type=request.args.get('type') or None, **_page_args())
+    except ValueError:
+        flash('Invalid filter')
+        return redirect(url_for('user_alerts'))
+    return render_template('user_alerts.html', alerts=alerts, next_cursor=next_cursor, filters=request.args)
+
+
+@app.route('/api/detections')
+def api_detections():
+    """A page of the user's detections as JSON (?cursor=&limit=&animal=&since=&until=), for infinite scroll."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    try:
+        rows, next_cursor = get_detections_page(session['user_id'], animal_type=request.args.get('animal') or None,
+                                                **_page_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': rows, 'next_cursor': next_cursor})
+
+
+@app.route('/api/analytics')
+def api_analytics():
+    """Detection trend or totals of the logged-in user for dashboard charts."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    try:
+        return jsonify(_analytics(session['user_id']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/user/export')
+def user_export():
+    """Download the user's detections or alerts (streamed, any size)."""
+    if not session.get('user_id'):
+        return redirect(url_for('user_login'))
+    return _export_response(session['user_id'])
+
+
+@app.route('/api/alerts')
+def api_alerts():
+    """A page of the user's alerts as JSON (?cursor=&limit=&type=&since=&until=), for infinite scroll."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    try:
+        rows, next_cursor = get_alerts_page(session['user_id'], alert_type=request.args.get('type') or None,
+                                            **_page_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': rows, 'next_cursor': next_cursor})
 
 
 @app.route('/start_detection')
@@ -146,7 +325,8 @@ def start_detection():
     try:
         user_email = session.get('user_email')
         # pass the logged-in user's email as both sender override and recipient
-        start_detection_background(sender_email=user_email, recipient_email=user_email)
+        start_detection_background(sender_email=user_email, recipient_email=user_email,
+                                   user_id=session['user_id'])
         flash('Detection started in background.')
     except Exception as e:
         flash(f'Error starting detection: {str(e)}')
@@ -217,11 +397,39 @@ def uploaded_file(filename):
     return None
 
 
+def _mjpeg_frames(reader, camera_id, user_id, fps):
+    """Yield multipart JPEG parts from the shared frame ring, at most `fps` per second."""
+    interval = 1.0 / max(fps, 0.1)
+    last_seq = 0
+    last_owner_check = time.time()
+    while True:
+        started = time.time()
+        if started - last_owner_check > 5:
+            # End the stream once this user's session is gone
+            if detection_owner(camera_id) != user_id:
+                return
+            last_owner_check = started
+        seq, jpeg = reader.latest()
+        if jpeg is not None and seq != last_seq:
+            last_seq = seq
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                   + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+        time.sleep(max(0.0, interval - (time.time() - started)))
+
+
 @app.route('/start_detection/stream')
 def start_detection_stream():
+    """MJPEG stream of the annotated camera feed (?camera=<id>, default first camera)."""
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
-    return ('', 204)  # Not used in static flow
+    user_id = session['user_id']
+    camera_id = request.args.get('camera')
+    reader = get_frame_reader(camera_id)
+    if reader is None or detection_owner(camera_id) != user_id:
+        return ('', 204)
+    return Response(_mjpeg_frames(reader, camera_id, user_id, STREAM_CLIENT_FPS),
+                    mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-store'})
 
 
 @app.route('/start_detection/snapshot')
@@ -229,7 +437,43 @@ def user_snapshot():
     """Return a single JPEG frame for polling fallback."""
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
-    return ('', 204)  # Not used in static flow
+    camera_id = request.args.get('camera')
+    reader = get_frame_reader(camera_id)
+    if reader is None or detection_owner(camera_id) != session['user_id']:
+        return ('', 204)
+    _, jpeg = reader.latest()
+    if jpeg is None:
+        return ('', 204)
+    return Response(jpeg, mimetype='image/jpeg', headers={'Cache-Control': 'no-store'})
+
+
+@app.route('/start_detection/status')
+def detection_status():
+    """Detector state as JSON (boot time, time to first detection, frames, alerts)."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    status = get_detection_status(session['user_id'])
+    if status is None:
+        return jsonify({'running': False})
+    return jsonify(status)
+
+
+@app.route('/start_detection/events')
+def detection_events():
+    """Latest detections, alerts, stats and heartbeat for the logged-in user's session."""
+    if not session.get('user_id'):
+        return jsonify({'error': 'login required'}), 401
+    live = get_detection_events(session['user_id'])
+    stats = live.get('stats')
+    if stats and stats.get('user_id') != session['user_id']:
+        live['stats'] = None
+    heartbeat = live.get('heartbeat')
+    if heartbeat and (heartbeat.get('session') or {}).get('user_id') != session['user_id']:
+        live['heartbeat'] = dict(heartbeat, session=None)
+    last_session = live.get('session')
+    if last_session and last_session.get('user_id') != session['user_id']:
+        live['session'] = None
+    return jsonify(live)
 
 
 @app.route('/start_detection/stop')
@@ -237,7 +481,7 @@ def stop_detection():
     if not session.get('user_id'):
         return redirect(url_for('user_login'))
     try:
-        stop_detection_background()
+        stop_detection_background(user_id=session['user_id'])
         flash('Detection stopped.')
     except Exception as e:
         flash(f'Error stopping detection: {str(e)}')
@@ -262,7 +506,7 @@ def admin_login():
 def admin_dashboard():
     if not session.get('admin_authenticated'):
         return redirect(url_for('admin_login'))
-    return render_template('admin_dashboard.html')
+    return render_template('admin_dashboard.html', trend=_dashboard_trend(None), retention=RETENTION_CONFIG)
 
 
 @app.route('/admin/users')
@@ -299,6 +543,43 @@ def admin_logs():
     return render_template('admin_logs.html')
 
 
+@app.route('/admin/workers')
+def admin_workers():
+    """Detection workers as JSON: capacity, owner, cameras, CPU, RSS and FPS of each."""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'admin login required'}), 403
+    return jsonify(get_workers_status())
+
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    """Detection trend or totals across all users (or ?user_id=) for the admin dashboard."""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'admin login required'}), 403
+    try:
+        return jsonify(_analytics(request.args.get('user_id', type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@app.route('/admin/export')
+def admin_export():
+    """Download detections or alerts of every user (or ?user_id=), streamed."""
+    if not session.get('admin_authenticated'):
+        return redirect(url_for('admin_login'))
+    return _export_response(request.args.get('user_id', type=int))
+
+
+@app.route('/admin/db/stats')
+def admin_db_stats():
+    """Database connection pool usage, per-query latency and retention progress as JSON."""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'admin login required'}), 403
+    stats = get_db_stats()
+    stats['retention'] = retention_worker.stats if retention_worker is not None else None
+    return jsonify(stats)
+
+
 @app.route('/admin/logs/data')
 def admin_logs_data():
     # Return some dummy logs as JSON
@@ -334,24 +615,14 @@ def admin_upload_dataset():
         ext = filename.rsplit('.',1)[1].lower() if '.' in filename else ''
         try:
             if ext == 'zip':
-                # save zip to a temp location and extract safely into DATASET_FOLDER
-                os.makedirs(DATASET_FOLDER, exist_ok=True)
-                tmp_path = os.path.join(DATASET_FOLDER, f"__tmp_upload_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip")
+                # Only save the upload here; validation, deduplication and
+                # extraction run in the background (see dataset_ingest.py)
+                os.makedirs(DATASET_INCOMING, exist_ok=True)
+                tmp_path = os.path.join(DATASET_INCOMING, f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
                 file.save(tmp_path)
-                with zipfile.ZipFile(tmp_path, 'r') as z:
-                    for member in z.namelist():
-                        member_path = os.path.normpath(member)
-                        # prevent path traversal
-                        if member_path.startswith('..') or os.path.isabs(member_path):
-                            continue
-                        target_path = os.path.join(DATASET_FOLDER, member_path)
-                        target_dir = os.path.dirname(target_path)
-                        os.makedirs(target_dir, exist_ok=True)
-                        # extract file
-                        with z.open(member) as source, open(target_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-                os.remove(tmp_path)
-                flash('ZIP uploaded and extracted to dataset successfully')
+                os.makedirs(DATASET_FOLDER, exist_ok=True)
+                job = get_dataset_ingestor().submit(tmp_path, filename)
+                flash(f'ZIP uploaded; importing it into the dataset in the background (job {job.id})')
             elif ext in ALLOWED_DATASET_EXT:
                 # single image upload; optional category
                 category = request.form.get('category', '').strip() or 'misc'
@@ -383,7 +654,25 @@ def admin_upload_dataset():
     except Exception:
         folders = []
 
-    return render_template('admin_upload_dataset.html', folders=folders)
+    return render_template('admin_upload_dataset.html', folders=folders, jobs=get_dataset_ingestor().statuses())
+
+
+@app.route('/admin/upload_dataset/jobs')
+def admin_dataset_jobs():
+    """Progress of recent dataset ZIP imports (polled by the upload page)."""
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Not authorized'}), 401
+    return jsonify({'jobs': get_dataset_ingestor().statuses()})
+
+
+@app.route('/admin/upload_dataset/jobs/<job_id>')
+def admin_dataset_job(job_id):
+    if not session.get('admin_authenticated'):
+        return jsonify({'error': 'Not authorized'}), 401
+    job = get_dataset_ingestor().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.status())
 
 
 @app.route('/admin/logout')
@@ -395,5 +684,24 @@ def admin_logout():
 def about():
     return render_template('about.html')
 
+def start_background_jobs():
+    """Start the retention worker once, in the process that serves requests.
+
+    Not done on import: the debug reloader's watcher and any process that
+    merely imports this module must not run it. With `python app.py` the
+    dataset validation workers (spawned processes) import this file as
+    __mp_main__, so everything at module level here has to stay passive.
+    """
+    global retention_worker
+    with _background_lock:
+        if retention_worker is None and RETENTION_CONFIG.get('enabled'):
+            retention_worker = RetentionWorker(RETENTION_CONFIG).start()
+
+
+@app.before_request
+def _start_background_jobs():
+    start_background_jobs()
+
+
 if __name__ == '__main__':
     app.run(debug=True)
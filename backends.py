@@ -0,0 +1,171 @@
+"""
+Selectable inference backends for the YOLO detector.
+
+MODEL_CONFIG['backend'] picks how the model runs on the CPU:
+
+- 'pytorch':  the .pt weights through ultralytics/PyTorch (default)
+- 'onnx':     an ONNX export run by ONNX Runtime
+- 'openvino': an OpenVINO IR export
+
+With 'int8' enabled the exported model is quantized: ONNX gets dynamic
+INT8 weight quantization (no calibration data needed), OpenVINO uses
+post-training quantization with MODEL_CONFIG['calibration_data'].
+
+Exports are cached next to the weights under a name containing a hash of the
+weights file, so they are built once and rebuilt automatically when the
+weights change. Every backend is loaded through ultralytics.YOLO, which gives
+the same call signature and Results objects, so the detection loop does not
+need to know which one is in use.
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import shutil
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+
+def weights_hash(path, length=12):
+    """Short SHA-256 of a weights file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def configure_threads(threads):
+    """Limit the intra-op threads used for inference (0 / None leaves the defaults).
+
+    Sets PyTorch's thread pool and the OpenMP/BLAS variables; call before the
+    model is loaded. The pip builds of ONNX Runtime and OpenVINO ignore these,
+    see apply_runtime_threads().
+    """
+    if not threads:
+        return
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(int(threads))
+    except ImportError:
+        pass
+
+
+def artifact_path(weights, backend, int8=False, cache_dir=None):
+    """Where the cached export for these weights/backend lives."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    folder = cache_dir or os.path.dirname(os.path.abspath(weights))
+    name = f"{stem}-{weights_hash(weights)}-{backend}{'-int8' if int8 else ''}"
+    return os.path.join(folder, name + ('.onnx' if backend == 'onnx' else '_openvino_model'))
+
+
+def _remove_stale(weights, backend, int8, keep, cache_dir=None):
+    """Delete exports of older weights with the same name and backend."""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    folder = cache_dir or os.path.dirname(os.path.abspath(weights))
+    suffix = '.onnx' if backend == 'onnx' else '_openvino_model'
+    pattern = os.path.join(folder, f"{stem}-*-{backend}{'-int8' if int8 else ''}{suffix}")
+    for path in glob.glob(pattern):
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True) if os.path.isdir(path) else os.remove(path)
+
+
+def export_model(weights, backend, int8=False, imgsz=640, cache_dir=None, calibration_data=None):
+    """Return the path of the exported model, building and caching it if needed."""
+    from ultralytics import YOLO
+
+    target = artifact_path(weights, backend, int8, cache_dir)
+    if os.path.exists(target):
+        return target
+
+    print(f"🔧 Exporting {weights} to {backend}{' (INT8)' if int8 else ''}, this happens once per weights file...")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    options = {'format': backend, 'imgsz': imgsz, 'dynamic': True}
+    if backend == 'openvino' and int8:
+        options['int8'] = True
+        if calibration_data:
+            options['data'] = calibration_data
+    exported = YOLO(weights).export(**options)
+
+    if backend == 'onnx' and int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+        os.remove(exported)
+    else:
+        shutil.move(exported, target)
+    _remove_stale(weights, backend, int8, target, cache_dir)
+    print(f"✅ Cached {backend} model: {target}")
+    return target
+
+
+def apply_runtime_threads(model, backend, path, threads):
+    """Give an exported model's runtime `threads` intra-op threads.
+
+    ultralytics creates the ONNX Runtime session / OpenVINO compiled model
+    without a thread setting, so one tiny inference sets the predictor up and
+    the runtime object is then rebuilt with the limit. Raises if the
+    ultralytics internals are not the expected ones.
+    """
+    import numpy as np
+
+    model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+    auto = model.predictor.model
+    # ultralytics >= 8.4 keeps the runtime on a per-format backend object
+    runtime = auto.__dict__.get('backend') or auto
+    if backend == 'onnx':
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = int(threads)
+        options.inter_op_num_threads = 1
+        runtime.session = onnxruntime.InferenceSession(path, options, providers=runtime.session.get_providers())
+    elif backend == 'openvino':
+        try:
+            from openvino import Core
+        except ImportError:
+            from openvino.runtime import Core
+        xml = path if path.endswith('.xml') else glob.glob(os.path.join(path, '*.xml'))[0]
+        core = Core()
+        compile_config = {'PERFORMANCE_HINT': 'LATENCY', 'INFERENCE_NUM_THREADS': int(threads)}
+        if not hasattr(runtime, 'ov_compiled_model'):
+            raise AttributeError('no OpenVINO compiled model on the predictor')
+        runtime.ov_compiled_model = core.compile_model(core.read_model(xml), 'CPU', compile_config)
+        if hasattr(runtime, 'compile_model'):
+            # Used by ultralytics to recompile for a new input shape
+            runtime.compile_model = functools.partial(core.compile_model, device_name='CPU', config=compile_config)
+
+
+def load_model(config):
+    """Load the detector for MODEL_CONFIG; falls back to PyTorch if an export fails.
+
+    Returns (model, description).
+    """
+    from ultralytics import YOLO
+
+    weights = config.get('weights', 'yolov8n.pt')
+    backend = (config.get('backend') or 'pytorch').lower()
+    int8 = bool(config.get('int8', False))
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    threads = config.get('threads', 0)
+    configure_threads(threads)
+    if backend != 'pytorch':
+        try:
+            path = export_model(weights, backend, int8, config.get('imgsz', 640),
+                                config.get('cache_dir'), config.get('calibration_data'))
+            model = YOLO(path, task='detect')
+        except Exception as e:
+            print(f"⚠️  Could not use the {backend} backend ({e}), falling back to PyTorch")
+        else:
+            if threads:
+                try:
+                    apply_runtime_threads(model, backend, path, threads)
+                except Exception as e:
+                    print(f"⚠️  threads={threads} is not applied to the {backend} backend ({e}); "
+                          f"it uses the runtime's default thread count")
+            return model, f"{backend}{' int8' if int8 else ''} ({os.path.basename(path)})"
+    return YOLO(weights), f"pytorch ({os.path.basename(weights)})"
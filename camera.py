@@ -1,53 +1,113 @@
-import subprocess
-import os
+import atexit
 
-# Global variable to track detection process
-detection_process = None
+from framestream import SharedFrameReader
+from supervisor import Supervisor
 
+try:
+    from config import DAEMON_CONFIG
+except ImportError:
+    DAEMON_CONFIG = {'host': '127.0.0.1', 'port': 6010, 'authkey': 'animal-detection'}
 
-def start_detection_background(sender_email: str = None, recipient_email: str = None):
-    """Start the YOLO detection process in the background.
+try:
+    from config import SUPERVISOR_CONFIG
+except ImportError:
+    SUPERVISOR_CONFIG = {'workers_per_core': 0.5}
 
-    If `sender_email` is provided, it will be passed to the detection subprocess
-    via the `DETECTION_SENDER_EMAIL` environment variable so the detection
-    process can use it as the email sender for alerts.
+try:
+    from config import STREAM_CONFIG
+except ImportError:
+    STREAM_CONFIG = {'enabled': True}
+
+try:
+    from config import CAMERAS
+except ImportError:
+    CAMERAS = []
+
+# Detection worker processes, one per running session (created on first use)
+supervisor = None
+# One shared-memory frame reader per camera, shared by every viewer
+frame_readers = {}
+
+
+def get_supervisor():
+    global supervisor
+    if supervisor is None:
+        supervisor = Supervisor(stream_camera_ids(), SUPERVISOR_CONFIG, DAEMON_CONFIG)
+        atexit.register(shutdown_detection_daemon)
+    return supervisor
+
+
+def start_detection_background(sender_email: str = None, recipient_email: str = None, user_id=None,
+                               camera_ids=None):
+    """Start a detection session for a user on a (warm) detection worker.
+
+    If `sender_email` is provided it is used as the From address of alert
+    emails for this session; `recipient_email` receives them. `camera_ids`
+    limits the session to some cameras (default: all). Raises RuntimeError
+    when the cameras are in use by another user or every worker is busy.
     """
-    global detection_process
     try:
-        env = os.environ.copy()
-        if sender_email:
-            env['DETECTION_SENDER_EMAIL'] = sender_email
-        if recipient_email:
-            env['DETECTION_RECIPIENT_EMAIL'] = recipient_email
-
-        # Start detection.py as a subprocess
-        detection_process = subprocess.Popen(
-            ['python', 'detection.py'],
-            cwd=os.path.dirname(os.path.abspath(__file__)),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env=env
-        )
+        return get_supervisor().start(user_id, camera_ids, sender_email, recipient_email)
     except Exception as e:
         print(f"Error starting detection process: {e}")
+        raise
+
+
+def stop_detection_background(user_id=None):
+    """Stop the user's detection session; the worker and its model stay loaded for a while."""
+    try:
+        return get_supervisor().stop(user_id)
+    except Exception as e:
+        print(f"Error stopping detection process: {e}")
+        return {'ok': False, 'error': str(e)}
+
+
+def get_detection_status(user_id=None):
+    """The user's worker and session status (boot time, time to first detection, ...), or None."""
+    return get_supervisor().status(user_id)
+
+
+def get_detection_events(user_id=None):
+    """Live detector state from the user's worker: latest heartbeat/stats/session and recent detections/alerts.
+
+    The first call subscribes to the worker; later calls only read memory.
+    """
+    live = get_supervisor().events(user_id)
+    if live is None:
+        return {'connected': False, 'heartbeat': None, 'stats': None, 'session': None,
+                'detections': [], 'alerts': []}
+    return live
+
+
+def get_workers_status():
+    """Capacity and per-worker state, CPU, RSS and FPS (for the admin page)."""
+    return get_supervisor().workers_status()
+
+
+def detection_owner(camera_id=None):
+    """user_id of the session running on a camera (first camera by default), or None."""
+    return get_supervisor().camera_owner(camera_id or stream_camera_ids()[0])
+
+
+def stream_camera_ids():
+    """Camera ids the workers publish frames for (same defaults as detection.load_cameras)."""
+    return [str(cam.get('id', f'cam{i}')) for i, cam in enumerate(CAMERAS or [])] or ['cam0']
+
+
+def get_frame_reader(camera_id=None):
+    """Shared-memory reader for a camera's live frames (first camera by default)."""
+    camera_id = camera_id or stream_camera_ids()[0]
+    if camera_id not in stream_camera_ids():
+        return None
+    reader = frame_readers.get(camera_id)
+    if reader is None:
+        reader = frame_readers[camera_id] = SharedFrameReader(camera_id, STREAM_CONFIG)
+    return reader
 
 
-def stop_detection_background():
-    """Stop the YOLO detection process."""
-    global detection_process
-    if detection_process:
-        try:
-            detection_process.terminate()
-            detection_process.wait(timeout=2)
-        except subprocess.TimeoutExpired:
-            # Force kill if terminate doesn't work
-            detection_process.kill()
-            detection_process.wait()
-        except Exception as e:
-            print(f"Error stopping detection process: {e}")
-            try:
-                detection_process.kill()
-            except:
-                pass
-        finally:
-            detection_process = None
+def shutdown_detection_daemon():
+    """Stop every detection worker (releases the models and cameras)."""
+    global supervisor
+    if supervisor is not None:
+        supervisor.shutdown()
+        supervisor = None
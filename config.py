@@ -15,9 +15,20 @@ EMAIL_CONFIG = {
     'smtp_port': 587,
     'sender_email': 'your_gmail@gmail.com',  # Your Gmail address
     'sender_password': 'yourpassword',   # Your Gmail app password (16 characters)
-    'recipient_email': 'receiver email@gmail.com'  # Email to receive alerts
+    'recipient_email': 'receiver email@gmail.com',  # Email to receive alerts
+    'use_tls': True,  # STARTTLS after connecting (set False for a local test server)
+    'timeout': 10,  # SMTP socket timeout in seconds
+    'keepalive': 60,  # Check an idle connection with NOOP after this many seconds
+    'max_retries': 3,  # Reconnect-and-retry attempts per message
+    'retry_backoff': 1.0,  # Seconds before the first retry (doubles each time)
+    'digest_mode': False,  # True = merge alerts into one email per digest_window
+    'digest_window': 300  # Seconds of alerts collected into one digest email
 }
 
+# For a local stand-in SMTP server while testing:
+#   python -m aiosmtpd -n -l localhost:1025
+# and set smtp_server='localhost', smtp_port=1025, use_tls=False, sender_password=''
+
 # For other email providers:
 # Yahoo Mail: smtp.mail.yahoo.com, port 587
 # Outlook: smtp-mail.outlook.com, port 587
@@ -26,12 +37,219 @@ EMAIL_CONFIG = {
 # Detection Configuration
 DETECTION_CONFIG = {
     'confidence_threshold': 0.5,  # Minimum confidence for detection (0.0 to 1.0)
-    'alert_cooldown': 60,  # Seconds between alerts for same animal
+    'detect_interval': 1,  # Run the detector every Nth frame (minimum when the scheduler is enabled)
     'camera_index': 0,  # Camera device index (0 for default camera)
     'frame_width': 640,  # Processing frame width
     'frame_height': 480,  # Processing frame height
+    'imgsz': 640,  # Model input size at full resolution
     'save_detection_images': True,  # Save images when animals detected
-    'detections_folder': 'detections'  # Folder to save detection images
+    'detections_folder': 'detections',  # Folder to save detection images
+    'jpeg_quality': 90,  # JPEG quality for saved/emailed alert images (0-100)
+    'image_queue_size': 32,  # Alert images waiting for the background disk writer
+    'queue_size': 1,  # Frames buffered between pipeline stages (stale frames are dropped)
+    'stats_interval': 5,  # Seconds between per-stage FPS / queue depth reports
+    'headless': None,  # True = never open a window, False = always, None = auto-detect display
+    'annotate_alert_images': False,  # Save/email alert images with boxes drawn (costs a frame copy per alert)
+    'tile_size': 0,  # Split large regions into tiles of this many pixels (0 disables tiling)
+    'tile_overlap': 0.2,  # Overlap between neighbouring tiles (fraction of tile_size)
+    'nms_iou_threshold': 0.5  # IoU above which overlapping tile detections are merged
+}
+
+# Model / Inference Backend Configuration
+# 'onnx' and 'openvino' export the weights once and cache the result next to
+# them (rebuilt automatically when the weights file changes); they need the
+# onnx + onnxruntime or openvino packages. int8 quantizes the export, which
+# is usually 2-3x faster on CPUs at a small accuracy cost.
+MODEL_CONFIG = {
+    'weights': 'yolov8n.pt',  # YOLO weights file
+    'backend': 'pytorch',  # 'pytorch', 'onnx' or 'openvino'
+    'int8': False,  # Quantize the exported model to INT8
+    'threads': 0,  # Inference threads (0 = library default, usually one per core)
+    'cache_dir': None,  # Where exported models are cached (None = next to the weights)
+    'calibration_data': None  # Dataset yaml for OpenVINO INT8 calibration (None = ultralytics default)
+}
+
+# Cameras handled by a single detection process (one shared YOLO model).
+# Each entry needs a unique 'id' and a 'source' (device index or stream URL);
+# 'location' is stored with detections and shown in alert emails.
+# 'zones' is an optional list of polygons in normalized (0.0-1.0) frame
+# coordinates; only those areas are inferred and detections outside every
+# zone are ignored. 'tile_size'/'tile_overlap' override tiling per camera,
+# e.g. 'tile_size': 640 for 1080p/4K feeds.
+# Leave empty to use DETECTION_CONFIG['camera_index'] only.
+CAMERAS = [
+    {'id': 'cam0', 'source': 0, 'location': 'Farm Perimeter Camera'},
+    # {'id': 'gate', 'source': 'rtsp://192.168.1.20/stream1', 'location': 'North Gate',
+    #  'zones': [[(0.0, 0.45), (1.0, 0.40), (1.0, 1.0), (0.0, 1.0)]], 'tile_size': 640},
+]
+
+# Motion Gating Configuration
+# YOLO only runs on frames where part of the (downscaled, grayscale) image
+# changed; a heartbeat inference still runs periodically on static scenes.
+MOTION_CONFIG = {
+    'enabled': True,  # Set to False to run the detector on every frame
+    'downscale_width': 160,  # Width of the grayscale frame used for motion checks
+    'pixel_threshold': 25,  # Per-pixel intensity change counted as motion (0-255)
+    'min_changed_area': 0.01,  # Fraction of the frame that must change to trigger inference
+    'background_alpha': 0.1,  # Background adaptation rate (higher adapts faster)
+    'heartbeat_interval': 10  # Seconds between forced inferences on static scenes (0 disables)
+}
+
+# Tracker Configuration
+# Every detected animal gets a persistent track ID; alerts, database rows
+# and saved images are produced once per new track.
+TRACKER_CONFIG = {
+    'iou_threshold': 0.3,  # Minimum box overlap to continue a track
+    'centroid_threshold': 0.5,  # Max centre jump (fraction of box diagonal) when boxes no longer overlap
+    'min_hits': 1,  # Detections needed before a track is reported / alerted
+    'max_misses': 5,  # Detector runs without a match before a track is dropped
+    'max_age': 30  # Seconds without a match before a track is dropped
+}
+
+# Adaptive Scheduler Configuration
+# Adjusts the detector interval and input resolution to stay within a CPU
+# budget while keeping a minimum detection rate; both go back to full
+# quality for a few seconds after any detection.
+SCHEDULER_CONFIG = {
+    'enabled': True,  # Set to False to keep detect_interval and imgsz fixed
+    'target_fps': 5,  # Minimum detector runs per second to aim for
+    'max_cpu': 0.6,  # CPU budget for the detection process (1.0 = one full core)
+    'max_stride': 10,  # Upper limit for the detector interval
+    'resolution_levels': [1.0, 0.75, 0.5],  # Input scales the scheduler may choose from
+    'adjust_interval': 2,  # Seconds between adjustments
+    'boost_duration': 5  # Seconds of full rate/resolution after a detection
+}
+
+# Alert Dispatch Configuration
+# Each side effect of an alert runs on its own bounded queue and worker pool
+# so the camera loop never waits on it. drop_policy decides what happens when
+# a queue is full: 'drop_newest', 'drop_oldest' or 'block' (wait up to
+# block_timeout seconds, then drop).
+ALERT_CONFIG = {
+    'channels': {
+        'sound': {'workers': 1, 'queue_size': 4, 'drop_policy': 'drop_oldest'},
+        'image': {'workers': 1, 'queue_size': 16, 'drop_policy': 'drop_newest'},
+        'email': {'workers': 2, 'queue_size': 32, 'drop_policy': 'drop_newest'},
+        'db': {'workers': 1, 'queue_size': 256, 'drop_policy': 'block', 'block_timeout': 0.05}
+    }
+}
+
+# Database Configuration
+# Connections are pooled and shared by Flask and the detector; WAL mode lets
+# readers run while a write is in progress.
+DATABASE_CONFIG = {
+    'user_id': 1,  # Default user ID for detections
+    'path': 'data.db',
+    'pool_size': 8,  # Connections kept open per process
+    'pool_timeout': 10,  # Seconds to wait for a free connection
+    'journal_mode': 'wal',
+    'synchronous': 'normal',  # 'full' syncs every commit; 'normal' is safe with WAL
+    'cache_size_kb': 16384,  # Page cache per connection
+    'mmap_size': 64 * 1024 * 1024,  # Bytes of the file read through memory mapping
+    'busy_timeout': 5000,  # Milliseconds to wait for a lock before 'database is locked'
+    'statement_cache': 128,  # Compiled statements kept per connection
+    'slow_query_ms': 100,  # Log queries slower than this
+    # Detection and alert inserts are buffered and committed in groups
+    'write_buffer': {
+        'enabled': True,
+        'flush_rows': 200,  # Commit once this many rows are queued...
+        'flush_interval_ms': 500,  # ...or the oldest queued row is this old
+        'max_pending': 10000,  # Inserts block when this many rows are waiting
+        'crash_safety': 'spool',  # 'spool': rows survive a crashed process; 'memory': fastest
+        'spool_dir': None  # Default: '<database path>-spool'
+    }
+}
+
+# Retention Configuration
+# A background job moves old rows into compressed archive segments (still
+# readable with retention.query_archive), deletes old detection images and
+# compacts the database. Set a limit to None to disable it.
+# Off by default: review the limits below, then set 'enabled' to True. The
+# first pass archives every row already older than the max ages at once, so
+# those rows leave the history pages (exports with archive=1 still include
+# them), and deletes images beyond the image limits.
+RETENTION_CONFIG = {
+    'enabled': False,
+    'interval': 3600,  # Seconds between passes
+    'initial_delay': 60,  # Seconds after startup before the first pass
+    'detections_max_age_days': 180,  # Archive detections older than this
+    'alerts_max_age_days': 180,  # Archive alerts older than this
+    'db_max_mb': 512,  # Archive the oldest rows while live data is larger than this
+    'archive_dir': 'archive',
+    'segment_rows': 100000,  # Rows per archive file
+    'images_max_age_days': 60,  # Delete detection images not used for this long
+    'images_max_mb': 2048,  # Delete least recently used images above this total
+    'batch_size': 500,  # Rows / files handled between pauses
+    'pause': 0.05,  # Seconds to sleep between batches so live work is not slowed down
+    'vacuum_pages': 256,  # Free pages released per incremental vacuum step
+    'enable_incremental_vacuum': False  # Let the worker run the one-time full VACUUM an older database
+                                        # needs (locks writes while it runs; or use retention.py --convert)
+}
+
+# Dataset Upload Configuration
+# Dataset ZIPs are ingested in the background: images are validated on a
+# process pool and files whose content is already in dataset/ are skipped.
+DATASET_CONFIG = {
+    'max_upload_mb': 2048,  # Largest ZIP the admin upload accepts
+    'max_files': 50000,  # Most images in one ZIP
+    'max_file_mb': 25,  # Largest single image
+    'max_total_mb': 4096,  # Most the whole ZIP may expand to
+    'max_ratio': 100,  # Refuse members compressed more than this (zip bombs)
+    'min_image_size': 32,  # Smallest width/height kept, in pixels
+    'max_pixels': 50000000,  # Largest width * height kept
+    'workers': None,  # Validation processes (None: one per CPU core)
+    'max_jobs': 20  # Finished uploads listed on the admin page
+}
+
+# Detection Daemon Configuration
+# Every detection worker is a long-lived daemon process that keeps the model
+# loaded and runs per-user sessions on request over a local control channel.
+DAEMON_CONFIG = {
+    'host': '127.0.0.1',  # Control channel address (keep it on localhost)
+    'port': 6010,
+    'authkey': 'change-me',  # Shared secret between the web app and the daemon
+    'warmup': True,  # Run dummy inferences at boot so the first session starts warm
+    'warmup_runs': 2,
+    'keep_cameras_open': False,  # Keep cameras open between sessions (faster start, camera stays busy)
+    'boot_timeout': 120,  # Seconds the web app waits for the daemon to load the model
+    'stop_timeout': 15,  # Seconds a stop waits for queued alerts and emails to drain
+    'heartbeat_interval': 2,  # Seconds between heartbeat events to the web app
+    'event_queue_size': 256,  # Events buffered per subscriber before the oldest are dropped
+    'log_to_file': True,  # Write daemon output to log_file instead of the console
+    'log_file': 'logs/detection.log',
+    'log_max_bytes': 5 * 1024 * 1024,  # Rotate the log at this size
+    'log_backups': 3  # Rotated log files to keep
+}
+
+# Detection Worker Supervisor
+# Each running session gets its own detection worker (a daemon process on
+# DAEMON_CONFIG port + 1 + n) for its cameras; a camera belongs to one user at a time.
+SUPERVISOR_CONFIG = {
+    'workers_per_core': 0.5,  # Live workers allowed per CPU core (at least 1)
+    'max_workers': None,  # Fixed worker limit instead of workers_per_core
+    'threads_per_worker': None,  # Inference threads per worker (default: cores // workers)
+    'idle_timeout': 600,  # Seconds a stopped worker stays warm for the next session
+    'restart_backoff': 1.0,  # First restart delay after a crash; doubles per crash
+    'max_backoff': 60,  # Longest restart delay
+    'max_restarts': 5,  # Crashes in a row before a worker is given up
+    'stable_after': 60,  # Seconds of uptime after which the crash count resets
+    'metrics_interval': 5  # Seconds between CPU / RSS / FPS samples
+}
+
+# Live Stream Configuration
+# The daemon puts the latest annotated frame of each camera into shared
+# memory while someone is watching; the web app serves it as an MJPEG stream
+# and snapshots. Each frame is encoded once however many people watch.
+STREAM_CONFIG = {
+    'enabled': True,
+    'jpeg_quality': 75,  # JPEG quality of streamed frames
+    'max_width': 960,  # Streamed frames are downscaled to this width
+    'max_fps': 15,  # Frames per second the detector encodes per camera while watched
+    'client_fps': 10,  # Frames per second sent to each viewer
+    'viewer_timeout': 5,  # Seconds after the last viewer read before encoding stops
+    'slots': 4,  # Frames kept in the shared-memory ring per camera
+    'slot_bytes': 1024 * 1024,  # Maximum size of one encoded frame
+    'name_prefix': 'animal_frames'  # Shared-memory segment name prefix
 }
 
 # Target animals to detect (YOLO class names)
@@ -45,10 +263,12 @@ SOUND_CONFIG = {
     'enabled': True,  # Set to False to disable sound alerts
     'beep_frequency': 1000,  # Hz
     'beep_duration': 500,  # milliseconds
-    'beep_count': 3  # Number of beeps
-}
-
-# Database Configuration
-DATABASE_CONFIG = {
-    'user_id': 1  # Default user ID for detections
+    'beep_count': 3,  # Number of beeps
+    # Sounds are decoded once at startup (mp3 needs ffmpeg on PATH) and played
+    # one at a time through a single long-lived output
+    'backend': None,  # 'sounddevice', 'winsound', 'aplay', 'pacat' or None to pick automatically
+    'priorities': {'bear': 0, 'elephant': 0, 'lion': 0},  # Lower plays first when sounds queue up (default 10)
+    'max_pending': 4,  # Different sounds that may wait to be played
+    'sample_rate': 44100,
+    'channels': 1
 }
@@ -1,21 +1,544 @@
+import atexit
+import base64
+import glob
+import json
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
 from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Optional
 
+try:
+	from config import DATABASE_CONFIG
+except ImportError:
+	DATABASE_CONFIG = {'path': 'data.db'}
+
 # Path for the SQLite database file
-DB_PATH = 'data.db'
+DB_PATH = DATABASE_CONFIG.get('path', 'data.db')
+
+# Every statement the app runs, by name. Connections are pooled and keep
+# sqlite3's per-connection statement cache, so each of these is compiled once
+# per connection and reused; the names also key the latency stats.
+STATEMENTS = {
+	'user_by_id': 'SELECT id, name, email, location, created_at FROM users WHERE id = ?',
+	'user_by_email': 'SELECT * FROM users WHERE email = ?',
+	'create_user': 'INSERT INTO users (name, email, password, location) VALUES (?, ?, ?, ?)',
+	'all_users': 'SELECT id, name, email, location, created_at FROM users ORDER BY created_at DESC',
+	'user_detections': 'SELECT id, animal_type, location, timestamp FROM detections WHERE user_id = ? ORDER BY timestamp DESC',
+	'user_animal_types': 'SELECT DISTINCT animal_type FROM detections WHERE user_id = ? ORDER BY animal_type',
+	'add_detection': 'INSERT INTO detections (user_id, animal_type, location, timestamp) VALUES (?, ?, ?, ?)',
+	'user_alerts': 'SELECT id, message, alert_type, timestamp FROM alerts WHERE user_id = ? ORDER BY timestamp DESC',
+	'add_alert': 'INSERT INTO alerts (user_id, message, alert_type, timestamp) VALUES (?, ?, ?, ?)',
+	'add_upload': 'INSERT INTO uploads (user_id, filename, original_name) VALUES (?, ?, ?)',
+	'user_uploads': 'SELECT id, filename, original_name, timestamp FROM uploads WHERE user_id = ? ORDER BY timestamp DESC',
+}
 
 
 def get_conn():
-	conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+	"""Open a new connection with the configured pragmas (WAL, synchronous, cache, mmap).
+
+	Prefer pool.connection(), which reuses connections.
+	"""
+	ensure_ready()
+	return _connect()
+
+
+def _connect():
+	conn = sqlite3.connect(DB_PATH, check_same_thread=False,
+						   timeout=DATABASE_CONFIG.get('busy_timeout', 5000) / 1000,
+						   cached_statements=DATABASE_CONFIG.get('statement_cache', 128))
 	conn.row_factory = sqlite3.Row
+	conn.execute(f"PRAGMA busy_timeout = {int(DATABASE_CONFIG.get('busy_timeout', 5000))}")
+	# WAL lets Flask read while the detector writes; NORMAL only syncs at checkpoints in WAL mode
+	conn.execute(f"PRAGMA journal_mode = {DATABASE_CONFIG.get('journal_mode', 'wal')}")
+	conn.execute(f"PRAGMA synchronous = {DATABASE_CONFIG.get('synchronous', 'normal')}")
+	# Negative cache_size is in KiB
+	conn.execute(f"PRAGMA cache_size = -{int(DATABASE_CONFIG.get('cache_size_kb', 16384))}")
+	conn.execute(f"PRAGMA mmap_size = {int(DATABASE_CONFIG.get('mmap_size', 64 * 1024 * 1024))}")
+	conn.execute('PRAGMA temp_store = MEMORY')
 	return conn
 
 
-def init_db():
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
+class QueryStats:
+	"""Call count and latency of every named statement."""
+
+	def __init__(self, slow_ms=100):
+		self.slow_ms = slow_ms
+		self._stats = {}
+		self._lock = threading.Lock()
+
+	def record(self, name, seconds):
+		with self._lock:
+			entry = self._stats.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+			entry['count'] += 1
+			entry['total'] += seconds
+			entry['max'] = max(entry['max'], seconds)
+		if self.slow_ms and seconds * 1000 >= self.slow_ms:
+			print(f"🐢 Slow query '{name}': {seconds * 1000:.0f}ms")
+
+	def snapshot(self):
+		with self._lock:
+			return [{'query': name, 'count': s['count'], 'avg_ms': s['total'] / s['count'] * 1000,
+					 'max_ms': s['max'] * 1000} for name, s in sorted(self._stats.items())]
+
+
+class ConnectionPool:
+	"""A bounded pool of configured connections shared by all threads.
+
+	Connections are opened lazily up to `size`; when all are in use a caller
+	waits up to `timeout` seconds before an OperationalError is raised.
+	"""
+
+	def __init__(self, size=8, timeout=10):
+		self.size = size
+		self.timeout = timeout
+		self._idle = LifoQueue()
+		self._created = 0
+		self._lock = threading.Lock()
+		self.waits = 0
+
+	def _acquire(self):
+		try:
+			return self._idle.get_nowait()
+		except Empty:
+			pass
+		with self._lock:
+			if self._created < self.size:
+				self._created += 1
+				try:
+					return _connect()
+				except Exception:
+					self._created -= 1
+					raise
+		self.waits += 1
+		try:
+			return self._idle.get(timeout=self.timeout)
+		except Empty:
+			raise sqlite3.OperationalError(f"no database connection free after {self.timeout}s")
+
+	@contextmanager
+	def connection(self):
+		"""Borrow a connection; an unfinished transaction is rolled back when it is returned."""
+		ensure_ready()
+		conn = self._acquire()
+		try:
+			yield conn
+		finally:
+			try:
+				if conn.in_transaction:
+					conn.rollback()
+				self._idle.put(conn)
+			except sqlite3.Error:
+				# Broken connection: drop it, the next caller opens a fresh one
+				with self._lock:
+					self._created -= 1
+
+	def stats(self):
+		return {'size': self.size, 'open': self._created, 'idle': self._idle.qsize(), 'waits': self.waits}
+
+	def close(self):
+		while True:
+			try:
+				conn = self._idle.get_nowait()
+			except Empty:
+				break
+			conn.close()
+			with self._lock:
+				self._created -= 1
+
+
+pool = ConnectionPool(DATABASE_CONFIG.get('pool_size', 8), DATABASE_CONFIG.get('pool_timeout', 10))
+query_stats = QueryStats(DATABASE_CONFIG.get('slow_query_ms', 100))
+
+
+def _query(name: str, params=(), one=False, sql=None):
+	"""Run a named SELECT (or `sql`, recorded under `name`) and return dict rows (or one dict / None)."""
+	with pool.connection() as conn:
+		started = time.perf_counter()
+		cur = conn.execute(sql or STATEMENTS[name], params)
+		rows = cur.fetchone() if one else cur.fetchall()
+		query_stats.record(name, time.perf_counter() - started)
+	if one:
+		return dict(rows) if rows else None
+	return [dict(row) for row in rows]
+
+
+def _execute(name: str, params=()):
+	"""Run a named write in its own transaction and return the new row id."""
+	with pool.connection() as conn:
+		started = time.perf_counter()
+		cur = conn.execute(STATEMENTS[name], params)
+		conn.commit()
+		query_stats.record(name, time.perf_counter() - started)
+		return cur.lastrowid
+
+
+def _utc_timestamp():
+	"""Now in the format of SQLite's CURRENT_TIMESTAMP (buffered rows keep their creation time)."""
+	return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+
+def pid_alive(pid):
+	"""Whether a process exists (assumed alive when that cannot be checked)."""
+	if os.name == 'nt':
+		# os.kill() would terminate the process on Windows
+		try:
+			import psutil
+		except ImportError:
+			return True
+		return psutil.pid_exists(pid)
+	try:
+		os.kill(pid, 0)
+	except ProcessLookupError:
+		return False
+	except OSError:
+		pass
+	return True
+
+
+class WriteBuffer:
+	"""Write-behind buffer: inserts are queued and committed in groups.
+
+	A background thread commits everything pending in one transaction once
+	`flush_rows` rows are queued or the oldest has waited `flush_interval`
+	seconds, so an alert costs a list append instead of a commit. When more
+	than `max_pending` rows are queued, add() blocks until a flush catches up.
+
+	crash_safety 'spool' also appends every row to a per-process spool file
+	(flushed to the OS, not fsynced) that is truncated after each commit;
+	rows left in the spool of a process that died are replayed by the next
+	one. With 'memory' up to `flush_interval` seconds of rows can be lost.
+	"""
+
+	def __init__(self, flush_rows=200, flush_interval=0.5, max_pending=10000, crash_safety='spool', spool_dir=None):
+		self.flush_rows = max(1, flush_rows)
+		self.flush_interval = flush_interval
+		self.max_pending = max(self.flush_rows, max_pending)
+		self.spool_dir = spool_dir if crash_safety == 'spool' else None
+		self._rows = []
+		self._oldest = 0.0
+		self._flushing = 0
+		self._cond = threading.Condition()
+		self._thread = None
+		self._closed = False
+		self._spool = None
+		self.rows_written = 0
+		self.commits = 0
+		self.failed = 0
+		self.replayed = 0
+
+	@property
+	def pending(self):
+		with self._cond:
+			return len(self._rows) + self._flushing
+
+	def _spool_path(self, pid=None):
+		return os.path.join(self.spool_dir, f"{pid or os.getpid()}.jsonl")
+
+	def replay_spools(self):
+		"""Commit rows left behind by processes that exited before flushing."""
+		for path in glob.glob(os.path.join(self.spool_dir, '*.jsonl')):
+			try:
+				pid = int(os.path.splitext(os.path.basename(path))[0])
+			except ValueError:
+				continue
+			if pid == os.getpid() or pid_alive(pid):
+				continue
+			# Claim the file so two processes starting together don't both replay it
+			claimed = f"{path}.replay-{os.getpid()}"
+			try:
+				os.rename(path, claimed)
+			except FileNotFoundError:
+				continue
+			rows = []
+			with open(claimed, encoding='utf-8') as f:
+				for line in f:
+					try:
+						name, params = json.loads(line)
+					except ValueError:
+						# Torn last line of a crashed writer
+						continue
+					rows.append((name, tuple(params)))
+			if rows:
+				self._commit(rows)
+				self.replayed += len(rows)
+				print(f"🗄️  Replayed {len(rows)} buffered rows from {os.path.basename(path)}")
+			os.remove(claimed)
+
+	def add(self, name, params):
+		self.add_many(name, [params])
+
+	def add_many(self, name, rows):
+		"""Queue rows for a named INSERT statement."""
+		if name not in STATEMENTS:
+			raise KeyError(f"Unknown statement: {name}")
+		rows = [(name, tuple(params)) for params in rows]
+		# Encoded up front so a row that cannot be spooled is refused before anything is queued
+		spooled = ''.join(json.dumps(row) + '\n' for row in rows) if self.spool_dir else ''
+		with self._cond:
+			if self._closed:
+				# Shutting down: write through
+				self._commit(rows)
+				return
+			while len(self._rows) >= self.max_pending and not self._closed:
+				# Never wait on a writer that is gone
+				self._ensure_writer()
+				self._cond.notify_all()
+				self._cond.wait(1.0)
+			if not self._rows:
+				self._oldest = time.time()
+			self._rows.extend(rows)
+			if self.spool_dir:
+				try:
+					if self._spool is None:
+						# Created on the first write, not on import
+						os.makedirs(self.spool_dir, exist_ok=True)
+						self._spool = open(self._spool_path(), 'a', encoding='utf-8')
+					self._spool.write(spooled)
+					self._spool.flush()
+				except OSError as e:
+					# The rows are still queued in memory
+					print(f"⚠️  Write buffer spool failed: {e}")
+			self._ensure_writer()
+			self._cond.notify_all()
+
+	def _ensure_writer(self):
+		"""Start the writer thread, or restart it if it died (call with the lock held)."""
+		if self._thread is None or not self._thread.is_alive():
+			if self._thread is not None:
+				print("⚠️  Database writer thread stopped; restarting it")
+			self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+			self._thread.start()
+
+	def _run(self):
+		while True:
+			with self._cond:
+				while not self._closed:
+					if len(self._rows) >= self.flush_rows:
+						break
+					if self._rows and time.time() - self._oldest >= self.flush_interval:
+						break
+					self._cond.wait(self.flush_interval if self._rows else None)
+				if self._closed and not self._rows:
+					return
+				batch, self._rows = self._rows, []
+				self._flushing = len(batch)
+			try:
+				self._commit(batch)
+			except Exception as e:
+				# Locked, I/O trouble or no free connection: keep the rows and try again shortly
+				print(f"⚠️  Buffered write failed, retrying: {e}")
+				with self._cond:
+					self._rows[:0] = batch
+					self._oldest = time.time()
+					self._flushing = 0
+				time.sleep(min(1.0, self.flush_interval))
+				continue
+			with self._cond:
+				self._flushing = 0
+				if self._spool is not None:
+					# Only rows queued during the commit are still unwritten
+					try:
+						self._spool.seek(0)
+						self._spool.truncate()
+						self._spool.write(''.join(json.dumps(row) + '\n' for row in self._rows))
+						self._spool.flush()
+					except OSError as e:
+						print(f"⚠️  Write buffer spool failed: {e}")
+				self._cond.notify_all()
+
+	def _commit(self, rows):
+		"""Write rows in one transaction; rows that are rejected (constraint, bad parameters) are skipped.
+
+		OperationalError (locked, disk trouble) is raised so the batch is retried.
+		"""
+		with pool.connection() as conn:
+			started = time.perf_counter()
+			try:
+				for name, params in rows:
+					conn.execute(STATEMENTS[name], params)
+				conn.commit()
+			except sqlite3.OperationalError:
+				conn.rollback()
+				raise
+			except sqlite3.Error:
+				conn.rollback()
+				for name, params in rows:
+					try:
+						conn.execute(STATEMENTS[name], params)
+					except sqlite3.OperationalError:
+						conn.rollback()
+						raise
+					except sqlite3.Error as e:
+						self.failed += 1
+						print(f"⚠️  Dropped buffered {name} row: {e}")
+				conn.commit()
+			query_stats.record('group_commit', time.perf_counter() - started)
+		self.rows_written += len(rows)
+		self.commits += 1
+
+	def flush(self, timeout=5):
+		"""Commit everything queued so far; returns False if rows are still pending after `timeout`."""
+		deadline = time.time() + timeout
+		with self._cond:
+			self._oldest = 0.0
+			self._cond.notify_all()
+			while self._rows or self._flushing:
+				remaining = deadline - time.time()
+				if remaining <= 0 or self._thread is None:
+					return False
+				self._cond.wait(remaining)
+		return True
+
+	def close(self, timeout=5):
+		"""Flush, stop the writer thread and remove this process's spool."""
+		flushed = self.flush(timeout)
+		with self._cond:
+			self._closed = True
+			self._cond.notify_all()
+			if self._spool is not None:
+				self._spool.close()
+				self._spool = None
+				if flushed and not self._rows:
+					os.remove(self._spool_path())
+		if self._thread is not None:
+			self._thread.join(timeout)
+
+	def stats(self):
+		return {'pending': self.pending, 'rows_written': self.rows_written, 'commits': self.commits,
+				'failed': self.failed, 'replayed': self.replayed}
+
+
+_buffer_config = DATABASE_CONFIG.get('write_buffer', {'enabled': True})
+write_buffer = None
+if _buffer_config.get('enabled', True):
+	write_buffer = WriteBuffer(
+		flush_rows=_buffer_config.get('flush_rows', 200),
+		flush_interval=_buffer_config.get('flush_interval_ms', 500) / 1000,
+		max_pending=_buffer_config.get('max_pending', 10000),
+		crash_safety=_buffer_config.get('crash_safety', 'spool'),
+		spool_dir=_buffer_config.get('spool_dir') or f"{DB_PATH}-spool",
+	)
+	atexit.register(write_buffer.close)
+
+
+def write_rows(name: str, rows):
+	"""Insert rows with a named statement through the write buffer (or directly if it is disabled).
+
+	For the detector and bulk imports; the rows are committed within
+	flush_interval_ms unless flush_writes() is called.
+	"""
+	if write_buffer is not None:
+		write_buffer.add_many(name, rows)
+		return
+	with pool.connection() as conn:
+		started = time.perf_counter()
+		conn.executemany(STATEMENTS[name], rows)
+		conn.commit()
+		query_stats.record(name, time.perf_counter() - started)
+
+
+def flush_writes(timeout: float = 5):
+	"""Wait until buffered inserts are committed."""
+	return write_buffer.flush(timeout) if write_buffer is not None else True
+
+
+def get_db_stats():
+	"""Pool usage and per-statement latency."""
+	return {'pool': pool.stats(), 'queries': query_stats.snapshot(),
+			'write_buffer': write_buffer.stats() if write_buffer is not None else None}
+
+
+def format_db_stats():
+	queries = query_stats.snapshot()
+	calls = sum(q['count'] for q in queries)
+	slowest = max(queries, key=lambda q: q['max_ms'], default=None)
+	p = pool.stats()
+	text = f"db: {calls} queries, {p['open']}/{p['size']} connections ({p['waits']} waits)"
+	if write_buffer is not None:
+		b = write_buffer.stats()
+		text += f", {b['rows_written']} rows in {b['commits']} commits, {b['pending']} pending"
+	if slowest:
+		text += f", slowest {slowest['query']} {slowest['max_ms']:.1f}ms"
+	return text
+
+
+def _seed_demo_data(conn):
+	"""Sample detections and alerts for the first user of a database that has none."""
+	user_row = conn.execute('SELECT id FROM users ORDER BY id LIMIT 1').fetchone()
+	if not user_row:
+		return
+	user_id = user_row[0]
+	if conn.execute('SELECT 1 FROM detections LIMIT 1').fetchone() is None:
+		for animal_type, location, timestamp in [
+			('Wild Dog', 'North Field', '2025-11-26 10:30:00'),
+			('Deer', 'Barn Area', '2025-11-26 08:15:00'),
+			('Boar', 'East Boundary', '2025-11-25 22:45:00'),
+			('Rabbit', 'Vegetable Garden', '2025-11-25 18:20:00'),
+		]:
+			conn.execute(
+				'INSERT INTO detections (user_id, animal_type, location, timestamp) VALUES (?, ?, ?, ?)',
+				(user_id, animal_type, location, timestamp)
+			)
+	if conn.execute('SELECT 1 FROM alerts LIMIT 1').fetchone() is None:
+		for message, alert_type, timestamp in [
+			('Wild Dog detected near North Field - Sound alert activated', 'danger', '2025-11-26 10:30:15'),
+			('High activity detected - Recommended to check cameras', 'warning', '2025-11-26 09:15:00'),
+		]:
+			conn.execute(
+				'INSERT INTO alerts (user_id, message, alert_type, timestamp) VALUES (?, ?, ?, ?)',
+				(user_id, message, alert_type, timestamp)
+			)
+
+
+# Rollup periods and the strftime() format of their bucket
+ROLLUP_BUCKETS = {'hourly': '%Y-%m-%d %H:00:00', 'daily': '%Y-%m-%d'}
+
+
+def _rebuild_rollups(conn, since=None):
+	"""Recount the rollup buckets from `since` (a timestamp; default everything) from the detections table.
+
+	Buckets up to the newest archived detection (retention.py) are left as
+	they are: their rows are no longer in the table, so a recount would lose them.
+	"""
+	archived_until = None
+	if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archive_segments'").fetchone():
+		archived_until = conn.execute(
+			"SELECT MAX(last_ts) FROM archive_segments WHERE table_name = 'detections' AND rows > 0").fetchone()[0]
+	for period, fmt in ROLLUP_BUCKETS.items():
+		where, params = [], []
+		if since:
+			# Recount whole buckets: start at the beginning of the bucket holding `since`
+			where.append('bucket >= strftime(?, ?)')
+			params += [fmt, since]
+		if archived_until:
+			where.append('bucket > strftime(?, ?)')
+			params += [fmt, archived_until]
+		condition = f" WHERE {' AND '.join(where)}" if where else ''
+		conn.execute(f'DELETE FROM detection_counts_{period}{condition}', params)
+		conn.execute(
+			f'''
+			INSERT INTO detection_counts_{period} (user_id, bucket, animal_type, location, count)
+			SELECT user_id, bucket, animal_type, location, COUNT(*) FROM (
+				SELECT user_id, strftime(?, timestamp) AS bucket, animal_type, COALESCE(location, '') AS location
+				FROM detections
+				WHERE timestamp >= MAX(COALESCE(strftime(?, ?), ''), COALESCE(strftime(?, ?), ''))
+			){condition}
+			GROUP BY 1, 2, 3, 4
+			''',
+			# The timestamp bound (start of the first recounted bucket) lets the index skip older rows
+			[fmt, fmt, since, fmt, archived_until] + params
+		)
+
+
+# Schema changes, applied once each in order. The applied version is kept in
+# PRAGMA user_version; never edit a released migration, append a new one.
+# A step is a SQL statement or a function taking the connection.
+MIGRATIONS = [
+	(1, 'base schema', [
 		'''
 		CREATE TABLE IF NOT EXISTS users (
 			id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,9 +548,7 @@ def init_db():
 			location TEXT,
 			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 		)
-		'''
-	)
-	cur.execute(
+		''',
 		'''
 		CREATE TABLE IF NOT EXISTS detections (
 			id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,9 +558,7 @@ def init_db():
 			timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 			FOREIGN KEY (user_id) REFERENCES users (id)
 		)
-		'''
-	)
-	cur.execute(
+		''',
 		'''
 		CREATE TABLE IF NOT EXISTS alerts (
 			id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,9 +568,7 @@ def init_db():
 			timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 			FOREIGN KEY (user_id) REFERENCES users (id)
 		)
-		'''
-	)
-	cur.execute(
+		''',
 		'''
 		CREATE TABLE IF NOT EXISTS uploads (
 			id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -61,75 +578,134 @@ def init_db():
 			timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 			FOREIGN KEY (user_id) REFERENCES users (id)
 		)
+		''',
+		_seed_demo_data,
+	]),
+	# Per-user history pages filter on user_id and sort by timestamp; the
+	# rowid (id) is part of every index entry, so (timestamp, id) order is free too
+	(2, 'per-user timestamp indexes', [
+		'CREATE INDEX IF NOT EXISTS idx_detections_user_time ON detections (user_id, timestamp)',
+		'CREATE INDEX IF NOT EXISTS idx_alerts_user_time ON alerts (user_id, timestamp)',
+		'CREATE INDEX IF NOT EXISTS idx_uploads_user_time ON uploads (user_id, timestamp)',
+		'ANALYZE',
+	]),
+	# History pages filtered by animal
+	(3, 'per-user animal index', [
+		'CREATE INDEX IF NOT EXISTS idx_detections_user_animal_time ON detections (user_id, animal_type, timestamp)',
+	]),
+	# Detection counts per user / hour or day / animal / location for the dashboards,
+	# kept current by a trigger and back-filled from existing rows
+	(4, 'detection rollups', [
+		*[f'''
+		CREATE TABLE IF NOT EXISTS detection_counts_{period} (
+			user_id INTEGER NOT NULL,
+			bucket TEXT NOT NULL,
+			animal_type TEXT NOT NULL,
+			location TEXT NOT NULL DEFAULT '',
+			count INTEGER NOT NULL,
+			PRIMARY KEY (user_id, bucket, animal_type, location)
+		) WITHOUT ROWID
+		''' for period in ROLLUP_BUCKETS],
+		*[f'CREATE INDEX IF NOT EXISTS idx_detection_counts_{period}_bucket ON detection_counts_{period} (bucket)'
+		  for period in ROLLUP_BUCKETS],
 		'''
-	)
-	conn.commit()
-	
-	# Seed dummy data if no detections exist
-	cur.execute('SELECT COUNT(*) as cnt FROM detections')
-	if cur.fetchone()[0] == 0:
-		cur.execute('SELECT id FROM users LIMIT 1')
-		user_row = cur.fetchone()
-		if user_row:
-			user_id = user_row[0]
-			for animal_type, location, timestamp in [
-				('Wild Dog', 'North Field', '2025-11-26 10:30:00'),
-				('Deer', 'Barn Area', '2025-11-26 08:15:00'),
-				('Boar', 'East Boundary', '2025-11-25 22:45:00'),
-				('Rabbit', 'Vegetable Garden', '2025-11-25 18:20:00'),
-			]:
-				cur.execute(
-					'INSERT INTO detections (user_id, animal_type, location, timestamp) VALUES (?, ?, ?, ?)',
-					(user_id, animal_type, location, timestamp)
-				)
-			conn.commit()
-	
-	# Seed dummy alerts if none exist
-	cur.execute('SELECT COUNT(*) as cnt FROM alerts')
-	if cur.fetchone()[0] == 0:
-		cur.execute('SELECT id FROM users LIMIT 1')
-		user_row = cur.fetchone()
-		if user_row:
-			user_id = user_row[0]
-			for message, alert_type, timestamp in [
-				('Wild Dog detected near North Field - Sound alert activated', 'danger', '2025-11-26 10:30:15'),
-				('High activity detected - Recommended to check cameras', 'warning', '2025-11-26 09:15:00'),
-			]:
-				cur.execute(
-					'INSERT INTO alerts (user_id, message, alert_type, timestamp) VALUES (?, ?, ?, ?)',
-					(user_id, message, alert_type, timestamp)
-				)
+		CREATE TRIGGER IF NOT EXISTS detections_rollup AFTER INSERT ON detections
+		BEGIN
+		''' + ''.join(f'''
+			INSERT INTO detection_counts_{period} (user_id, bucket, animal_type, location, count)
+			VALUES (NEW.user_id, strftime('{fmt}', NEW.timestamp), NEW.animal_type, COALESCE(NEW.location, ''), 1)
+			ON CONFLICT (user_id, bucket, animal_type, location) DO UPDATE SET count = count + 1;
+		''' for period, fmt in ROLLUP_BUCKETS.items()) + '''
+		END
+		''',
+		_rebuild_rollups,
+	]),
+	# Compressed archive segments written by retention.py
+	(5, 'archive segments', [
+		'''
+		CREATE TABLE IF NOT EXISTS archive_segments (
+			id INTEGER PRIMARY KEY AUTOINCREMENT,
+			table_name TEXT NOT NULL,
+			path TEXT NOT NULL,
+			first_ts TIMESTAMP,
+			last_ts TIMESTAMP,
+			rows INTEGER NOT NULL DEFAULT 0,
+			created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+		)
+		''',
+		'CREATE INDEX IF NOT EXISTS idx_archive_segments_table_time ON archive_segments (table_name, first_ts, last_ts)',
+	]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn=None):
+	"""The version of the last migration applied to the database."""
+	if conn is None:
+		with pool.connection() as conn:
+			return conn.execute('PRAGMA user_version').fetchone()[0]
+	return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+	"""Apply pending migrations, each in its own transaction. Returns the versions applied.
+
+	BEGIN IMMEDIATE takes the write lock before the version is re-read, so the
+	web app and detection workers starting together apply each migration once.
+	"""
+	applied = []
+	if schema_version(conn) == 0 and conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchone() is None:
+		# A new database: auto_vacuum can only be chosen before the first table
+		# exists (an older one is converted by retention.py --convert)
+		conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+		conn.execute('VACUUM')
+	for version, name, steps in MIGRATIONS:
+		if schema_version(conn) >= version:
+			continue
+		conn.execute('BEGIN IMMEDIATE')
+		try:
+			if schema_version(conn) >= version:
+				conn.rollback()
+				continue
+			for step in steps:
+				if callable(step):
+					step(conn)
+				else:
+					conn.execute(step)
+			conn.execute(f'PRAGMA user_version = {int(version)}')
 			conn.commit()
-	
-	conn.close()
+		except Exception:
+			conn.rollback()
+			raise
+		print(f"🗄️  Database migrated to version {version} ({name})")
+		applied.append(version)
+	return applied
+
+
+def init_db():
+	"""Bring the database schema up to date (a single PRAGMA read when it already is)."""
+	conn = _connect()
+	try:
+		if schema_version(conn) < SCHEMA_VERSION:
+			migrate(conn)
+	finally:
+		conn.close()
 
 
 def create_user(name: str, email: str, password: str, location: Optional[str] = None):
 	"""Create a new user. Returns the created user row as a dict, or None on failure."""
 	pw_hash = generate_password_hash(password)
 	try:
-		conn = get_conn()
-		cur = conn.cursor()
-		cur.execute('INSERT INTO users (name, email, password, location) VALUES (?, ?, ?, ?)',
-					(name, email, pw_hash, location))
-		conn.commit()
-		user_id = cur.lastrowid
-		cur.execute('SELECT id, name, email, location, created_at FROM users WHERE id = ?', (user_id,))
-		row = cur.fetchone()
-		conn.close()
-		return dict(row) if row else None
+		user_id = _execute('create_user', (name, email, pw_hash, location))
 	except sqlite3.IntegrityError:
 		# likely duplicate email
 		return None
+	return _query('user_by_id', (user_id,), one=True)
 
 
 def get_user_by_email(email: str):
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute('SELECT * FROM users WHERE email = ?', (email,))
-	row = cur.fetchone()
-	conn.close()
-	return dict(row) if row else None
+	return _query('user_by_email', (email,), one=True)
 
 
 def authenticate_user(email: str, password: str):
@@ -145,90 +721,190 @@ def authenticate_user(email: str, password: str):
 
 def get_user_detections(user_id: int):
 	"""Get all detections for a user, ordered by most recent first."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'SELECT id, animal_type, location, timestamp FROM detections WHERE user_id = ? ORDER BY timestamp DESC',
-		(user_id,)
-	)
-	rows = cur.fetchall()
-	conn.close()
-	return [dict(row) for row in rows]
+	return _query('user_detections', (user_id,))
+
+
+def encode_cursor(row):
+	"""Opaque page cursor for the (timestamp, id) position of a row."""
+	return base64.urlsafe_b64encode(f"{row['timestamp']}|{row['id']}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+	"""(timestamp, id) from encode_cursor(); raises ValueError for a malformed cursor."""
+	try:
+		text = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+		timestamp, row_id = text.rsplit('|', 1)
+		return timestamp, int(row_id)
+	except (ValueError, UnicodeDecodeError) as e:
+		raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _page(name, table, columns, user_id, filters, cursor=None, since=None, until=None, limit=50):
+	"""One page of a user's rows, newest first, by keyset on (timestamp, id).
+
+	Each page is an index range scan that stops after `limit` rows, so its
+	cost does not depend on how deep into the history it is. `since` /
+	`until` bound the timestamp ('YYYY-MM-DD[ HH:MM:SS]', until exclusive).
+	Returns (rows, next_cursor); next_cursor is None on the last page.
+	"""
+	where = ['user_id = ?']
+	params = [user_id]
+	for column, value in filters:
+		if value:
+			where.append(f'{column} = ?')
+			params.append(value)
+	if since:
+		where.append('timestamp >= ?')
+		params.append(since)
+	if until:
+		where.append('timestamp < ?')
+		params.append(until)
+	if cursor:
+		where.append('(timestamp, id) < (?, ?)')
+		params.extend(decode_cursor(cursor))
+	# One row more than asked tells whether another page exists
+	params.append(limit + 1)
+	sql = (f"SELECT id, {columns}, timestamp FROM {table} WHERE {' AND '.join(where)} "
+		   f"ORDER BY timestamp DESC, id DESC LIMIT ?")
+	rows = _query(name, params, sql=sql)
+	if len(rows) > limit:
+		rows = rows[:limit]
+		return rows, encode_cursor(rows[-1])
+	return rows, None
+
+
+def get_detections_page(user_id: int, cursor: Optional[str] = None, limit: int = 50,
+						animal_type: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None):
+	"""A page of a user's detections, most recent first. Returns (rows, next_cursor)."""
+	return _page('detections_page', 'detections', 'animal_type, location', user_id,
+				 [('animal_type', animal_type)], cursor, since, until, limit)
+
+
+def get_alerts_page(user_id: int, cursor: Optional[str] = None, limit: int = 50,
+					alert_type: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None):
+	"""A page of a user's alerts, most recent first. Returns (rows, next_cursor)."""
+	return _page('alerts_page', 'alerts', 'message, alert_type', user_id,
+				 [('alert_type', alert_type)], cursor, since, until, limit)
+
+
+def rebuild_rollups(since: Optional[str] = None):
+	"""Catch-up job: recount the dashboard rollups from `since` (default: all history).
+
+	The trigger keeps them current on every insert, so this is only needed
+	after editing detections by hand or restoring a backup. Buckets holding
+	archived detections are kept as they are.
+	"""
+	with pool.connection() as conn:
+		started = time.perf_counter()
+		conn.execute('BEGIN IMMEDIATE')
+		_rebuild_rollups(conn, since)
+		conn.commit()
+		query_stats.record('rebuild_rollups', time.perf_counter() - started)
+
+
+def _rollup_where(user_id, since, until, animal_type):
+	where, params = [], []
+	if user_id is not None:
+		where.append('user_id = ?')
+		params.append(user_id)
+	if since:
+		where.append('bucket >= ?')
+		params.append(since)
+	if until:
+		where.append('bucket < ?')
+		params.append(until)
+	if animal_type:
+		where.append('animal_type = ?')
+		params.append(animal_type)
+	return (' WHERE ' + ' AND '.join(where)) if where else '', params
+
+
+def get_detection_trend(user_id: Optional[int] = None, period: str = 'daily', since: Optional[str] = None,
+						until: Optional[str] = None, animal_type: Optional[str] = None):
+	"""Detection counts per bucket and animal from the rollups ([{'bucket', 'animal_type', 'count'}]).
+
+	`period` is 'hourly' or 'daily'; user_id None covers every user. The
+	cost depends on the number of buckets in the range, not on how many
+	detections exist.
+	"""
+	if period not in ROLLUP_BUCKETS:
+		raise ValueError(f"Unknown period: {period}")
+	where, params = _rollup_where(user_id, since, until, animal_type)
+	sql = (f"SELECT bucket, animal_type, SUM(count) AS count FROM detection_counts_{period}{where} "
+		   f"GROUP BY bucket, animal_type ORDER BY bucket")
+	return _query(f'trend_{period}', params, sql=sql)
+
+
+def get_detection_totals(user_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None,
+						 group_by: str = 'animal_type'):
+	"""Detection counts per animal_type (or location) between two days, from the daily rollup."""
+	if group_by not in ('animal_type', 'location'):
+		raise ValueError(f"Cannot group by {group_by}")
+	where, params = _rollup_where(user_id, since, until, None)
+	sql = (f"SELECT {group_by}, SUM(count) AS count FROM detection_counts_daily{where} "
+		   f"GROUP BY {group_by} ORDER BY count DESC")
+	return _query(f'totals_{group_by}', params, sql=sql)
+
+
+def get_user_animal_types(user_id: int):
+	"""Distinct animal types a user has detections for (for the history filter)."""
+	return [row['animal_type'] for row in _query('user_animal_types', (user_id,))]
 
 
 def add_detection(user_id: int, animal_type: str, location: Optional[str] = None):
-	"""Insert a new detection record."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'INSERT INTO detections (user_id, animal_type, location) VALUES (?, ?, ?)',
-		(user_id, animal_type, location)
-	)
-	conn.commit()
-	conn.close()
+	"""Insert a new detection record (buffered, see WriteBuffer)."""
+	write_rows('add_detection', [(user_id, animal_type, location, _utc_timestamp())])
 
 
 def get_user_alerts(user_id: int):
 	"""Get all alerts for a user, ordered by most recent first."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'SELECT id, message, alert_type, timestamp FROM alerts WHERE user_id = ? ORDER BY timestamp DESC',
-		(user_id,)
-	)
-	rows = cur.fetchall()
-	conn.close()
-	return [dict(row) for row in rows]
+	return _query('user_alerts', (user_id,))
 
 
 def add_alert(user_id: int, message: str, alert_type: str = 'warning'):
-	"""Insert a new alert record."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'INSERT INTO alerts (user_id, message, alert_type) VALUES (?, ?, ?)',
-		(user_id, message, alert_type)
-	)
-	conn.commit()
-	conn.close()
+	"""Insert a new alert record (buffered, see WriteBuffer)."""
+	write_rows('add_alert', [(user_id, message, alert_type, _utc_timestamp())])
 
 
 def get_all_users():
 	"""Get all users from the database with their details."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'SELECT id, name, email, location, created_at FROM users ORDER BY created_at DESC'
-	)
-	rows = cur.fetchall()
-	conn.close()
-	return [dict(row) for row in rows]
+	return _query('all_users')
 
 
-def add_upload(user_id: int, filename: str, original_name: str                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                    ):
+def add_upload(user_id: int, filename: str, original_name: str):
 	"""Insert a new upload record."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'INSERT INTO uploads (user_id, filename, original_name) VALUES (?, ?, ?)',
-		(user_id, filename, original_name)
-	)
-	conn.commit()
-	conn.close()
+	_execute('add_upload', (user_id, filename, original_name))
 
 
 def get_user_uploads(user_id: int):
 	"""Get all uploads for a user, ordered by most recent first."""
-	conn = get_conn()
-	cur = conn.cursor()
-	cur.execute(
-		'SELECT id, filename, original_name, timestamp FROM uploads WHERE user_id = ? ORDER BY timestamp DESC',
-		(user_id,)
-	)
-	rows = cur.fetchall()
-	conn.close()
-	return [dict(row) for row in rows]
+	return _query('user_uploads', (user_id,))
+
+
+_ready = False
+_ready_lock = threading.Lock()
+_ready_thread = None
+
 
+def ensure_ready():
+	"""Migrate the schema and replay buffered rows of crashed processes, once per process.
 
-# Initialize DB on import
-init_db()
\ No newline at end of file
+	Runs on the first connection rather than on import, so processes that only
+	import this module (e.g. multiprocessing children of the web app) leave the
+	database alone.
+	"""
+	global _ready, _ready_thread
+	if _ready or _ready_thread == threading.get_ident():
+		# Ready, or this thread is the one getting it ready
+		return
+	with _ready_lock:
+		if _ready:
+			return
+		_ready_thread = threading.get_ident()
+		try:
+			init_db()
+			if write_buffer is not None and write_buffer.spool_dir:
+				write_buffer.replay_spools()
+			_ready = True
+		finally:
+			_ready_thread = None
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""
+Background ingestion of dataset ZIP uploads.
+
+The web request only saves the upload and queues an IngestJob; a
+background thread then streams the archive member by member:
+
+- limits are checked before anything is extracted (member count, per-file
+  and total uncompressed size, compression ratio) and again while reading,
+  since the sizes in a ZIP header can lie (zip bombs)
+- each image is hashed while it is read; content already in dataset/ (or
+  earlier in the same ZIP) is skipped as a duplicate
+- new images are decoded and checked on a process pool (PIL, size limits)
+  with a bounded number in flight, so memory stays flat however big the ZIP
+- valid images are written atomically under their (sanitised) path
+
+Progress is kept on the job (see IngestJob.status()) for the admin page to
+poll. The content-hash index of dataset/ is cached in dataset/.hashes.json
+so later uploads only hash files that changed.
+"""
+
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'gif'}
+INDEX_FILE = '.hashes.json'
+
+
+class IngestError(Exception):
+    """The archive breaks a limit or cannot be read; the job stops."""
+
+
+def validate_image(data, min_size=32, max_pixels=50_000_000):
+    """Decode an image (runs in a worker process). Returns (ok, info or error message)."""
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+            if width * height > max_pixels:
+                return False, f"too large ({width}x{height})"
+            if width < min_size or height < min_size:
+                return False, f"too small ({width}x{height})"
+            fmt = img.format
+            img.load()
+        return True, {'width': width, 'height': height, 'format': fmt}
+    except Exception as e:
+        return False, f"not a valid image: {e}"
+
+
+def _safe_member_path(name):
+    """Relative target path of a ZIP member, or None for anything that could escape the dataset folder."""
+    path = os.path.normpath(name.replace('\\', '/'))
+    parts = path.split(os.sep)
+    if os.path.isabs(path) or path.startswith('..') or ':' in parts[0]:
+        return None
+    if any(p.startswith('.') or p == '__MACOSX' for p in parts):
+        return None
+    return path
+
+
+class HashIndex:
+    """sha256 -> relative path of every image in the dataset folder, cached by (size, mtime)."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_FILE)
+        self.by_hash = {}
+        self._files = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """Hash files that are new or changed since the cached index; returns how many were hashed."""
+        with self._lock:
+            cached = {}
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                pass
+            files, hashed = {}, 0
+            for root, dirs, names in os.walk(self.folder):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in names:
+                    if name.startswith('.') or name.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    full = os.path.join(root, name)
+                    rel = os.path.relpath(full, self.folder)
+                    st = os.stat(full)
+                    entry = cached.get(rel)
+                    if not entry or entry[0] != st.st_size or entry[1] != st.st_mtime:
+                        entry = [st.st_size, st.st_mtime, self._hash_file(full)]
+                        hashed += 1
+                    files[rel] = entry
+            self._files = files
+            self.by_hash = {entry[2]: rel for rel, entry in files.items()}
+            self._loaded = True
+            self._save()
+            return hashed
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _save(self):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._files, f)
+        os.replace(tmp, self.path)
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def lookup(self, digest):
+        with self._lock:
+            return self.by_hash.get(digest)
+
+    def add(self, rel, digest):
+        full = os.path.join(self.folder, rel)
+        st = os.stat(full)
+        with self._lock:
+            self._files[rel] = [st.st_size, st.st_mtime, digest]
+            self.by_hash[digest] = rel
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+
+class IngestJob:
+    """Progress and outcome of one ZIP ingestion."""
+
+    def __init__(self, zip_path, original_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.zip_path = zip_path
+        self.original_name = original_name
+        self.state = 'queued'  # queued | running | done | failed
+        self.error = None
+        self.counts = {'members': 0, 'processed': 0, 'added': 0, 'duplicates': 0, 'invalid': 0, 'skipped': 0}
+        self.bytes_read = 0
+        self.problems = deque(maxlen=50)  # (member, reason) of the latest rejected files
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def reject(self, counter, member, reason):
+        self.counts[counter] += 1
+        self.problems.append((member, reason))
+
+    def status(self):
+        members = self.counts['members']
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            'id': self.id,
+            'file': self.original_name,
+            'state': self.state,
+            'error': self.error,
+            'progress': self.counts['processed'] / members if members else 0.0,
+            'counts': dict(self.counts),
+            'mb_read': self.bytes_read / (1024 * 1024),
+            'elapsed': elapsed,
+            'problems': [{'file': m, 'reason': r} for m, r in self.problems],
+        }
+
+
+class DatasetIngestor:
+    """Runs ingestion jobs one at a time in a background thread.
+
+    Config keys (DATASET_CONFIG): max_files, max_file_mb, max_total_mb,
+    max_ratio (uncompressed / compressed size of a member), min_image_size,
+    max_pixels, workers (validation processes, default cpu count) and
+    max_jobs (finished jobs kept for the status page).
+    """
+
+    def __init__(self, dataset_folder, config=None):
+        config = config or {}
+        self.folder = dataset_folder
+        self.max_files = config.get('max_files', 50000)
+        self.max_file_bytes = int(config.get('max_file_mb', 25) * 1024 * 1024)
+        self.max_total_bytes = int(config.get('max_total_mb', 4096) * 1024 * 1024)
+        self.max_ratio = config.get('max_ratio', 100)
+        self.min_size = config.get('min_image_size', 32)
+        self.max_pixels = config.get('max_pixels', 50_000_000)
+        self.workers = config.get('workers') or os.cpu_count() or 1
+        self.max_jobs = config.get('max_jobs', 20)
+        self.index = HashIndex(dataset_folder)
+        self.jobs = {}
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataset-ingest')
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, zip_path, original_name):
+        """Queue a saved ZIP for ingestion; it is deleted when the job ends."""
+        job = IngestJob(zip_path, original_name)
+        with self._lock:
+            self.jobs[job.id] = job
+            finished = [j for j in self.jobs.values() if j.state in ('done', 'failed')]
+            for old in sorted(finished, key=lambda j: j.created_at)[:max(0, len(finished) - self.max_jobs)]:
+                del self.jobs[old.id]
+        self._runner.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def statuses(self):
+        with self._lock:
+            jobs = sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return [job.status() for job in jobs]
+
+    def _process_pool(self):
+        if self._pool is None:
+            # spawn: never fork the threaded web server. Each child re-imports
+            # the main script (app.py as __mp_main__), which therefore starts
+            # nothing on import (see app.start_background_jobs, database.ensure_ready)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _run(self, job):
+        job.state = 'running'
+        job.started_at = time.time()
+        try:
+            self.index.ensure_loaded()
+            self._ingest(job)
+            job.state = 'done'
+            print(f"📦 Dataset upload {job.original_name}: {job.counts['added']} added, "
+                  f"{job.counts['duplicates']} duplicates, {job.counts['invalid']} invalid")
+        except (IngestError, zipfile.BadZipFile) as e:
+            job.state = 'failed'
+            job.error = str(e)
+        except Exception as e:
+            job.state = 'failed'
+            job.error = f"Unexpected error: {e}"
+            print(f"❌ Dataset upload {job.original_name} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self.index.save()
+            try:
+                os.remove(job.zip_path)
+            except OSError:
+                pass
+
+    def _check_limits(self, members):
+        if len(members) > self.max_files:
+            raise IngestError(f"Too many files ({len(members)} > {self.max_files})")
+        total = sum(info.file_size for info in members)
+        if total > self.max_total_bytes:
+            raise IngestError(f"Archive expands to {total / (1024 * 1024):.0f} MiB "
+                              f"(limit {self.max_total_bytes / (1024 * 1024):.0f} MiB)")
+        for info in members:
+            if info.compress_size and info.file_size / info.compress_size > self.max_ratio:
+                raise IngestError(f"{info.filename} is compressed {info.file_size // info.compress_size}:1; "
+                                  f"refusing a possible zip bomb")
+
+    def _read_member(self, z, info):
+        """Read a member with a hard cap on the bytes actually produced; returns (data, sha256)."""
+        limit = min(info.file_size, self.max_file_bytes)
+        digest = hashlib.sha256()
+        chunks, size = [], 0
+        with z.open(info) as source:
+            for block in iter(lambda: source.read(1 << 16), b''):
+                size += len(block)
+                if size > limit:
+                    raise IngestError(f"{info.filename} is larger than it claims to be")
+                digest.update(block)
+                chunks.append(block)
+        return b''.join(chunks), digest.hexdigest()
+
+    def _ingest(self, job):
+        with zipfile.ZipFile(job.zip_path) as z:
+            members = []
+            for info in z.infolist():
+                if info.is_dir():
+                    continue
+                rel = _safe_member_path(info.filename)
+                ext = info.filename.rsplit('.', 1)[-1].lower() if '.' in info.filename else ''
+                if rel is None or ext not in IMAGE_EXTENSIONS:
+                    job.reject('skipped', info.filename, 'not an image or unsafe path')
+                    continue
+                members.append((info, rel))
+            job.counts['members'] = len(members) + job.counts['skipped']
+            job.counts['processed'] = job.counts['skipped']
+            self._check_limits([info for info, _ in members])
+
+            pool = self._process_pool()
+            in_flight = deque()
+            seen = {}
+            for info, rel in members:
+                if info.file_size > self.max_file_bytes:
+                    job.reject('invalid', info.filename, f"larger than {self.max_file_bytes // (1024 * 1024)} MiB")
+                    job.counts['processed'] += 1
+                    continue
+                data, digest = self._read_member(z, info)
+                job.bytes_read += len(data)
+                if self.index.lookup(digest) or digest in seen:
+                    job.reject('duplicates', info.filename,
+                               f"same content as {self.index.lookup(digest) or seen[digest]}")
+                    job.counts['processed'] += 1
+                    continue
+                seen[digest] = rel
+                in_flight.append((rel, digest, data, pool.submit(validate_image, data, self.min_size, self.max_pixels)))
+                # Bounded look-ahead: at most two images per worker decoded or waiting
+                while len(in_flight) >= 2 * self.workers:
+                    self._finish(job, *in_flight.popleft())
+            while in_flight:
+                self._finish(job, *in_flight.popleft())
+
+    def _finish(self, job, rel, digest, data, future):
+        ok, info = future.result()
+        job.counts['processed'] += 1
+        if not ok:
+            job.reject('invalid', rel, info)
+            return
+        target = os.path.join(self.folder, rel)
+        if os.path.exists(target):
+            # Same name, different content: keep both
+            root, ext = os.path.splitext(rel)
+            rel = f"{root}_{digest[:8]}{ext}"
+            target = os.path.join(self.folder, rel)
+        os.makedirs(os.path.dirname(target) or self.folder, exist_ok=True)
+        tmp = f"{target}.part"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+        self.index.add(rel, digest)
+        job.counts['added'] += 1
+
+    def close(self):
+        self._runner.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
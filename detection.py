@@ -1,17 +1,24 @@
-from ultralytics import YOLO
 import cv2
 import signal
 import sys
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
 from datetime import datetime
 import os
-from database import add_detection, add_alert
+from database import add_detection, add_alert, flush_writes, format_db_stats
 import threading
 import time
-import subprocess
+from functools import lru_cache
+import numpy as np
+from pipeline import CaptureThread, LatestFrameQueue, StageStats, format_stats
+from motion import MotionGate, format_motion_stats
+from postprocess import CLS, CONF, EMPTY_DETECTIONS, build_class_tables, extract_detections, merge_detections
+from zones import ZoneLayout
+from tracker import Tracker
+from scheduler import AdaptiveScheduler
+from alerts import Alert, AlertDispatcher
+from mailer import AlertMailer, EmailAlert
+from imagestore import ImageWriter
+from sound import SoundPlayer
+from backends import load_model
 
 # Sound effect mapping for animals
 ANIMAL_SOUNDS = {
@@ -21,14 +28,6 @@ ANIMAL_SOUNDS = {
 }
 
 
-def load_sound_file(animal_type):
-    """Load a sound file for the given animal type. Returns file path if exists, None otherwise."""
-    sound_file = ANIMAL_SOUNDS.get(animal_type.lower())
-    if sound_file and os.path.exists(sound_file):
-        return sound_file
-    return None
-
-
 # Import configuration
 try:
     from config import EMAIL_CONFIG, DETECTION_CONFIG, TARGET_ANIMALS, SOUND_CONFIG, DATABASE_CONFIG
@@ -44,17 +43,54 @@ except ImportError:
     }
     DETECTION_CONFIG = {
         'confidence_threshold': 0.5,
-        'alert_cooldown': 60,
+        'detect_interval': 1,
+        'imgsz': 640,
         'camera_index': 0,
         'frame_width': 640,
         'frame_height': 480,
         'save_detection_images': True,
-        'detections_folder': 'detections'
+        'detections_folder': 'detections',
+        'queue_size': 1,
+        'stats_interval': 5,
+        'headless': None,
+        'annotate_alert_images': False,
+        'jpeg_quality': 90,
+        'image_queue_size': 32
     }
     TARGET_ANIMALS = ['bird', 'cat', 'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear']
     SOUND_CONFIG = {'enabled': True, 'beep_frequency': 1000, 'beep_duration': 500, 'beep_count': 3}
     DATABASE_CONFIG = {'user_id': 1}
 
+try:
+    from config import CAMERAS
+except ImportError:
+    CAMERAS = []
+
+try:
+    from config import MOTION_CONFIG
+except ImportError:
+    MOTION_CONFIG = {'enabled': True, 'min_changed_area': 0.01, 'heartbeat_interval': 10}
+
+try:
+    from config import TRACKER_CONFIG
+except ImportError:
+    TRACKER_CONFIG = {'iou_threshold': 0.3, 'min_hits': 1, 'max_misses': 5, 'max_age': 30}
+
+try:
+    from config import SCHEDULER_CONFIG
+except ImportError:
+    SCHEDULER_CONFIG = {'enabled': False}
+
+try:
+    from config import ALERT_CONFIG
+except ImportError:
+    ALERT_CONFIG = {}
+
+try:
+    from config import MODEL_CONFIG
+except ImportError:
+    MODEL_CONFIG = {'weights': 'yolov8n.pt', 'backend': 'pytorch'}
+
 # Allow overriding sender email from the environment (passed by Flask when starting the subprocess)
 env_sender = os.environ.get('DETECTION_SENDER_EMAIL')
 if env_sender:
@@ -68,7 +104,12 @@ if env_recipient:
 
 # Global variables
 should_exit = False
-last_alert_time = {}
+# SMTP session (and digest buffer) for alert emails; run_detection() opens a new one per run
+mailer = AlertMailer(EMAIL_CONFIG)
+# Encodes each alert frame once and writes it to disk in the background
+image_writer = ImageWriter(DETECTION_CONFIG)
+# Decoded alert sounds and the single player process; created by init_sound()
+sound_player = None
 
 
 def signal_handler(sig, frame):
@@ -79,327 +120,558 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
-def send_email_alert(animal_type, confidence, image_path=None):
-    """Send email alert when animal is detected."""
-    if not EMAIL_CONFIG.get('enabled', False):
-        return False
-    
-    if not EMAIL_CONFIG.get('sender_email') or not EMAIL_CONFIG.get('sender_password'):
-        print("⚠️  Email not configured. Skipping email alert.")
-        return False
-    
-    try:
-        msg = MIMEMultipart()
-        # Use override sender (logged-in user's email) for the From header if provided,
-        # but authenticate with configured SMTP sender credentials.
-        from_header = EMAIL_CONFIG.get('override_sender') or EMAIL_CONFIG.get('sender_email')
-        msg['From'] = from_header
-        # Also set Reply-To so replies go to the logged-in user when override is used
-        if EMAIL_CONFIG.get('override_sender'):
-            msg['Reply-To'] = EMAIL_CONFIG.get('override_sender')
-        msg['To'] = EMAIL_CONFIG['recipient_email']
-        msg['Subject'] = f"🚨 ALERT: {animal_type.upper()} Detected!"
-        
-        # Email body with HTML formatting
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; margin: 20px;">
-            <div style="background-color: #f8d7da; border: 2px solid #d9534f; padding: 20px; border-radius: 5px;">
-                <h2 style="color: #d9534f; margin-top: 0;">🚨 Animal Detection Alert</h2>
-                <table style="width: 100%; margin-top: 15px;">
-                    <tr>
-                        <td style="padding: 8px;"><strong>Animal Type:</strong></td>
-                        <td style="padding: 8px;">{animal_type.capitalize()}</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 8px;"><strong>Confidence:</strong></td>
-                        <td style="padding: 8px;">{confidence:.2%}</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 8px;"><strong>Detection Time:</strong></td>
-                        <td style="padding: 8px;">{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</td>
-                    </tr>
-                    <tr>
-                        <td style="padding: 8px;"><strong>Location:</strong></td>
-                        <td style="padding: 8px;">Farm Perimeter Camera</td>
-                    </tr>
-                </table>
-            </div>
-            <div style="margin-top: 20px; padding: 15px; background-color: #f5f5f5; border-radius: 5px;">
-                <p style="margin: 0; color: #666; font-size: 14px;">
-                    <strong>Action Required:</strong> Please check your farm perimeter.
-                    Sound alert has been activated to deter the animal.
-                </p>
-            </div>
-            <hr style="margin-top: 20px; border: none; border-top: 1px solid #ddd;">
-            <p style="color: #999; font-size: 12px; margin-top: 20px;">
-                This is an automated alert from your Animal Repellent Detection System.
-                <br>Powered by YOLO Object Detection
-            </p>
-        </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(body, 'html'))
-        
-        # Attach detection image if available
-        if image_path and os.path.exists(image_path):
-            try:
-                with open(image_path, 'rb') as f:
-                    img_data = f.read()
-                    image = MIMEImage(img_data, name=os.path.basename(image_path))
-                    msg.attach(image)
-            except Exception as e:
-                print(f"⚠️  Could not attach image: {e}")
-        
-        # Send email
-        with smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port']) as server:
-            server.starttls()
-            server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-            server.send_message(msg)
-        
-        print(f"✉️  Email alert sent successfully for {animal_type}")
-        return True
-    
-    except smtplib.SMTPAuthenticationError:
-        print("❌ Email authentication failed. Please check your email and app password.")
-        return False
-    except Exception as e:
-        print(f"❌ Failed to send email: {e}")
-        return False
+def send_email_alert(animal_type, confidence, image_path=None, location='Farm Perimeter Camera', image_data=None):
+    """Send email alert when animal is detected (or queue it for the next digest)."""
+    return mailer.send_alert(EmailAlert(animal_type, confidence, location, image_path, image_data=image_data))
 
 
 def play_sound_alert(animal_type=None):
-    """Play sound alert. If animal_type is provided, try to play the corresponding sound file.
-    Otherwise fall back to beep."""
-    if not SOUND_CONFIG.get('enabled', True):
+    """Queue the preloaded sound for animal_type (or the beep) on the shared player."""
+    if not SOUND_CONFIG.get('enabled', True) or sound_player is None:
         return
-    
-    # Try to play animal-specific sound if provided
-    if animal_type:
-        sound_file = load_sound_file(animal_type)
-        if sound_file:
-            try:
-                # Try to play sound using Windows Media Player or ffplay
-                try:
-                    # Windows: use Windows Media Player
-                    subprocess.Popen(['powershell', '-Command', f'(New-Object Media.SoundPlayer "{sound_file}").PlaySync()'],
-                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    print(f"🔊 Playing sound alert for {animal_type}: {sound_file}")
-                    return
-                except Exception:
-                    # Try ffplay if available
-                    try:
-                        subprocess.run(['ffplay', '-nodisp', '-autoexit', sound_file],
-                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
-                        print(f"🔊 Playing sound alert for {animal_type}: {sound_file}")
-                        return
-                    except Exception:
-                        print(f"⚠️  Could not play {sound_file}, falling back to beep")
-            except Exception as e:
-                print(f"⚠️  Error playing sound: {e}")
-    
-    # Fall back to beep
+    if sound_player.play(animal_type):
+        print(f"🔊 Sound alert queued for {animal_type or 'beep'}")
+
+
+def save_detection_image(frame, animal_type, camera_id=None, track_id=None):
+    """Encode the detected frame once and queue it for saving; returns the DetectionImage."""
+    if not DETECTION_CONFIG.get('save_detection_images', True):
+        return None
+    return image_writer.encode(frame, animal_type, camera_id, track_id)
+
+
+def load_cameras():
+    """Return the camera list from config.CAMERAS, or a single camera from DETECTION_CONFIG.
+
+    If DETECTION_CAMERAS is set (comma-separated ids, used by the worker
+    supervisor) only those cameras are returned.
+    """
+    cameras = []
+    for i, cam in enumerate(CAMERAS or []):
+        cameras.append({
+            'id': str(cam.get('id', f'cam{i}')),
+            'source': cam.get('source', i),
+            'location': cam.get('location', 'Camera Feed'),
+            'zones': cam.get('zones', []),
+            'tile_size': cam.get('tile_size', DETECTION_CONFIG.get('tile_size', 0)),
+            'tile_overlap': cam.get('tile_overlap', DETECTION_CONFIG.get('tile_overlap', 0.2)),
+        })
+    if not cameras:
+        cameras.append({
+            'id': 'cam0',
+            'source': DETECTION_CONFIG.get('camera_index', 0),
+            'location': 'Camera Feed',
+            'zones': [],
+            'tile_size': DETECTION_CONFIG.get('tile_size', 0),
+            'tile_overlap': DETECTION_CONFIG.get('tile_overlap', 0.2),
+        })
+    selected = os.environ.get('DETECTION_CAMERAS')
+    if selected:
+        wanted = {c.strip() for c in selected.split(',') if c.strip()}
+        cameras = [camera for camera in cameras if camera['id'] in wanted]
+    return cameras
+
+
+class CameraContext:
+    """Per-camera runtime state shared by the pipeline stages."""
+
+    def __init__(self, camera, queue):
+        self.camera = camera
+        self.camera_id = camera['id']
+        self.queue = queue
+        self.gate = MotionGate(MOTION_CONFIG)
+        self.layout = ZoneLayout(camera, DETECTION_CONFIG)
+        self.tracker = Tracker(TRACKER_CONFIG)
+        # Frames coasted on the tracker since the detector last ran for this camera
+        self.skipped = DETECTION_CONFIG.get('detect_interval', 1)
+        self.frame_count = 0
+        # Track ids in the last published 'detection' event
+        self.reported_tracks = frozenset()
+
+
+def inference_stage(model, contexts, ready, out_queue, stats, stop_event, target_mask, scheduler):
+    """Batch the newest frame from every camera into one YOLO call and pass results on.
+
+    The detector runs on every Nth frame of a camera that passes its
+    MotionGate, where N and the input resolution come from the
+    AdaptiveScheduler; other frames skip the model and carry the
+    camera's tracks forward. Every inferred frame contributes one image per
+    region of its ZoneLayout (the whole frame, zone crops or tiles); region
+    results are shifted back, merged with NMS, filtered to the zones and fed
+    to the tracker. Each packet leaves with a detections array (see
+    postprocess.py) in original frame coordinates plus matching track IDs.
+    """
+    frame_width = DETECTION_CONFIG.get('frame_width', 640)
+    frame_height = DETECTION_CONFIG.get('frame_height', 480)
+    confidence_threshold = DETECTION_CONFIG.get('confidence_threshold', 0.5)
+    nms_iou_threshold = DETECTION_CONFIG.get('nms_iou_threshold', 0.5)
+
     try:
-        import winsound
-        for _ in range(SOUND_CONFIG.get('beep_count', 3)):
-            winsound.Beep(
-                SOUND_CONFIG.get('beep_frequency', 1000), 
-                SOUND_CONFIG.get('beep_duration', 500)
-            )
-            time.sleep(0.2)
-        print("🔊 Sound alert played (beep)")
-    except ImportError:
-        # winsound is Windows-only
-        print("⚠️  Sound alert not available on this platform")
+        while not stop_event.is_set():
+            if not ready.wait(timeout=0.5):
+                continue
+            # Clear before draining so a frame arriving meanwhile re-arms the event
+            ready.clear()
+            packets = []
+            detect_interval = scheduler.stride
+            for ctx in contexts.values():
+                packet = ctx.queue.get_nowait()
+                if packet is None:
+                    continue
+                scheduler.offer(len(contexts))
+                if ctx.skipped + 1 < detect_interval or not ctx.gate.should_infer(packet.frame):
+                    ctx.skipped += 1
+                    packet.detections, packet.track_ids = ctx.tracker.coast()
+                    out_queue.put(packet)
+                    continue
+                ctx.skipped = 0
+                packets.append(packet)
+            if not packets:
+                continue
+
+            process_frames = []
+            jobs = []
+            input_width, input_height = scheduler.input_size(frame_width, frame_height)
+            for packet in packets:
+                regions = contexts[packet.camera_id].layout.regions(packet.frame.shape)
+                for region in regions:
+                    crop = region.crop(packet.frame)
+                    if region.native:
+                        scale = (1.0, 1.0)
+                    else:
+                        scale = (crop.shape[1] / input_width, crop.shape[0] / input_height)
+                        crop = cv2.resize(crop, (input_width, input_height))
+                    process_frames.append(crop)
+                    jobs.append((region, scale))
+
+            # Run YOLO detection once for the whole batch
+            started = time.time()
+            results = model(process_frames, verbose=False, imgsz=scheduler.imgsz())
+            scheduler.record(time.time() - started)
+
+            index = 0
+            for packet in packets:
+                ctx = contexts[packet.camera_id]
+                layout = ctx.layout
+                parts = []
+                for _ in layout.regions(packet.frame.shape):
+                    region, scale = jobs[index]
+                    detections = extract_detections(results[index], target_mask, confidence_threshold, scale)
+                    index += 1
+                    if len(detections):
+                        detections[:, :4] += (region.x0, region.y0, region.x0, region.y0)
+                        parts.append(detections)
+
+                if not parts:
+                    detections = EMPTY_DETECTIONS
+                elif len(parts) == 1:
+                    detections = parts[0]
+                else:
+                    detections = merge_detections(np.concatenate(parts), nms_iou_threshold)
+                detections = layout.filter(detections, packet.frame.shape)
+                if len(detections):
+                    scheduler.boost()
+                packet.detections, packet.track_ids = ctx.tracker.update(detections)
+                stats.tick(packet.age)
+                out_queue.put(packet)
     except Exception as e:
-        print(f"⚠️  Sound alert error: {e}")
+        print(f"\n❌ Error in inference stage: {e}")
+        import traceback
+        traceback.print_exc()
+        stop_event.set()
+    finally:
+        out_queue.close()
+
+
+def is_headless():
+    """Return True when no window should be shown.
+
+    DETECTION_HEADLESS in the environment wins (set by camera.py for
+    background runs), then DETECTION_CONFIG['headless']; if that is None the
+    mode is auto-detected from the presence of a display on Linux.
+    """
+    env = os.environ.get('DETECTION_HEADLESS')
+    if env is not None:
+        return env.strip().lower() not in ('', '0', 'false', 'no')
+    setting = DETECTION_CONFIG.get('headless')
+    if setting is not None:
+        return bool(setting)
+    if sys.platform.startswith('linux'):
+        return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return False
+
 
+@lru_cache(maxsize=2048)
+def label_text_size(text):
+    """cv2.getTextSize for box labels, cached per label string."""
+    return cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
 
-def should_send_alert(animal_type):
-    """Check if enough time has passed since last alert."""
-    current_time = time.time()
-    cooldown = DETECTION_CONFIG.get('alert_cooldown', 60)
+
+def draw_detection(display_frame, label, confidence, box, track_id=None):
+    """Draw a bounding box and label for one detection."""
+    x1, y1, x2, y2 = (int(v) for v in box)
+    cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+
+    text = f"{label.upper()} {confidence:.2f}"
+    if track_id is not None:
+        text = f"{label.upper()} #{track_id} {confidence:.2f}"
+    text_size = label_text_size(text)
+    cv2.rectangle(display_frame, (x1, y1 - text_size[1] - 10),
+                (x1 + text_size[0], y1), (0, 0, 255), -1)
+    cv2.putText(display_frame, text, (x1, y1 - 5),
+              cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+
+def annotate_frame(frame, ctx, found, alert_count):
+    """Return a copy of `frame` with zones, boxes and the status overlay drawn on it."""
+    display_frame = frame.copy()
     
-    if animal_type not in last_alert_time:
-        last_alert_time[animal_type] = current_time
-        return True
+    # Outline the monitored zones
+    if ctx.layout.has_zones:
+        cv2.polylines(display_frame, ctx.layout.polygons(frame.shape),
+                      True, (255, 200, 0), 2)
     
-    if current_time - last_alert_time[animal_type] >= cooldown:
-        last_alert_time[animal_type] = current_time
-        return True
+    detected_animals = set()
+    for label, confidence, box, track_id in found:
+        detected_animals.add(label)
+        draw_detection(display_frame, label, confidence, box, track_id)
     
-    return False
+    # Add status overlay
+    status_text = f"{ctx.camera_id} | Frame: {ctx.frame_count} | Tracks: {len(ctx.tracker)} | Alerts: {alert_count}"
+    cv2.putText(display_frame, status_text, (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    
+    if detected_animals:
+        alert_text = f"DETECTED: {', '.join([a.upper() for a in detected_animals])}"
+        cv2.putText(display_frame, alert_text, (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    return display_frame
 
 
-def save_detection_image(frame, animal_type):
-    """Save detected frame as image."""
-    if not DETECTION_CONFIG.get('save_detection_images', True):
-        return None
-    
+def handle_image_alert(alert):
+    """Alert channel 'image': encode the alert frame, queue it for saving and release the frame."""
     try:
-        folder = DETECTION_CONFIG.get('detections_folder', 'detections')
-        os.makedirs(folder, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"detection_{animal_type}_{timestamp}.jpg"
-        filepath = os.path.join(folder, filename)
-        
-        cv2.imwrite(filepath, frame)
-        print(f"💾 Detection image saved: {filename}")
-        return filepath
-    except Exception as e:
-        print(f"⚠️  Failed to save detection image: {e}")
-        return None
+        alert.image = save_detection_image(alert.frame, alert.label, alert.camera_id, alert.track_id)
+        if alert.image is not None:
+            alert.image_path = alert.image.path
+    finally:
+        alert.frame = None
+        alert.image_ready.set()
 
 
-def main():
-    """Main detection loop."""
-    global should_exit
-    
+def handle_email_alert(alert):
+    """Alert channel 'email': send the email once the image has been encoded (or skipped)."""
+    alert.image_ready.wait(timeout=10)
+    image_data = alert.image.data if alert.image is not None else None
+    send_email_alert(alert.label, alert.confidence, alert.image_path, alert.location, image_data)
+
+
+def handle_db_alert(alert):
+    """Alert channel 'db': record the detection and the alert."""
+    add_detection(alert.user_id, alert.label.capitalize(), alert.location)
+    add_alert(alert.user_id,
+            f"{alert.label.capitalize()} detected - Alert activated",
+            "danger")
+
+
+def build_alert_dispatcher():
+    """Create the AlertDispatcher with one channel per enabled side effect."""
+    dispatcher = AlertDispatcher(ALERT_CONFIG)
+    if SOUND_CONFIG.get('enabled', True):
+        dispatcher.add_channel('sound', lambda alert: play_sound_alert(alert.label))
+    if DETECTION_CONFIG.get('save_detection_images', True):
+        dispatcher.add_channel('image', handle_image_alert, on_drop=lambda alert: alert.image_ready.set())
+    if EMAIL_CONFIG.get('enabled', False):
+        dispatcher.add_channel('email', handle_email_alert)
+    dispatcher.add_channel('db', handle_db_alert)
+    return dispatcher
+
+
+def trigger_alert(dispatcher, frame, label, confidence, detection_count, user_id, camera, track_id=None):
+    """Hand a new alert to the dispatcher; sound, image, email and DB work happen off this thread."""
+    print(f"\n🚨 ALERT #{detection_count}: {label.upper()} detected!")
+    print(f"   Camera: {camera['id']} ({camera['location']})")
+    print(f"   Confidence: {confidence:.2%}")
+    print(f"   Time: {datetime.now().strftime('%H:%M:%S')}")
+
+    dropped = dispatcher.dispatch(Alert(label, confidence, camera, user_id, frame, track_id))
+    if dropped:
+        print(f"⚠️  Alert queue full, skipped: {', '.join(dropped)}")
+
+
+def load_detector():
+    """Load the YOLO model for MODEL_CONFIG; returns (model, backend description)."""
+    print("🔄 Loading YOLO model...")
+    config = dict(MODEL_CONFIG, imgsz=DETECTION_CONFIG.get('imgsz', 640))
+    # The worker supervisor splits the cores between workers
+    if os.environ.get('DETECTION_THREADS'):
+        config['threads'] = int(os.environ['DETECTION_THREADS'])
+    model, backend = load_model(config)
+    print(f"✅ YOLO model loaded successfully ({backend})")
+    return model, backend
+
+
+def warm_up(model, runs=2):
+    """Run the model on blank frames so lazy initialization happens before the first camera frame.
+
+    Returns the duration of the last run in seconds.
+    """
+    frame = np.zeros((DETECTION_CONFIG.get('frame_height', 480), DETECTION_CONFIG.get('frame_width', 640), 3),
+                     dtype=np.uint8)
+    elapsed = 0.0
+    for _ in range(max(1, runs)):
+        started = time.time()
+        model([frame], verbose=False, imgsz=DETECTION_CONFIG.get('imgsz', 640))
+        elapsed = time.time() - started
+    print(f"🔥 Model warmed up ({elapsed * 1000:.0f}ms per frame)")
+    return elapsed
+
+
+def init_sound():
+    """Decode alert sounds once and open the player before the first alert."""
+    global sound_player
+    if SOUND_CONFIG.get('enabled', True) and sound_player is None:
+        sound_player = SoundPlayer(ANIMAL_SOUNDS, SOUND_CONFIG)
+
+
+def open_cameras():
+    """Open every configured camera; returns (cameras, captures) keyed by camera id."""
+    cameras = {}
+    captures = {}
+    for camera in load_cameras():
+        print(f"📷 Opening camera '{camera['id']}' (source: {camera['source']})...")
+        cap = cv2.VideoCapture(camera['source'])
+        if not cap.isOpened():
+            print(f"❌ Could not open camera '{camera['id']}' ({camera['source']})")
+            continue
+        # Keep the driver-side buffer as small as the backend allows
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cameras[camera['id']] = camera
+        captures[camera['id']] = cap
+    return cameras, captures
+
+
+def main(frame_sinks=()):
+    """Run the detector as a standalone process: load the model and detect until stopped."""
     # Register signal handler
     signal.signal(signal.SIGINT, signal_handler)
     
-    # Load YOLO model
     print("=" * 60)
     print("🐾 ANIMAL DETECTION SYSTEM")
     print("=" * 60)
-    print("🔄 Loading YOLO model...")
     try:
-        model = YOLO("yolov8n.pt")
-        print("✅ YOLO model loaded successfully")
+        model, _ = load_detector()
     except Exception as e:
         print(f"❌ Failed to load YOLO model: {e}")
-        print("💡 Make sure yolov8n.pt is in the current directory")
+        print(f"💡 Make sure {MODEL_CONFIG.get('weights', 'yolov8n.pt')} is in the current directory")
         sys.exit(1)
     
-    # Open camera
-    camera_index = DETECTION_CONFIG.get('camera_index', 0)
-    print(f"📷 Opening camera (index: {camera_index})...")
-    cap = cv2.VideoCapture(camera_index)
-    
-    if not cap.isOpened():
-        print(f"❌ Could not open camera {camera_index}")
-        print("💡 Try changing camera_index in config.py")
+    init_sound()
+    try:
+        run_detection(model, user_id=DATABASE_CONFIG.get('user_id', 1), frame_sinks=frame_sinks)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        print("💡 Try changing camera_index or CAMERAS in config.py")
         sys.exit(1)
+    finally:
+        image_writer.close()
+        if sound_player is not None:
+            sound_player.close()
+
+
+def run_detection(model, user_id=1, stop_event=None, frame_sinks=(), captures=None,
+                  email_overrides=None, session=None, events=None):
+    """Main detection loop.
+
+    Frames flow through three stages: one capture thread per camera that keeps
+    its buffer drained, a single inference thread that batches the newest
+    frame from every camera into one model call, and the output stage on the
+    calling thread (drawing, alerts and display, since cv2.imshow must run on
+    the main thread).
+
+    In headless mode nothing is shown and frames are only copied and
+    annotated when an alert image asks for it or one of `frame_sinks`
+    (objects with wants_frames(camera_id) / publish(camera_id, frame)) has
+    a viewer attached.
+
+    Runs until `stop_event` is set, 'q' is pressed or every camera fails.
+    `captures` (camera id -> opened cv2.VideoCapture) lets a long-lived
+    caller keep cameras open between runs; otherwise they are opened here and
+    released on return. `email_overrides` is merged into EMAIL_CONFIG for
+    this run (e.g. the user's sender / recipient address). If `session` (a dict) is given it is updated with
+    'first_frame' / 'first_detection' (seconds since session['started_at']),
+    'frames' and 'alerts' as the run progresses. `events` (an
+    events.EventBus) receives 'detection' events whenever the set of tracked
+    animals on a camera changes, one 'alert' per new track and periodic
+    'stats'.
+    """
+    global mailer
     
-    print("✅ Camera opened successfully")
+    if captures is None:
+        cameras, captures = open_cameras()
+        owns_captures = True
+    else:
+        cameras = {camera['id']: camera for camera in load_cameras() if camera['id'] in captures}
+        owns_captures = False
+    
+    if not cameras:
+        raise RuntimeError("Could not open any camera")
+    
+    # A fresh SMTP session / digest buffer per run, with this run's sender and recipient
+    mailer = AlertMailer(dict(EMAIL_CONFIG, **(email_overrides or {})))
+    email_config = mailer.config
+    session = session if session is not None else {}
+    session.setdefault('started_at', time.time())
+    
+    # Class-id lookup tables, computed once for vectorized post-processing
+    labels, target_mask = build_class_tables(model.names, TARGET_ANIMALS)
+    
+    print(f"✅ {len(cameras)} camera(s) opened successfully")
     print("=" * 60)
     print(f"🎯 Monitoring for: {', '.join(TARGET_ANIMALS)}")
     print(f"⚙️  Confidence threshold: {DETECTION_CONFIG.get('confidence_threshold', 0.5)}")
-    print(f"📧 Email alerts: {'Enabled' if EMAIL_CONFIG.get('enabled') else 'Disabled'}")
+    email_mode = f"digest every {email_config.get('digest_window')}s" if mailer.digest_window else 'immediate'
+    print(f"📧 Email alerts: {'Enabled (' + email_mode + ')' if email_config.get('enabled') else 'Disabled'}")
     print(f"🔊 Sound alerts: {'Enabled' if SOUND_CONFIG.get('enabled') else 'Disabled'}")
-    print(f"⏱️  Alert cooldown: {DETECTION_CONFIG.get('alert_cooldown', 60)}s")
+    print(f"🔁 Detector interval: every {DETECTION_CONFIG.get('detect_interval', 1)} frame(s), alerts once per track")
+    print(f"🏃 Motion gating: {'Enabled' if MOTION_CONFIG.get('enabled', True) else 'Disabled'}")
+    print(f"🎚️  Adaptive scheduler: {'Enabled' if SCHEDULER_CONFIG.get('enabled', True) else 'Disabled'}")
+    print(f"🖥️  Display: {'Headless' if is_headless() else 'Window'}")
     print("=" * 60)
-    print("⏹️  Press Ctrl+C or 'q' to stop detection\n")
+    print("⏹️  Press Ctrl+C or 'q' to stop detection\n" if not is_headless() else "⏹️  Press Ctrl+C to stop detection\n")
     
     # Detection variables
     frame_count = 0
     detection_count = 0
-    user_id = DATABASE_CONFIG.get('user_id', 1)
-    confidence_threshold = DETECTION_CONFIG.get('confidence_threshold', 0.5)
-    frame_width = DETECTION_CONFIG.get('frame_width', 640)
-    frame_height = DETECTION_CONFIG.get('frame_height', 480)
+    stats_interval = DETECTION_CONFIG.get('stats_interval', 5)
+    last_stats_time = time.time()
+    headless = is_headless()
+    annotate_alert_images = DETECTION_CONFIG.get('annotate_alert_images', False)
+
+    # Pipeline: capture threads -> batched inference thread -> output stage (this thread)
+    queue_size = DETECTION_CONFIG.get('queue_size', 1)
+    frame_ready = threading.Event()
+    if stop_event is None:
+        stop_event = threading.Event()
+    contexts = {
+        camera_id: CameraContext(camera, LatestFrameQueue(queue_size, ready=frame_ready))
+        for camera_id, camera in cameras.items()
+    }
+    capture_queues = [ctx.queue for ctx in contexts.values()]
+    render_queue = LatestFrameQueue(queue_size * len(cameras))
+    capture_stats = {camera_id: StageStats(f'capture[{camera_id}]') for camera_id in cameras}
+    inference_stats = StageStats('inference', capture_queues)
+    render_stats = StageStats('render', render_queue)
+    motion_gates = [ctx.gate for ctx in contexts.values()]
+    dispatcher = build_alert_dispatcher()
+    scheduler = AdaptiveScheduler(SCHEDULER_CONFIG,
+                                  base_stride=DETECTION_CONFIG.get('detect_interval', 1),
+                                  base_imgsz=DETECTION_CONFIG.get('imgsz', 640))
+
+    capture_threads = [
+        CaptureThread(camera_id, captures[camera_id], contexts[camera_id].queue,
+                      capture_stats[camera_id], stop_event)
+        for camera_id in cameras
+    ]
+    inference_thread = threading.Thread(
+        target=inference_stage,
+        args=(model, contexts, frame_ready, render_queue, inference_stats, stop_event, target_mask, scheduler),
+        name='inference',
+        daemon=True
+    )
     
     try:
-        while not should_exit:
-            ret, frame = cap.read()
-            if not ret:
-                print("❌ Failed to read frame from camera")
+        for t in capture_threads:
+            t.start()
+        inference_thread.start()
+
+        while not should_exit and not stop_event.is_set():
+            if all(t.failed for t in capture_threads):
                 break
+
+            packet = render_queue.get(timeout=0.1)
+            if packet is None:
+                # Keep the windows responsive while waiting for the next result
+                if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+                continue
             
+            ctx = contexts[packet.camera_id]
+            camera = ctx.camera
             frame_count += 1
-            display_frame = frame.copy()
-            process_frame = cv2.resize(frame, (frame_width, frame_height))
-            
-            # Run YOLO detection
-            results = model(process_frame, verbose=False)
+            ctx.frame_count += 1
+            if 'first_frame' not in session:
+                session['first_frame'] = time.time() - session['started_at']
+            frame = packet.frame
             
-            # Process detections
-            detected_animals = set()
+            # Decide which detections start a new alert (once per track)
+            found = []
+            new_alerts = []
+            for detection, track_id in zip(packet.detections, packet.track_ids):
+                label = labels[int(detection[CLS])]
+                track_id = int(track_id)
+                found.append((label, float(detection[CONF]), detection[:4], track_id))
+                if ctx.tracker.claim_alert(track_id):
+                    new_alerts.append(found[-1])
+            if found and 'first_detection' not in session:
+                session['first_detection'] = time.time() - session['started_at']
+                print(f"⏱️  Time to first detection: {session['first_detection']:.2f}s")
+            if events is not None:
+                tracks = frozenset(track_id for _, _, _, track_id in found)
+                if tracks != ctx.reported_tracks:
+                    ctx.reported_tracks = tracks
+                    events.publish('detection', camera=camera['id'], user_id=user_id, objects=[
+                        {'label': label, 'confidence': confidence, 'track_id': track_id,
+                         'box': [float(v) for v in box]}
+                        for label, confidence, box, track_id in found
+                    ])
             
-            for r in results:
-                for box in r.boxes:
-                    try:
-                        cls = int(box.cls[0])
-                        label = model.names[cls].lower()
-                        confidence = float(box.conf[0])
-                        
-                        # Check if target animal with sufficient confidence
-                        if label in TARGET_ANIMALS and confidence > confidence_threshold:
-                            detected_animals.add(label)
-                            
-                            # Scale coordinates back to original frame
-                            x1, y1, x2, y2 = box.xyxy[0]
-                            scale_x = frame.shape[1] / process_frame.shape[1]
-                            scale_y = frame.shape[0] / process_frame.shape[0]
-                            
-                            x1, y1 = int(x1 * scale_x), int(y1 * scale_y)
-                            x2, y2 = int(x2 * scale_x), int(y2 * scale_y)
-                            
-                            # Draw bounding box
-                            cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                            
-                            # Add label
-                            text = f"{label.upper()} {confidence:.2f}"
-                            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)[0]
-                            cv2.rectangle(display_frame, (x1, y1 - text_size[1] - 10),
-                                        (x1 + text_size[0], y1), (0, 0, 255), -1)
-                            cv2.putText(display_frame, text, (x1, y1 - 5),
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-                            
-                            # Trigger alerts if cooldown period passed
-                            if should_send_alert(label):
-                                detection_count += 1
-                                print(f"\n🚨 ALERT #{detection_count}: {label.upper()} detected!")
-                                print(f"   Confidence: {confidence:.2%}")
-                                print(f"   Time: {datetime.now().strftime('%H:%M:%S')}")
-                                
-                                # Save image
-                                image_path = save_detection_image(frame, label)
-                                
-                                # Play sound (non-blocking)
-                                threading.Thread(target=play_sound_alert, args=(label,), daemon=True).start()
-                                
-                                # Send email (non-blocking)
-                                threading.Thread(
-                                    target=send_email_alert,
-                                    args=(label, confidence, image_path),
-                                    daemon=True
-                                ).start()
-                                
-                                # Save to database
-                                try:
-                                    add_detection(user_id, label.capitalize(), "Camera Feed")
-                                    add_alert(user_id, 
-                                            f"{label.capitalize()} detected - Alert activated",
-                                            "danger")
-                                except Exception as e:
-                                    print(f"⚠️  Database error: {e}")
-                    
-                    except Exception as e:
-                        print(f"⚠️  Error processing detection: {e}")
-                        continue
+            # Only pay for the frame copy and overlay when someone consumes the annotated frame
+            viewers = [sink for sink in frame_sinks if sink.wants_frames(camera['id'])]
+            annotate = not headless or viewers or (new_alerts and annotate_alert_images)
+            display_frame = None
+            if annotate:
+                display_frame = annotate_frame(frame, ctx, found, detection_count + len(new_alerts))
             
-            # Add status overlay
-            status_text = f"Frame: {frame_count} | Alerts: {detection_count}"
-            cv2.putText(display_frame, status_text, (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            for label, confidence, box, track_id in new_alerts:
+                detection_count += 1
+                alert_frame = display_frame if annotate_alert_images else frame
+                trigger_alert(dispatcher, alert_frame, label, confidence, detection_count, user_id, camera, track_id)
+                if events is not None:
+                    events.publish('alert', camera=camera['id'], location=camera['location'], user_id=user_id,
+                                   label=label, confidence=confidence, track_id=track_id, count=detection_count)
             
-            if detected_animals:
-                alert_text = f"DETECTED: {', '.join([a.upper() for a in detected_animals])}"
-                cv2.putText(display_frame, alert_text, (10, 60),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            for sink in viewers:
+                sink.publish(camera['id'], display_frame)
             
-            # Display frame
-            cv2.imshow("Animal Detection System - Press 'q' to quit", display_frame)
+            # Display frame (one window per camera)
+            if not headless:
+                cv2.imshow(f"Animal Detection System [{camera['id']}] - Press 'q' to quit", display_frame)
+            render_stats.tick(packet.age)
             
-            # Status update every 30 frames
-            if frame_count % 30 == 0:
-                print(f"📊 Frames: {frame_count} | Alerts: {detection_count}")
+            # Per-stage status update
+            if time.time() - last_stats_time >= stats_interval:
+                last_stats_time = time.time()
+                session['frames'] = frame_count
+                session['alerts'] = detection_count
+                snapshots = [s.snapshot() for s in capture_stats.values()]
+                snapshots += [inference_stats.snapshot(), render_stats.snapshot()]
+                if events is not None:
+                    events.publish('stats', user_id=user_id, frames=frame_count, alerts=detection_count,
+                                   stages=snapshots, scheduler=scheduler.status(),
+                                   motion=format_motion_stats(motion_gates), channels=dispatcher.stats())
+                print(f"📊 Frames: {frame_count} | Alerts: {detection_count} | {format_stats(snapshots)}")
+                print(f"   {format_motion_stats(motion_gates)} | {scheduler.status()}")
+                print(f"   {dispatcher.format_stats()} | {format_db_stats()}")
+                if email_config.get('enabled'):
+                    print(f"   {mailer.format_stats()}")
+                if DETECTION_CONFIG.get('save_detection_images', True):
+                    print(f"   {image_writer.format_stats()}")
+                if sound_player is not None:
+                    print(f"   {sound_player.format_stats()}")
             
             # Check for quit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
                 break
     
     except KeyboardInterrupt:
@@ -409,13 +681,47 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
-        cap.release()
-        cv2.destroyAllWindows()
+        stop_event.set()
+        frame_ready.set()
+        for q in capture_queues:
+            q.close()
+        render_queue.close()
+        for t in capture_threads + [inference_thread]:
+            if t.is_alive():
+                t.join(timeout=2)
+        if owns_captures:
+            for cap in captures.values():
+                cap.release()
+        # Give queued emails and DB writes a chance to finish
+        dispatcher.shutdown(timeout=DETECTION_CONFIG.get('alert_drain_timeout', 5))
+        flush_writes()
+        mailer.close()
+        image_writer.flush()
+        session['frames'] = frame_count
+        session['alerts'] = detection_count
+        if not headless:
+            cv2.destroyAllWindows()
         print("\n" + "=" * 60)
         print("📊 FINAL STATISTICS")
         print("=" * 60)
-        print(f"   Total frames processed: {frame_count}")
+        print(f"   Total frames captured: {sum(s.total for s in capture_stats.values())}")
+        print(f"   Total frames processed: {inference_stats.total}")
+        print(f"   {format_motion_stats(motion_gates).capitalize()}")
+        print(f"   Frames dropped as stale: {sum(q.dropped for q in capture_queues) + render_queue.dropped}")
+        for camera_id, ctx in contexts.items():
+            print(f"   Camera '{camera_id}': {ctx.frame_count} frames")
         print(f"   Total alerts sent: {detection_count}")
+        for channel in dispatcher.stats():
+            print(f"   Alert channel '{channel['channel']}': {channel['completed']} done, "
+                  f"{channel['dropped']} dropped, {channel['failed']} failed, "
+                  f"avg {channel['latency_avg'] * 1000:.0f}ms / max {channel['latency_max'] * 1000:.0f}ms")
+        print(f"   {format_db_stats()}")
+        if email_config.get('enabled'):
+            print(f"   {mailer.format_stats().capitalize()}")
+        if DETECTION_CONFIG.get('save_detection_images', True):
+            print(f"   {image_writer.format_stats()}")
+        if sound_player is not None:
+            print(f"   {sound_player.format_stats()}")
         print("=" * 60)
         print("✅ Detection system stopped successfully")
 
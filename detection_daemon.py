@@ -0,0 +1,337 @@
+"""
+Long-lived detection daemon.
+
+Loading ultralytics/torch and the YOLO model takes several seconds, so
+instead of starting detection.py for every session the web app talks to one
+daemon that loads the model once, runs a warm-up inference at boot and then
+waits for commands on a local control channel
+(multiprocessing.connection, authenticated with DAEMON_CONFIG['authkey']).
+
+Requests and replies are plain dicts:
+
+    {'cmd': 'start', 'user_id': 3, 'sender_email': ..., 'recipient_email': ...}
+    {'cmd': 'stop', 'user_id': 3}
+    {'cmd': 'status'}
+    {'cmd': 'shutdown'}
+    {'cmd': 'subscribe'}   (the connection then streams events.py events)
+
+Every reply has 'ok' and, on failure, 'error'. One detection session runs at
+a time (the cameras are shared); a start from a different user while a
+session is running is refused. For each session the daemon reports how long
+it took from the start command to the first processed frame and to the
+first detection.
+
+Output from print() (status lines, alerts, stats) goes to a rotating log
+file instead of stdout, so nothing depends on the parent draining a pipe.
+
+Run it directly with `python detection_daemon.py`; the worker supervisor
+(supervisor.py) starts one per worker with --port / --name and limits its
+cameras and threads through DETECTION_CAMERAS / DETECTION_THREADS.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from multiprocessing.connection import Listener
+
+# The daemon never owns a window
+os.environ.setdefault('DETECTION_HEADLESS', '1')
+
+import detection
+from events import EventBus
+from framestream import SharedFrameSink
+
+try:
+    from config import DAEMON_CONFIG
+except ImportError:
+    DAEMON_CONFIG = {'host': '127.0.0.1', 'port': 6010, 'authkey': 'animal-detection'}
+
+try:
+    from config import STREAM_CONFIG
+except ImportError:
+    STREAM_CONFIG = {'enabled': True}
+
+
+def daemon_address(config=None):
+    config = config or DAEMON_CONFIG
+    return config.get('host', '127.0.0.1'), int(config.get('port', 6010))
+
+
+def daemon_authkey(config=None):
+    config = config or DAEMON_CONFIG
+    return str(config.get('authkey', 'animal-detection')).encode()
+
+
+class LogWriter:
+    """File-like object that turns print() output into log records, one per line."""
+
+    def __init__(self, logger, level):
+        self.logger = logger
+        self.level = level
+        self._buffer = ''
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                self.logger.log(self.level, line.rstrip())
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            line, self._buffer = self._buffer, ''
+        if line.strip():
+            self.logger.log(self.level, line.rstrip())
+
+
+def setup_logging(config=None):
+    """Send stdout/stderr of this process to a size-rotated log file."""
+    config = config or DAEMON_CONFIG
+    path = config.get('log_file', os.path.join('logs', 'detection.log'))
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=config.get('log_max_bytes', 5 * 1024 * 1024),
+                                  backupCount=config.get('log_backups', 3), encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    logger = logging.getLogger('detection')
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    logger.propagate = False
+    sys.stdout = LogWriter(logger, logging.INFO)
+    sys.stderr = LogWriter(logger, logging.ERROR)
+    return logger
+
+
+class Session:
+    """One user's detection run on the warm model."""
+
+    def __init__(self, user_id, sender_email=None, recipient_email=None):
+        self.user_id = user_id
+        self.stop_event = threading.Event()
+        self.stats = {'started_at': time.time()}
+        self.email_overrides = {}
+        if sender_email:
+            self.email_overrides['override_sender'] = sender_email
+        if recipient_email:
+            self.email_overrides['recipient_email'] = recipient_email
+        self.error = None
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def stopping(self):
+        """Stop was requested but alerts / emails are still being drained."""
+        return self.running and self.stop_event.is_set()
+
+    def status(self):
+        data = {k: v for k, v in self.stats.items() if k != 'started_at'}
+        data.update({
+            'user_id': self.user_id,
+            'running': self.running,
+            'stopping': self.stopping,
+            'uptime': time.time() - self.stats['started_at'],
+        })
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class DetectionDaemon:
+    """Keeps the model (and optionally the cameras) warm and runs sessions on request."""
+
+    def __init__(self, config=None):
+        self.config = config or DAEMON_CONFIG
+        self.booted_at = time.time()
+        self.model, self.backend = detection.load_detector()
+        self.warmup_latency = 0.0
+        if self.config.get('warmup', True):
+            self.warmup_latency = detection.warm_up(self.model, self.config.get('warmup_runs', 2))
+        detection.init_sound()
+        self.boot_time = time.time() - self.booted_at
+        self.captures = None
+        self.session = None
+        self.events = EventBus(self.config.get('event_queue_size', 256))
+        # Live annotated frames for the web app's MJPEG stream / snapshot (only encoded while watched)
+        self.frame_sinks = []
+        if STREAM_CONFIG.get('enabled', True):
+            self.frame_sinks.append(SharedFrameSink([c['id'] for c in detection.load_cameras()], STREAM_CONFIG))
+        self._lock = threading.Lock()
+        self._shutdown = threading.Event()
+        print(f"✅ Detection daemon ready in {self.boot_time:.1f}s ({self.backend})")
+
+    def _captures(self):
+        """Cameras for the next session: kept open between sessions if configured."""
+        if not self.config.get('keep_cameras_open', False):
+            return None
+        if not self.captures:
+            _, self.captures = detection.open_cameras()
+        return self.captures
+
+    def _run(self, session):
+        self.events.publish('session', state='started', user_id=session.user_id)
+        try:
+            detection.run_detection(self.model, user_id=session.user_id, stop_event=session.stop_event,
+                                    captures=self._captures(), email_overrides=session.email_overrides,
+                                    session=session.stats, events=self.events, frame_sinks=self.frame_sinks)
+        except Exception as e:
+            session.error = str(e)
+            print(f"❌ Session for user {session.user_id} failed: {e}")
+        # The session thread is still alive here, but its run is over
+        self.events.publish('session', state='stopped', **dict(session.status(), running=False, stopping=False))
+
+    def start(self, user_id, sender_email=None, recipient_email=None):
+        with self._lock:
+            if self.session is not None and self.session.stopping:
+                # Let the previous session release the cameras before starting a new one
+                self.session.thread.join(self.config.get('stop_timeout', 15))
+            if self.session is not None and self.session.running:
+                if self.session.stopping:
+                    return {'ok': False, 'error': 'The previous session is still shutting down'}
+                if self.session.user_id == user_id:
+                    return {'ok': True, 'already_running': True, 'session': self.session.status()}
+                return {'ok': False, 'error': 'Detection is already running for another user'}
+            self.session = Session(user_id, sender_email, recipient_email)
+            self.session.thread = threading.Thread(target=self._run, args=(self.session,),
+                                                   name=f'session-{user_id}', daemon=True)
+            self.session.thread.start()
+            print(f"▶️  Session started for user {user_id}")
+            return {'ok': True, 'session': self.session.status()}
+
+    def stop(self, user_id=None, timeout=None):
+        with self._lock:
+            session = self.session
+            if session is None or not session.running:
+                return {'ok': True, 'stopped': False}
+            if user_id is not None and session.user_id != user_id:
+                return {'ok': False, 'error': 'Detection is running for another user'}
+            session.stop_event.set()
+        session.thread.join(self.config.get('stop_timeout', 15) if timeout is None else timeout)
+        print(f"⏹️  Session stopped for user {session.user_id}")
+        return {'ok': True, 'stopped': True, 'session': session.status()}
+
+    def status(self):
+        session = self.session
+        return {
+            'ok': True,
+            'backend': self.backend,
+            'boot_time': self.boot_time,
+            'warmup_latency': self.warmup_latency,
+            'uptime': time.time() - self.booted_at,
+            'session': session.status() if session is not None else None,
+            'subscribers': len(self.events),
+        }
+
+    def _heartbeat(self):
+        interval = self.config.get('heartbeat_interval', 2)
+        while not self._shutdown.wait(interval):
+            session = self.session
+            self.events.publish('heartbeat', uptime=time.time() - self.booted_at,
+                                session=session.status() if session is not None else None)
+
+    def handle(self, request):
+        """Execute one control request and return the reply dict."""
+        cmd = request.get('cmd') if isinstance(request, dict) else None
+        if cmd == 'start':
+            return self.start(request.get('user_id'), request.get('sender_email'), request.get('recipient_email'))
+        if cmd == 'stop':
+            return self.stop(request.get('user_id'))
+        if cmd == 'status':
+            return self.status()
+        if cmd == 'shutdown':
+            self.request_shutdown()
+            return {'ok': True}
+        return {'ok': False, 'error': f"Unknown command: {cmd}"}
+
+    def request_shutdown(self):
+        self._shutdown.set()
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                while True:
+                    request = conn.recv()
+                    if isinstance(request, dict) and request.get('cmd') == 'subscribe':
+                        # From here on this connection only carries events
+                        self.events.stream(conn, self._shutdown)
+                        return
+                    conn.send(self.handle(request))
+            except (EOFError, OSError):
+                pass
+
+    def serve(self):
+        """Accept control connections until a shutdown request arrives."""
+        listener = Listener(daemon_address(self.config), authkey=daemon_authkey(self.config))
+        print(f"🎛️  Control channel listening on {listener.address[0]}:{listener.address[1]}")
+        accept_thread = threading.Thread(target=self._accept_loop, args=(listener,), name='control', daemon=True)
+        accept_thread.start()
+        threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True).start()
+        try:
+            while not self._shutdown.wait(0.5):
+                pass
+        finally:
+            listener.close()
+            self.close()
+
+    def _accept_loop(self, listener):
+        while not self._shutdown.is_set():
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            except Exception as e:
+                # Failed authentication or a broken handshake; keep serving
+                print(f"⚠️  Rejected control connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self.stop()
+        if self.captures:
+            for cap in self.captures.values():
+                cap.release()
+        for sink in self.frame_sinks:
+            sink.close()
+        detection.image_writer.close()
+        if detection.sound_player is not None:
+            detection.sound_player.close()
+        print("✅ Detection daemon stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Animal detection daemon')
+    parser.add_argument('--port', type=int, help='control channel port (default DAEMON_CONFIG port)')
+    parser.add_argument('--name', help='worker name, used for the log file')
+    args = parser.parse_args()
+    if args.port:
+        DAEMON_CONFIG['port'] = args.port
+    if args.name:
+        root, ext = os.path.splitext(DAEMON_CONFIG.get('log_file', os.path.join('logs', 'detection.log')))
+        DAEMON_CONFIG['log_file'] = f"{root}-{args.name}{ext}"
+
+    if DAEMON_CONFIG.get('log_to_file', True):
+        setup_logging()
+    print("=" * 60)
+    print("🐾 ANIMAL DETECTION DAEMON")
+    print("=" * 60)
+    try:
+        daemon = DetectionDaemon()
+    except Exception as e:
+        print(f"❌ Failed to start detection daemon: {e}")
+        sys.exit(1)
+    signal.signal(signal.SIGTERM, lambda sig, frame: daemon.request_shutdown())
+    signal.signal(signal.SIGINT, lambda sig, frame: daemon.request_shutdown())
+    daemon.serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Typed events from the detection daemon to the web app.
+
+The daemon publishes small dict messages on an EventBus:
+
+    {'type': 'detection', 'ts': ..., 'camera': 'cam0', 'user_id': 3, 'objects': [...]}
+    {'type': 'alert',     'ts': ..., 'camera': 'cam0', 'user_id': 3, 'label': 'cow', 'confidence': 0.91, 'track_id': 4}
+    {'type': 'stats',     'ts': ..., 'frames': ..., 'alerts': ..., 'stages': [...], ...}
+    {'type': 'heartbeat', 'ts': ..., 'uptime': ..., 'session': {...} or None}
+    {'type': 'session',   'ts': ..., 'state': 'started' | 'stopped', 'user_id': 3, ...}
+
+Clients subscribe over the daemon's control channel with {'cmd': 'subscribe'};
+that connection then only carries events. Every subscriber has a bounded,
+drop-oldest queue that EventBus.stream() drains onto the connection from the
+thread already serving that connection, so a slow or stuck client loses old
+events instead of slowing the detector down.
+
+EventListener is the client side: a background thread that keeps the
+latest event of each type plus a short history of detections and alerts,
+reconnecting when the daemon restarts.
+"""
+
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Client
+
+EVENT_TYPES = ('detection', 'alert', 'stats', 'heartbeat', 'session')
+
+
+class Subscription:
+    """Bounded, drop-oldest queue of events for one subscriber."""
+
+    def __init__(self, maxsize=256):
+        self._items = deque(maxlen=max(1, maxsize))
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, event):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventBus:
+    """Fans published events out to every subscriber without blocking the publisher."""
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event_type, **data):
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {event_type}")
+        event = dict(data, type=event_type, ts=time.time())
+        with self._lock:
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, conn, stop_event=None):
+        """Send events to `conn` until it breaks or `stop_event` is set (runs in the caller's thread)."""
+        subscription = self.subscribe()
+        try:
+            while not subscription.closed and not (stop_event and stop_event.is_set()):
+                event = subscription.get(timeout=1.0)
+                if event is not None:
+                    conn.send(event)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.unsubscribe(subscription)
+
+
+class EventListener:
+    """Client-side subscriber that keeps a live view of the daemon's state."""
+
+    def __init__(self, address, authkey, history=50):
+        self.address = address
+        self.authkey = authkey
+        self.latest = {}
+        self.detections = deque(maxlen=history)
+        self.alerts = deque(maxlen=history)
+        self.connected = False
+        self.received = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with Client(self.address, authkey=self.authkey) as conn:
+                    conn.send({'cmd': 'subscribe'})
+                    self.connected = True
+                    while not self._stop.is_set():
+                        if conn.poll(1.0):
+                            self._handle(conn.recv())
+            except (OSError, EOFError):
+                pass
+            self.connected = False
+            self._stop.wait(2.0)
+
+    def _handle(self, event):
+        with self._lock:
+            self.received += 1
+            self.latest[event.get('type')] = event
+            if event.get('type') == 'detection':
+                self.detections.append(event)
+            elif event.get('type') == 'alert':
+                self.alerts.append(event)
+
+    def snapshot(self, user_id=None):
+        """Latest events (optionally only one user's detections/alerts) as plain dicts."""
+        with self._lock:
+            detections = [e for e in self.detections if user_id is None or e.get('user_id') == user_id]
+            alerts = [e for e in self.alerts if user_id is None or e.get('user_id') == user_id]
+            return {
+                'connected': self.connected,
+                'heartbeat': self.latest.get('heartbeat'),
+                'stats': self.latest.get('stats'),
+                'session': self.latest.get('session'),
+                'detections': detections[-10:],
+                'alerts': alerts[-10:],
+            }
+
+    def close(self):
+        self._stop.set()
@@ -0,0 +1,192 @@
+"""
+Streaming export of detections and alerts as CSV, JSON Lines or Parquet.
+
+Rows are read through a cursor in chunks of `chunk_rows` and encoded chunk
+by chunk, so an export of years of history uses the same memory as one of a
+day. The web app streams the chunks as a chunked HTTP response
+(/user/export, /admin/export); the CLI writes them to a file or stdout:
+
+    python export.py detections --format csv --user 3 --since 2026-01-01 -o farm3.csv
+
+Each export uses its own connection (not the shared pool) so a long
+download never holds a connection other requests need. Archived rows
+(retention.py) are included with --archive / ?archive=1, oldest first.
+
+Parquet needs pyarrow (optional); each chunk becomes one row group.
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+
+from database import get_conn
+from retention import query_archive
+
+COLUMNS = {
+    'detections': ('id', 'user_id', 'animal_type', 'location', 'timestamp'),
+    'alerts': ('id', 'user_id', 'message', 'alert_type', 'timestamp'),
+}
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_rows(table, user_id=None, since=None, until=None, kind=None, include_archive=False, chunk_rows=1000):
+    """Yield lists of up to `chunk_rows` row tuples (COLUMNS order), oldest first.
+
+    `kind` filters animal_type (detections) or alert_type (alerts); `since` /
+    `until` bound the timestamp, until exclusive.
+    """
+    if table not in COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    columns = COLUMNS[table]
+    kind_column = 'animal_type' if table == 'detections' else 'alert_type'
+
+    if include_archive:
+        chunk = []
+        for row in query_archive(table, user_id, since, until):
+            if kind and row.get(kind_column) != kind:
+                continue
+            chunk.append(tuple(row.get(c) for c in columns))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    where, params = [], []
+    if user_id is not None:
+        where.append('user_id = ?')
+        params.append(user_id)
+    if kind:
+        where.append(f'{kind_column} = ?')
+        params.append(kind)
+    if since:
+        where.append('timestamp >= ?')
+        params.append(since)
+    if until:
+        where.append('timestamp < ?')
+        params.append(until)
+    # One user's rows come off the (user_id, timestamp) index in order; across
+    # users id order avoids sorting the whole table
+    order = 'timestamp, id' if user_id is not None else 'id'
+    sql = (f"SELECT {', '.join(columns)} FROM {table}"
+           + (f" WHERE {' AND '.join(where)}" if where else '') + f" ORDER BY {order}")
+    conn = get_conn()
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def _csv_chunks(columns, chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def _jsonl_chunks(columns, chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows).encode('utf-8')
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only stream whose written bytes can be taken out as they arrive."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_chunks(columns, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {'id': pa.int64(), 'user_id': pa.int64()}
+    schema = pa.schema([(c, types.get(c, pa.string())) for c in columns])
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in chunks:
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array([row[i] for row in rows], type=schema.field(i).type) for i in range(len(columns))],
+            schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export(table, fmt='csv', **filters):
+    """Yield the encoded export of `table` in `fmt` ('csv', 'jsonl' or 'parquet') chunk by chunk.
+
+    `filters` are passed to iter_rows(). Raises ValueError for an unknown
+    table or format before anything is read.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    if table not in COLUMNS:
+        raise ValueError(f"Unknown table: {table}")
+    if fmt == 'parquet':
+        # Fail before the response starts if pyarrow is missing
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    encoder = {'csv': _csv_chunks, 'jsonl': _jsonl_chunks, 'parquet': _parquet_chunks}[fmt]
+    return encoder(COLUMNS[table], iter_rows(table, **filters))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export detections or alerts')
+    parser.add_argument('table', choices=sorted(COLUMNS))
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--user', type=int, help='only this user id')
+    parser.add_argument('--since', help="first timestamp, e.g. '2026-01-01'")
+    parser.add_argument('--until', help='end timestamp (exclusive)')
+    parser.add_argument('--kind', help='only this animal type / alert type')
+    parser.add_argument('--archive', action='store_true', help='include archived rows')
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    args = parser.parse_args()
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export(args.table, args.format, user_id=args.user, since=args.since, until=args.until,
+                            kind=args.kind, include_archive=args.archive):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
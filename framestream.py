@@ -0,0 +1,237 @@
+"""
+Shared-memory live frames from the detection daemon to the web app.
+
+The daemon publishes the newest annotated frame of every camera into a
+small ring of JPEG slots in a named shared-memory segment
+(SharedFrameSink, a frame sink for detection.run_detection). Each frame is
+encoded at most once, and only while somebody is watching, no matter how many
+clients read it. The web app maps the same segment (SharedFrameReader) and
+serves MJPEG streams and snapshots straight from it; readers never talk to
+the detector and cannot slow it down.
+
+Segment layout (little-endian):
+
+    header: magic u32, slots u32, slot_bytes u32, pad u32, write_seq u64, viewer_seen f64
+    slot:   seq u64, length u32, pad u32, captured_at f64, jpeg bytes[slot_bytes]
+
+The writer bumps a slot's seq to an odd value while filling it and to the
+next even value when done; readers retry when the seq changed underneath
+them. Readers refresh `viewer_seen` so the writer knows frames are wanted.
+"""
+
+import re
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+
+MAGIC = 0x414E4653  # 'ANFS'
+HEADER = struct.Struct('<IIIIQd')
+SLOT_HEADER = struct.Struct('<QIId')
+
+
+def segment_name(camera_id, prefix='animal_frames'):
+    """Shared-memory name for a camera (only characters every platform accepts)."""
+    return f"{prefix}_{re.sub(r'[^A-Za-z0-9_]', '_', str(camera_id))}"
+
+
+def _attach(name):
+    """Open an existing segment without letting this process's resource tracker delete it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the segment with the resource tracker
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class FrameRing:
+    """A ring of JPEG slots in one shared-memory segment."""
+
+    def __init__(self, shm, create=False, slots=4, slot_bytes=1 << 20):
+        self.shm = shm
+        self.buf = shm.buf
+        if create:
+            self.slots, self.slot_bytes = slots, slot_bytes
+            HEADER.pack_into(self.buf, 0, MAGIC, slots, slot_bytes, 0, 0, 0.0)
+        else:
+            magic, self.slots, self.slot_bytes, _, _, _ = HEADER.unpack_from(self.buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{shm.name} is not a frame ring")
+        self.stride = SLOT_HEADER.size + self.slot_bytes
+
+    @staticmethod
+    def size(slots, slot_bytes):
+        return HEADER.size + slots * (SLOT_HEADER.size + slot_bytes)
+
+    def _slot_offset(self, index):
+        return HEADER.size + index * self.stride
+
+    @property
+    def write_seq(self):
+        return HEADER.unpack_from(self.buf, 0)[4]
+
+    @property
+    def viewer_seen(self):
+        return HEADER.unpack_from(self.buf, 0)[5]
+
+    def touch(self):
+        """Mark that a viewer wants frames (readers call this)."""
+        struct.pack_into('<d', self.buf, HEADER.size - 8, time.time())
+
+    def write(self, jpeg, captured_at):
+        """Store one encoded frame; returns False if it does not fit in a slot."""
+        if len(jpeg) > self.slot_bytes:
+            return False
+        seq = self.write_seq + 1
+        offset = self._slot_offset(seq % self.slots)
+        slot_seq = SLOT_HEADER.unpack_from(self.buf, offset)[0]
+        SLOT_HEADER.pack_into(self.buf, offset, slot_seq | 1, 0, 0, 0.0)
+        start = offset + SLOT_HEADER.size
+        self.buf[start:start + len(jpeg)] = jpeg
+        SLOT_HEADER.pack_into(self.buf, offset, (slot_seq | 1) + 1, len(jpeg), 0, captured_at)
+        struct.pack_into('<Q', self.buf, 16, seq)
+        return True
+
+    def read(self, after=0):
+        """Return (seq, captured_at, jpeg bytes) of the newest frame if newer than `after`, else None."""
+        for _ in range(3):
+            seq = self.write_seq
+            if seq == 0 or seq <= after:
+                return None
+            offset = self._slot_offset(seq % self.slots)
+            slot_seq, length, _, captured_at = SLOT_HEADER.unpack_from(self.buf, offset)
+            if slot_seq & 1:
+                continue
+            start = offset + SLOT_HEADER.size
+            data = bytes(self.buf[start:start + length])
+            if SLOT_HEADER.unpack_from(self.buf, offset)[0] == slot_seq:
+                return seq, captured_at, data
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+
+class SharedFrameSink:
+    """Frame sink for run_detection(): encodes frames for viewers into shared memory.
+
+    Config keys (STREAM_CONFIG): jpeg_quality, max_width (frames are
+    downscaled to this width before encoding), max_fps (per camera),
+    slots, slot_bytes, viewer_timeout (seconds a viewer counts as watching
+    after its last read) and name_prefix.
+    """
+
+    def __init__(self, camera_ids, config=None):
+        config = config or {}
+        self.quality = config.get('jpeg_quality', 75)
+        self.max_width = config.get('max_width', 960)
+        self.min_interval = 1.0 / config['max_fps'] if config.get('max_fps') else 0.0
+        self.viewer_timeout = config.get('viewer_timeout', 5)
+        slots = config.get('slots', 4)
+        slot_bytes = config.get('slot_bytes', 1 << 20)
+        prefix = config.get('name_prefix', 'animal_frames')
+        self.rings = {}
+        self._last_publish = {}
+        self.encoded = 0
+        self.skipped = 0
+        for camera_id in camera_ids:
+            name = segment_name(camera_id, prefix)
+            try:
+                # A segment left behind by a crashed daemon is replaced
+                shm = shared_memory.SharedMemory(name=name, create=True, size=FrameRing.size(slots, slot_bytes))
+            except FileExistsError:
+                old = _attach(name)
+                old.close()
+                old.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=FrameRing.size(slots, slot_bytes))
+            self.rings[camera_id] = FrameRing(shm, create=True, slots=slots, slot_bytes=slot_bytes)
+
+    def wants_frames(self, camera_id):
+        ring = self.rings.get(camera_id)
+        if ring is None or time.time() - ring.viewer_seen > self.viewer_timeout:
+            return False
+        return time.time() - self._last_publish.get(camera_id, 0.0) >= self.min_interval
+
+    def publish(self, camera_id, frame):
+        ring = self.rings.get(camera_id)
+        if ring is None or frame is None:
+            return
+        self._last_publish[camera_id] = time.time()
+        h, w = frame.shape[:2]
+        if self.max_width and w > self.max_width:
+            frame = cv2.resize(frame, (self.max_width, int(h * self.max_width / w)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(self.quality)])
+        if ok and ring.write(jpeg.reshape(-1).data, time.time()):
+            self.encoded += 1
+        else:
+            self.skipped += 1
+
+    def close(self):
+        for ring in self.rings.values():
+            shm = ring.shm
+            ring.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.rings = {}
+
+
+class SharedFrameReader:
+    """Web-app side of a camera's frame ring; attaches lazily and caches the last frame."""
+
+    def __init__(self, camera_id, config=None):
+        config = config or {}
+        self.name = segment_name(camera_id, config.get('name_prefix', 'animal_frames'))
+        # A mapping that produced nothing new for this long is re-attached (the daemon may have restarted)
+        self.stale_after = config.get('viewer_timeout', 5) * 2
+        self.ring = None
+        self.seq = 0
+        self.captured_at = 0.0
+        self.jpeg = None
+        self._last_new = time.time()
+        self._lock = threading.Lock()
+
+    def _ring(self):
+        if self.ring is None:
+            try:
+                self.ring = FrameRing(_attach(self.name))
+            except (FileNotFoundError, ValueError):
+                return None
+        return self.ring
+
+    def latest(self):
+        """(seq, jpeg bytes) of the newest frame, or (0, None) if nothing has been published.
+
+        All clients share the cached bytes; the ring is only read when a newer frame exists.
+        """
+        with self._lock:
+            if self.ring is not None and time.time() - self._last_new > self.stale_after:
+                self._detach()
+            ring = self._ring()
+            if ring is None:
+                return 0, None
+            ring.touch()
+            if ring.write_seq < self.seq:
+                # The segment was recreated
+                self.seq = 0
+            frame = ring.read(after=self.seq)
+            if frame is not None:
+                self.seq, self.captured_at, self.jpeg = frame
+                self._last_new = time.time()
+            return self.seq, self.jpeg
+
+    def _detach(self):
+        self.ring.close()
+        self.ring = None
+        self.seq = 0
+        self._last_new = time.time()
@@ -0,0 +1,147 @@
+"""
+Detection image encoding and storage.
+
+An alert frame is JPEG-encoded exactly once. The resulting DetectionImage
+(bytes + target path) is shared by everything that needs the picture: the
+email attachment is built from the in-memory bytes and the bytes are
+written to disk by a background writer thread, so neither encoding nor disk
+I/O happens on the camera loop or holds up the email.
+
+Filenames carry the date, time with microseconds, camera, track and a
+process-wide sequence number, so two alerts in the same second never
+overwrite each other.
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+
+class DetectionImage:
+    """One encoded alert image."""
+
+    __slots__ = ('label', 'camera_id', 'track_id', 'filename', 'path', 'data', 'created_at', 'saved')
+
+    def __init__(self, label, camera_id, track_id, filename, path, data):
+        self.label = label
+        self.camera_id = camera_id
+        self.track_id = track_id
+        self.filename = filename
+        self.path = path
+        self.data = data
+        self.created_at = time.time()
+        # Set by the writer thread once the file is on disk
+        self.saved = threading.Event()
+
+
+def encode_jpeg(frame, quality=90):
+    """Encode a BGR frame to JPEG bytes, or return None on failure."""
+    ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)])
+    return buffer.tobytes() if ok else None
+
+
+class ImageWriter:
+    """Encodes alert frames once and writes them to disk on a background thread.
+
+    Config keys (DETECTION_CONFIG): detections_folder, jpeg_quality and
+    image_queue_size (files waiting to be written; when full the image is
+    still available in memory but not saved).
+    """
+
+    _seq = itertools.count(1)
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.folder = config.get('detections_folder', 'detections')
+        self.quality = config.get('jpeg_quality', 90)
+        self._queue = queue.Queue(maxsize=max(1, config.get('image_queue_size', 32)))
+        self._lock = threading.Lock()
+        self.counters = {'encoded': 0, 'written': 0, 'failed': 0, 'dropped': 0}
+        self.bytes_written = 0
+        self.encode_avg = 0.0
+        self._thread = threading.Thread(target=self._writer, name='image-writer', daemon=True)
+        self._thread.start()
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def filename(self, label, camera_id=None, track_id=None):
+        """Unique filename for an alert image."""
+        parts = ['detection', label, datetime.now().strftime('%Y%m%d_%H%M%S_%f')]
+        if camera_id is not None:
+            parts.append(str(camera_id))
+        if track_id is not None:
+            parts.append(f't{track_id}')
+        parts.append(str(next(self._seq)))
+        return '_'.join(parts) + '.jpg'
+
+    def encode(self, frame, label, camera_id=None, track_id=None):
+        """JPEG-encode a frame and queue it for writing; returns the DetectionImage or None."""
+        started = time.time()
+        data = encode_jpeg(frame, self.quality)
+        if data is None:
+            self._count('failed')
+            print(f"⚠️  Failed to encode detection image for {label}")
+            return None
+        with self._lock:
+            self.encode_avg += 0.2 * ((time.time() - started) - self.encode_avg)
+
+        filename = self.filename(label, camera_id, track_id)
+        image = DetectionImage(label, camera_id, track_id, filename, os.path.join(self.folder, filename), data)
+        self._count('encoded')
+        try:
+            self._queue.put_nowait(image)
+        except queue.Full:
+            self._count('dropped')
+            print(f"⚠️  Image writer busy, not saving {filename}")
+        return image
+
+    def _writer(self):
+        while True:
+            image = self._queue.get()
+            if image is None:
+                self._queue.task_done()
+                return
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                with open(image.path, 'wb') as f:
+                    f.write(image.data)
+                image.saved.set()
+                self._count('written')
+                with self._lock:
+                    self.bytes_written += len(image.data)
+                print(f"💾 Detection image saved: {image.filename}")
+            except Exception as e:
+                self._count('failed')
+                print(f"⚠️  Failed to save detection image: {e}")
+            finally:
+                self._queue.task_done()
+
+    def format_stats(self):
+        with self._lock:
+            c = dict(self.counters)
+            return (f"images: {c['written']}/{c['encoded']} saved, {self.bytes_written / 1024:.0f} KiB, "
+                    f"{self.encode_avg * 1000:.1f}ms encode, q={self._queue.qsize()}"
+                    + (f" (dropped={c['dropped']}, failed={c['failed']})" if c['dropped'] or c['failed'] else ''))
+
+    def flush(self, timeout=5):
+        """Wait up to `timeout` seconds for queued images to be written."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def close(self, timeout=5):
+        """Write out queued images for up to `timeout` seconds and stop the writer."""
+        deadline = time.time() + timeout
+        self.flush(timeout)
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=max(0.0, deadline - time.time()) + 0.5)
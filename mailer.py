@@ -0,0 +1,312 @@
+"""
+Email delivery for detection alerts.
+
+SMTPSession keeps one authenticated SMTP connection open across alerts and
+reconnects transparently when the server drops it, instead of paying for
+connect + STARTTLS + LOGIN on every message. AlertMailer builds the alert
+emails and can either send each alert immediately or collect all alerts
+within `digest_window` seconds into a single digest email with every image
+attached.
+
+For testing against a local stand-in server (for example
+`python -m aiosmtpd -n -l localhost:1025`) set smtp_server to 'localhost',
+smtp_port to 1025, 'use_tls' to False and leave sender_password empty so no
+LOGIN is attempted.
+"""
+
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+class EmailAlert:
+    """The parts of an alert that go into an email."""
+
+    def __init__(self, label, confidence, location, image_path=None, detected_at=None, image_data=None):
+        self.label = label
+        self.confidence = confidence
+        self.location = location
+        self.image_path = image_path
+        # Already-encoded JPEG bytes; attached directly instead of re-reading image_path
+        self.image_data = image_data
+        self.detected_at = detected_at or datetime.now()
+
+
+def _alert_row(label, value):
+    return f"""
+                    <tr>
+                        <td style="padding: 8px;"><strong>{label}:</strong></td>
+                        <td style="padding: 8px;">{value}</td>
+                    </tr>"""
+
+
+def build_alert_message(config, alerts):
+    """Build the MIME message for one alert, or a digest for several."""
+    msg = MIMEMultipart()
+    # Use override sender (logged-in user's email) for the From header if provided,
+    # but authenticate with configured SMTP sender credentials.
+    msg['From'] = config.get('override_sender') or config.get('sender_email')
+    # Also set Reply-To so replies go to the logged-in user when override is used
+    if config.get('override_sender'):
+        msg['Reply-To'] = config.get('override_sender')
+    msg['To'] = config['recipient_email']
+
+    if len(alerts) == 1:
+        alert = alerts[0]
+        msg['Subject'] = f"🚨 ALERT: {alert.label.upper()} Detected!"
+        heading = "🚨 Animal Detection Alert"
+        rows = (_alert_row('Animal Type', alert.label.capitalize())
+                + _alert_row('Confidence', f"{alert.confidence:.2%}")
+                + _alert_row('Detection Time', alert.detected_at.strftime('%Y-%m-%d %H:%M:%S'))
+                + _alert_row('Location', alert.location))
+        table = f'<table style="width: 100%; margin-top: 15px;">{rows}\n                </table>'
+    else:
+        animals = sorted({a.label.upper() for a in alerts})
+        msg['Subject'] = f"🚨 ALERT: {len(alerts)} detections ({', '.join(animals)})"
+        heading = f"🚨 Animal Detection Digest ({len(alerts)} alerts)"
+        rows = ''.join(
+            f"""
+                    <tr>
+                        <td style="padding: 8px;">{a.detected_at.strftime('%Y-%m-%d %H:%M:%S')}</td>
+                        <td style="padding: 8px;">{a.label.capitalize()}</td>
+                        <td style="padding: 8px;">{a.confidence:.2%}</td>
+                        <td style="padding: 8px;">{a.location}</td>
+                    </tr>"""
+            for a in alerts
+        )
+        table = f"""<table style="width: 100%; margin-top: 15px;">
+                    <tr>
+                        <th style="padding: 8px; text-align: left;">Time</th>
+                        <th style="padding: 8px; text-align: left;">Animal Type</th>
+                        <th style="padding: 8px; text-align: left;">Confidence</th>
+                        <th style="padding: 8px; text-align: left;">Location</th>
+                    </tr>{rows}
+                </table>"""
+
+    # Email body with HTML formatting
+    body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; margin: 20px;">
+            <div style="background-color: #f8d7da; border: 2px solid #d9534f; padding: 20px; border-radius: 5px;">
+                <h2 style="color: #d9534f; margin-top: 0;">{heading}</h2>
+                {table}
+            </div>
+            <div style="margin-top: 20px; padding: 15px; background-color: #f5f5f5; border-radius: 5px;">
+                <p style="margin: 0; color: #666; font-size: 14px;">
+                    <strong>Action Required:</strong> Please check your farm perimeter.
+                    Sound alert has been activated to deter the animal.
+                </p>
+            </div>
+            <hr style="margin-top: 20px; border: none; border-top: 1px solid #ddd;">
+            <p style="color: #999; font-size: 12px; margin-top: 20px;">
+                This is an automated alert from your Animal Repellent Detection System.
+                <br>Powered by YOLO Object Detection
+            </p>
+        </body>
+        </html>
+        """
+    msg.attach(MIMEText(body, 'html'))
+
+    # Attach detection images if available
+    for alert in alerts:
+        name = os.path.basename(alert.image_path) if alert.image_path else 'detection.jpg'
+        if alert.image_data:
+            msg.attach(MIMEImage(alert.image_data, 'jpeg', name=name))
+        elif alert.image_path and os.path.exists(alert.image_path):
+            try:
+                with open(alert.image_path, 'rb') as f:
+                    msg.attach(MIMEImage(f.read(), name=name))
+            except Exception as e:
+                print(f"⚠️  Could not attach image: {e}")
+    return msg
+
+
+def is_permanent_error(error):
+    """True for SMTP failures a retry cannot fix: 5xx replies (bad login, refused
+    sender), refused recipients and unsupported extensions."""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+class SMTPSession:
+    """A long-lived, reconnecting SMTP connection.
+
+    The connection is opened lazily, checked with NOOP when it has been idle
+    longer than `keepalive` seconds, and re-established (with exponential
+    backoff, up to `max_retries` times) when a send fails on a broken link.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.server = config.get('smtp_server')
+        self.port = config.get('smtp_port', 587)
+        self.use_tls = config.get('use_tls', True)
+        self.timeout = config.get('timeout', 10)
+        self.keepalive = config.get('keepalive', 60)
+        self.max_retries = config.get('max_retries', 3)
+        self.retry_backoff = config.get('retry_backoff', 1.0)
+
+        self._smtp = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+        self.metrics = {'sent': 0, 'failed': 0, 'retries': 0, 'connects': 0,
+                        'latency_avg': 0.0, 'latency_max': 0.0}
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.config.get('sender_password'):
+                smtp.login(self.config['sender_email'], self.config['sender_password'])
+        except BaseException:
+            # Don't leak the socket of a half-set-up connection
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.metrics['connects'] += 1
+
+    def _ensure_connected(self):
+        if self._smtp is not None and time.time() - self._last_used > self.keepalive:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._drop()
+            except (smtplib.SMTPException, OSError):
+                self._drop()
+        if self._smtp is None:
+            self._connect()
+
+    def _drop(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+        self._smtp = None
+
+    def send(self, msg):
+        """Send a message, reconnecting and retrying on connection errors.
+
+        Permanent errors (see is_permanent_error) are not retried and are
+        raised to the caller.
+        """
+        started = time.time()
+        with self._lock:
+            attempt = 0
+            while True:
+                try:
+                    self._ensure_connected()
+                    self._smtp.send_message(msg)
+                    self._last_used = time.time()
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    if is_permanent_error(e):
+                        if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                            self._drop()
+                        self.metrics['failed'] += 1
+                        raise
+                    self._drop()
+                    if attempt >= self.max_retries:
+                        self.metrics['failed'] += 1
+                        raise
+                    self.metrics['retries'] += 1
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+                    attempt += 1
+
+            latency = time.time() - started
+            self.metrics['sent'] += 1
+            self.metrics['latency_avg'] += 0.2 * (latency - self.metrics['latency_avg'])
+            self.metrics['latency_max'] = max(self.metrics['latency_max'], latency)
+
+    def close(self, timeout=5):
+        """QUIT the connection; gives up after `timeout` seconds if a send is still retrying."""
+        if not self._lock.acquire(timeout=timeout):
+            return
+        try:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception:
+                    pass
+            self._smtp = None
+        finally:
+            self._lock.release()
+
+
+class AlertMailer:
+    """Sends alert emails immediately or as periodic digests over one SMTPSession."""
+
+    def __init__(self, config):
+        self.config = config
+        self.session = SMTPSession(config)
+        self.digest_window = config.get('digest_window', 0) if config.get('digest_mode') else 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def configured(self):
+        return bool(self.config.get('enabled') and self.config.get('sender_email')
+                    and self.config.get('recipient_email'))
+
+    def send_alert(self, alert):
+        """Send (or queue for the next digest) one EmailAlert. Returns True on success or when queued."""
+        if not self.config.get('enabled', False):
+            return False
+        if not self.configured:
+            print("⚠️  Email not configured. Skipping email alert.")
+            return False
+
+        if self.digest_window > 0:
+            with self._lock:
+                self._pending.append(alert)
+                if self._timer is None:
+                    self._timer = threading.Timer(self.digest_window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            return True
+        return self._deliver([alert])
+
+    def flush(self):
+        """Send everything collected for the current digest window."""
+        with self._lock:
+            alerts, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        if alerts:
+            return self._deliver(alerts)
+        return True
+
+    def _deliver(self, alerts):
+        try:
+            self.session.send(build_alert_message(self.config, alerts))
+            if len(alerts) == 1:
+                print(f"✉️  Email alert sent successfully for {alerts[0].label}")
+            else:
+                print(f"✉️  Digest email sent successfully for {len(alerts)} alerts")
+            return True
+        except smtplib.SMTPAuthenticationError:
+            print("❌ Email authentication failed. Please check your email and app password.")
+            return False
+        except Exception as e:
+            print(f"❌ Failed to send email: {e}")
+            return False
+
+    def close(self):
+        """Flush any pending digest and close the SMTP connection."""
+        self.flush()
+        self.session.close()
+
+    def format_stats(self):
+        m = self.session.metrics
+        return (f"email: sent {m['sent']}, failed {m['failed']}, retries {m['retries']}, "
+                f"connects {m['connects']}, {m['latency_avg'] * 1000:.0f}ms avg / {m['latency_max'] * 1000:.0f}ms max")
@@ -0,0 +1,93 @@
+"""
+Cheap motion pre-filter used to skip YOLO on static frames.
+
+Each camera gets a MotionGate that keeps a running-average background of a
+small grayscale copy of the frame. The model is only called when enough of
+that image has changed, or when the heartbeat interval has passed so that
+animals standing still are still picked up now and then.
+"""
+
+import threading
+import time
+
+import cv2
+
+
+class MotionGate:
+    """Decide per frame whether the detector needs to run."""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.downscale_width = config.get('downscale_width', 160)
+        self.blur_kernel = config.get('blur_kernel', 5) | 1  # GaussianBlur needs an odd size
+        self.pixel_threshold = config.get('pixel_threshold', 25)
+        self.min_changed_area = config.get('min_changed_area', 0.01)
+        self.background_alpha = config.get('background_alpha', 0.1)
+        self.heartbeat_interval = config.get('heartbeat_interval', 10)
+
+        self.background = None
+        self.last_inference = 0.0
+        self.last_changed_area = 0.0
+        self.counters = {'inferred': 0, 'gated': 0, 'motion': 0, 'heartbeat': 0}
+        self._lock = threading.Lock()
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        width = min(self.downscale_width, w)
+        small = cv2.resize(frame, (width, max(1, int(h * width / w))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (self.blur_kernel, self.blur_kernel), 0)
+
+    def should_infer(self, frame, now=None):
+        """Return True if this frame should go through the detector."""
+        now = time.time() if now is None else now
+        if not self.enabled:
+            self._count('inferred')
+            return True
+
+        gray = self._prepare(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype('float32')
+            self.last_inference = now
+            self._count('inferred', 'motion')
+            return True
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        self.last_changed_area = cv2.countNonZero(mask) / mask.size
+        cv2.accumulateWeighted(gray, self.background, self.background_alpha)
+
+        if self.last_changed_area >= self.min_changed_area:
+            self.last_inference = now
+            self._count('inferred', 'motion')
+            return True
+
+        if self.heartbeat_interval and now - self.last_inference >= self.heartbeat_interval:
+            self.last_inference = now
+            self._count('inferred', 'heartbeat')
+            return True
+
+        self._count('gated')
+        return False
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self.counters[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def format_motion_stats(gates):
+    """Summarise gate counters across cameras as a short status string."""
+    totals = {'inferred': 0, 'gated': 0, 'heartbeat': 0}
+    for gate in gates:
+        counters = gate.snapshot()
+        for key in totals:
+            totals[key] += counters[key]
+    seen = totals['inferred'] + totals['gated']
+    ratio = totals['gated'] / seen if seen else 0.0
+    return f"motion: inferred {totals['inferred']} (heartbeat {totals['heartbeat']}) / gated {totals['gated']} ({ratio:.0%})"
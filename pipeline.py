@@ -0,0 +1,172 @@
+"""
+Frame pipeline primitives for the detection loop.
+
+The detector is split into a capture thread, an inference stage and a
+render/output stage. Stages are connected by LatestFrameQueue instances which
+never block the producer: when a queue is full the oldest frame is dropped so
+the consumer always works on the newest image from the camera.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class FramePacket:
+    """A captured frame travelling through the pipeline."""
+
+    __slots__ = ('camera_id', 'seq', 'captured_at', 'frame', 'detections', 'track_ids')
+
+    def __init__(self, camera_id, seq, frame, captured_at=None):
+        self.camera_id = camera_id
+        self.seq = seq
+        self.frame = frame
+        self.captured_at = captured_at if captured_at is not None else time.time()
+        self.detections = []
+        self.track_ids = []
+
+    @property
+    def age(self):
+        """Seconds since the frame was read from the camera."""
+        return time.time() - self.captured_at
+
+
+class LatestFrameQueue:
+    """Bounded queue where the newest item wins.
+
+    put() never blocks: if the queue is full the oldest item is discarded and
+    counted in `dropped`. get() waits up to `timeout` seconds and returns None
+    when nothing arrived or the queue was closed. If `ready` is given (a
+    threading.Event) it is set on every put, which lets one consumer wait on
+    several queues at once.
+    """
+
+    def __init__(self, maxsize=1, ready=None):
+        self.maxsize = max(1, int(maxsize))
+        self.ready = ready
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            while len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if self.ready is not None:
+            self.ready.set()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        """Wake up any waiting consumer; further get() calls return None once drained."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage.
+
+    `fps` is measured over the window since the previous snapshot() call so
+    periodic reports show current throughput rather than a lifetime average.
+    `queue` is the stage's input queue, or a list of them for a stage that
+    consumes from several cameras.
+    """
+
+    def __init__(self, name, queue=None):
+        self.name = name
+        if queue is None:
+            self.queues = []
+        elif isinstance(queue, (list, tuple)):
+            self.queues = list(queue)
+        else:
+            self.queues = [queue]
+        self.total = 0
+        self._lock = threading.Lock()
+        self._window_count = 0
+        self._window_start = time.time()
+        self._last_age = 0.0
+
+    def tick(self, age=None):
+        with self._lock:
+            self.total += 1
+            self._window_count += 1
+            if age is not None:
+                self._last_age = age
+
+    def snapshot(self):
+        with self._lock:
+            now = time.time()
+            elapsed = max(now - self._window_start, 1e-6)
+            fps = self._window_count / elapsed
+            self._window_count = 0
+            self._window_start = now
+            return {
+                'stage': self.name,
+                'fps': fps,
+                'total': self.total,
+                'queue_depth': sum(q.qsize() for q in self.queues),
+                'dropped': sum(q.dropped for q in self.queues),
+                'latency': self._last_age,
+            }
+
+
+def format_stats(snapshots):
+    """Render a list of StageStats snapshots as a single status line."""
+    parts = []
+    for s in snapshots:
+        text = f"{s['stage']} {s['fps']:.1f} fps"
+        if not s['stage'].startswith('capture'):
+            text += f" (q={s['queue_depth']}, dropped={s['dropped']}, lag={s['latency'] * 1000:.0f}ms)"
+        parts.append(text)
+    return ' | '.join(parts)
+
+
+class CaptureThread(threading.Thread):
+    """Continuously read frames from a cv2.VideoCapture into a LatestFrameQueue.
+
+    Reading as fast as the camera delivers keeps the driver buffer empty, so
+    downstream stages never see frames that queued up while they were busy.
+    A read failure only stops this camera; `failed` is set so the engine can
+    tell when every source has gone away.
+    """
+
+    def __init__(self, camera_id, cap, out_queue, stats, stop_event):
+        super().__init__(name=f'capture-{camera_id}', daemon=True)
+        self.camera_id = camera_id
+        self.cap = cap
+        self.out_queue = out_queue
+        self.stats = stats
+        self.stop_event = stop_event
+        self.failed = False
+
+    def run(self):
+        seq = 0
+        while not self.stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                print(f"❌ Failed to read frame from camera '{self.camera_id}'")
+                self.failed = True
+                break
+            seq += 1
+            self.out_queue.put(FramePacket(self.camera_id, seq, frame))
+            self.stats.tick()
+        self.out_queue.close()
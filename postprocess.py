@@ -0,0 +1,101 @@
+"""
+Vectorized post-processing of YOLO results.
+
+Detections are passed around as a compact float32 array with one row per
+box and the columns below, in original-frame pixel coordinates.
+"""
+
+import numpy as np
+
+# Column layout of a detections array
+X1, Y1, X2, Y2, CONF, CLS = range(6)
+DETECTION_COLUMNS = 6
+
+EMPTY_DETECTIONS = np.empty((0, DETECTION_COLUMNS), dtype=np.float32)
+
+
+def build_class_tables(names, target_animals):
+    """Precompute lowercase labels and a class-id mask of target animals.
+
+    `names` is the model's id -> name mapping (dict or list). Returns
+    (labels, mask) where labels[cls] is the lowercase class name and
+    mask[cls] is True for classes listed in `target_animals`.
+    """
+    if isinstance(names, dict):
+        size = max(names) + 1 if names else 0
+        items = names.items()
+    else:
+        size = len(names)
+        items = enumerate(names)
+
+    targets = {a.lower() for a in target_animals}
+    labels = [''] * size
+    mask = np.zeros(size, dtype=bool)
+    for cls, name in items:
+        labels[cls] = str(name).lower()
+        mask[cls] = labels[cls] in targets
+    return labels, mask
+
+
+def extract_detections(result, target_mask, confidence_threshold, scale=(1.0, 1.0)):
+    """Filter one ultralytics Results object down to target-animal detections.
+
+    All boxes are handled with array operations: the class-id mask and the
+    confidence threshold are applied in one step and the surviving boxes are
+    scaled by (scale_x, scale_y) back to frame coordinates.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return EMPTY_DETECTIONS
+
+    # Boxes.data is (N, 6) or (N, 7) with track ids; conf and cls are always the last two columns
+    data = boxes.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+
+    cls = data[:, -1].astype(np.intp)
+    conf = data[:, -2]
+    valid = (cls >= 0) & (cls < len(target_mask))
+    keep = valid & (conf > confidence_threshold)
+    keep[keep] = target_mask[cls[keep]]
+    if not keep.any():
+        return EMPTY_DETECTIONS
+
+    detections = np.empty((int(keep.sum()), DETECTION_COLUMNS), dtype=np.float32)
+    detections[:, X1:Y2 + 1] = data[keep, :4] * np.array([scale[0], scale[1], scale[0], scale[1]], dtype=np.float32)
+    detections[:, CONF] = conf[keep]
+    detections[:, CLS] = cls[keep]
+    return detections
+
+
+def box_iou(box, boxes):
+    """IoU of one [x1, y1, x2, y2] box against an (N, 4) array of boxes."""
+    ix1 = np.maximum(box[0], boxes[:, 0])
+    iy1 = np.maximum(box[1], boxes[:, 1])
+    ix2 = np.minimum(box[2], boxes[:, 2])
+    iy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-6)
+
+
+def merge_detections(detections, iou_threshold=0.5):
+    """Class-aware non-maximum suppression over detections from overlapping tiles."""
+    if len(detections) < 2:
+        return detections
+
+    # Shift each class into its own coordinate range so boxes of different classes never overlap
+    offset = detections[:, CLS:CLS + 1] * (detections[:, :4].max() + 1)
+    boxes = detections[:, :4] + offset
+    order = np.argsort(-detections[:, CONF])
+    keep = []
+    while len(order):
+        best = order[0]
+        keep.append(best)
+        if len(order) == 1:
+            break
+        rest = order[1:]
+        order = rest[box_iou(boxes[best], boxes[rest]) <= iou_threshold]
+    return detections[np.sort(keep)]
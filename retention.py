@@ -0,0 +1,396 @@
+"""
+Retention, archival and compaction for the detection database and images.
+
+A RetentionWorker runs in the background (started by the web app when
+RETENTION_CONFIG['enabled'] is set, or once from the command line with
+`python retention.py --once`) and on every pass:
+
+1. moves detections / alerts older than their max age, and then the oldest
+   rows while the database is over db_max_mb, into gzip-compressed JSON
+   Lines archive segments (archive_dir); query_archive() reads them back
+2. deletes detection images older than images_max_age_days and then the
+   least recently used ones while the folder is over images_max_mb
+3. returns freed database pages to the file system with incremental VACUUM
+
+Databases created before incremental auto-vacuum was enabled need one full
+VACUUM, which rewrites the file and blocks writers while it runs; do it
+while the detector is stopped with `python retention.py --once --convert`
+(or allow the worker to with enable_incremental_vacuum).
+
+Work is done in small batches (batch_size rows / files) with a pause
+between them and short write transactions, so the detector and web app
+never wait long for the database. The dashboard rollups are not touched:
+archived detections still count in the charts.
+
+Each archive batch is written and fsynced before its rows are deleted, and
+the segment's row count is updated in the same transaction as the delete;
+readers only trust that many lines, so a crash never loses or duplicates rows.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from database import pool, query_stats, pid_alive
+
+try:
+    from config import RETENTION_CONFIG
+except ImportError:
+    RETENTION_CONFIG = {'enabled': False}
+
+try:
+    from config import DETECTION_CONFIG
+except ImportError:
+    DETECTION_CONFIG = {'detections_folder': 'detections'}
+
+ARCHIVED_TABLES = ('detections', 'alerts')
+
+
+def _cutoff(days):
+    """Timestamp `days` days ago in the database's UTC format, or None if the policy is off."""
+    if not days:
+        return None
+    return (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class RetentionLock:
+    """Lock file that keeps two processes from running retention at the same time."""
+
+    def __init__(self, path):
+        self.path = path
+        self.held = False
+
+    def acquire(self):
+        for _ in range(2):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(self.path) as f:
+                        owner = int(f.read().strip() or 0)
+                except (OSError, ValueError):
+                    owner = 0
+                if owner and pid_alive(owner):
+                    return False
+                # Left behind by a process that died
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(os.getpid()))
+            self.held = True
+            return True
+        return False
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class ArchiveSegment:
+    """One gzip JSON Lines file of archived rows, registered in archive_segments."""
+
+    def __init__(self, table, archive_dir):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.rows = 0
+        with pool.connection() as conn:
+            cur = conn.execute('INSERT INTO archive_segments (table_name, path) VALUES (?, ?)', (table, ''))
+            self.id = cur.lastrowid
+            stamp = datetime.utcnow().strftime('%Y%m%d')
+            self.path = os.path.abspath(os.path.join(archive_dir, f"{table}-{stamp}-{self.id:06d}.jsonl.gz"))
+            conn.execute('UPDATE archive_segments SET path = ? WHERE id = ?', (self.path, self.id))
+            conn.commit()
+        self._raw = open(self.path, 'ab')
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode='ab')
+
+    def write(self, rows):
+        """Append rows and force them to disk (before they are deleted from the database)."""
+        self._gz.write(''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8'))
+        self._gz.flush(zlib.Z_SYNC_FLUSH)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+
+    def close(self):
+        self._gz.close()
+        self._raw.close()
+
+
+def query_archive(table, user_id=None, since=None, until=None):
+    """Yield archived rows (dicts) of `table`, optionally for one user and a timestamp range [since, until).
+
+    Only segments overlapping the range are opened; rows are streamed, so
+    memory use does not depend on the archive size.
+    """
+    if table not in ARCHIVED_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    where = ['table_name = ?', 'rows > 0']
+    params = [table]
+    if since:
+        where.append('last_ts >= ?')
+        params.append(since)
+    if until:
+        where.append('first_ts < ?')
+        params.append(until)
+    with pool.connection() as conn:
+        segments = conn.execute(f"SELECT path, rows FROM archive_segments WHERE {' AND '.join(where)} ORDER BY first_ts",
+                                params).fetchall()
+    for path, rows in segments:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for i, line in enumerate(f):
+                    if i >= rows:
+                        # Lines past the committed count were never deleted from the database
+                        break
+                    row = json.loads(line)
+                    if user_id is not None and row.get('user_id') != user_id:
+                        continue
+                    if (since and row['timestamp'] < since) or (until and row['timestamp'] >= until):
+                        continue
+                    yield row
+        except (OSError, EOFError) as e:
+            print(f"⚠️  Cannot read archive segment {path}: {e}")
+
+
+class RetentionWorker:
+    """Background thread applying RETENTION_CONFIG every `interval` seconds."""
+
+    def __init__(self, config=None, images_folder=None):
+        config = config or RETENTION_CONFIG
+        self.config = config
+        self.interval = config.get('interval', 3600)
+        self.batch_size = config.get('batch_size', 500)
+        self.pause = config.get('pause', 0.05)
+        self.archive_dir = config.get('archive_dir', 'archive')
+        self.segment_rows = config.get('segment_rows', 100000)
+        self.images_folder = images_folder or DETECTION_CONFIG.get('detections_folder', 'detections')
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.lock = RetentionLock(os.path.join(self.archive_dir, '.retention.lock'))
+        self.stats = {'runs': 0, 'archived': 0, 'images_deleted': 0, 'image_bytes_freed': 0,
+                      'pages_vacuumed': 0, 'last_run': None, 'last_duration': 0.0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- database rows -------------------------------------------------------
+
+    def _db_used_bytes(self):
+        with pool.connection() as conn:
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            pages = conn.execute('PRAGMA page_count').fetchone()[0]
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        return (pages - free) * page_size
+
+    def _archive_batch(self, table, segment, cutoff):
+        """Move up to batch_size of the oldest rows (older than `cutoff` if given); returns the count."""
+        with pool.connection() as conn:
+            if cutoff:
+                rows = conn.execute(f'SELECT * FROM {table} WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?',
+                                    (cutoff, self.batch_size)).fetchall()
+            else:
+                rows = conn.execute(f'SELECT * FROM {table} ORDER BY timestamp, id LIMIT ?',
+                                    (self.batch_size,)).fetchall()
+        if not rows:
+            return 0
+        rows = [dict(row) for row in rows]
+        segment.write(rows)
+        started = time.perf_counter()
+        with pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(f'DELETE FROM {table} WHERE id = ?', [(row['id'],) for row in rows])
+            conn.execute('UPDATE archive_segments SET rows = rows + ?, first_ts = COALESCE(first_ts, ?), '
+                         'last_ts = ? WHERE id = ?',
+                         (len(rows), rows[0]['timestamp'], rows[-1]['timestamp'], segment.id))
+            conn.commit()
+        query_stats.record('archive_batch', time.perf_counter() - started)
+        segment.rows += len(rows)
+        return len(rows)
+
+    def archive(self, table, cutoff=None, until_size=None):
+        """Archive rows of `table` older than `cutoff`, or oldest-first until the database is under `until_size` bytes."""
+        archived = 0
+        segment = None
+        try:
+            while not self._stop.is_set():
+                if until_size is not None and self._db_used_bytes() <= until_size:
+                    break
+                if segment is None or segment.rows >= self.segment_rows:
+                    if segment is not None:
+                        segment.close()
+                    segment = ArchiveSegment(table, self.archive_dir)
+                count = self._archive_batch(table, segment, cutoff)
+                if not count:
+                    break
+                archived += count
+                self._stop.wait(self.pause)
+        finally:
+            if segment is not None:
+                segment.close()
+                if not segment.rows:
+                    self._drop_segment(segment)
+        if archived:
+            print(f"🗄️  Archived {archived} {table} rows")
+        return archived
+
+    def _drop_segment(self, segment):
+        with pool.connection() as conn:
+            conn.execute('DELETE FROM archive_segments WHERE id = ? AND rows = 0', (segment.id,))
+            conn.commit()
+        try:
+            os.remove(segment.path)
+        except FileNotFoundError:
+            pass
+
+    # -- images --------------------------------------------------------------
+
+    def evict_images(self):
+        """Delete images past images_max_age_days, then least recently used ones over images_max_mb."""
+        if not os.path.isdir(self.images_folder):
+            return 0
+        files = []
+        with os.scandir(self.images_folder) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    st = entry.stat()
+                    files.append((max(st.st_atime, st.st_mtime), st.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        max_age = self.config.get('images_max_age_days')
+        oldest_allowed = time.time() - max_age * 86400 if max_age else None
+        budget = self.config.get('images_max_mb')
+        budget = budget * 1024 * 1024 if budget else None
+        deleted = 0
+        for used, size, path in files:
+            if self._stop.is_set():
+                break
+            too_old = oldest_allowed is not None and used < oldest_allowed
+            over_budget = budget is not None and total > budget
+            if not too_old and not over_budget:
+                # Sorted by last use: everything after this is newer
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+            self.stats['image_bytes_freed'] += size
+            if deleted % self.batch_size == 0:
+                self._stop.wait(self.pause)
+        if deleted:
+            print(f"🧹 Deleted {deleted} detection images ({total / (1024 * 1024):.0f} MiB left)")
+        return deleted
+
+    # -- compaction ----------------------------------------------------------
+
+    def vacuum(self):
+        """Release free pages in small steps (switches the database to incremental auto-vacuum once)."""
+        with pool.connection() as conn:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                if not self.config.get('enable_incremental_vacuum', False):
+                    return 0
+                # Takes effect only after one full VACUUM, which rewrites the file
+                print("🗜️  Switching database to incremental vacuum (one-time full VACUUM)")
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            step = self.config.get('vacuum_pages', 256)
+            freed = 0
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            while free and not self._stop.is_set():
+                # The pragma frees one page per result row: read them all to run the whole step
+                conn.execute(f'PRAGMA incremental_vacuum({min(step, free)})').fetchall()
+                remaining = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if remaining >= free:
+                    break
+                freed += free - remaining
+                free = remaining
+                self._stop.wait(self.pause)
+            # Move the WAL content into the database without waiting for readers
+            conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        return freed
+
+    # -- driver --------------------------------------------------------------
+
+    def run_once(self):
+        """Apply every policy once; returns False if another process is already doing it."""
+        if not self.lock.acquire():
+            return False
+        started = time.time()
+        try:
+            for table in ARCHIVED_TABLES:
+                cutoff = _cutoff(self.config.get(f'{table}_max_age_days'))
+                if cutoff:
+                    self.stats['archived'] += self.archive(table, cutoff=cutoff)
+            max_mb = self.config.get('db_max_mb')
+            if max_mb:
+                for table in ARCHIVED_TABLES:
+                    if self._db_used_bytes() <= max_mb * 1024 * 1024:
+                        break
+                    self.stats['archived'] += self.archive(table, until_size=max_mb * 1024 * 1024)
+            self.stats['images_deleted'] += self.evict_images()
+            self.stats['pages_vacuumed'] += self.vacuum()
+        except sqlite3.Error as e:
+            print(f"⚠️  Retention pass failed: {e}")
+        finally:
+            self.lock.release()
+            self.stats['runs'] += 1
+            self.stats['last_run'] = started
+            self.stats['last_duration'] = time.time() - started
+        return True
+
+    def _run(self):
+        # Let the app finish starting before the first pass
+        if self._stop.wait(self.config.get('initial_delay', 60)):
+            return
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive old detections/alerts, evict images and compact the database')
+    parser.add_argument('--once', action='store_true', help='run one pass and exit')
+    parser.add_argument('--convert', action='store_true',
+                        help='switch an older database to incremental vacuum (one full VACUUM; stop the detector first)')
+    args = parser.parse_args()
+    worker = RetentionWorker()
+    if args.convert:
+        worker.config = dict(worker.config, enable_incremental_vacuum=True)
+    if args.once:
+        if not worker.run_once():
+            print("Another process is running retention")
+        print(worker.stats)
+        return
+    worker.config = dict(worker.config, initial_delay=0)
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Adaptive frame-rate and resolution scheduler for the inference stage.
+
+The scheduler watches how long model calls take, how many frames the cameras
+offer and how much CPU the detection process uses, and periodically adjusts
+two knobs to stay inside the configured budget:
+
+- the detector stride (run the model on every Nth frame, tracks coast on the rest)
+- the input resolution (a level from SCHEDULER_CONFIG['resolution_levels'])
+
+Shedding load first raises the stride while the effective detection rate
+stays above `target_fps`, then lowers the resolution. When there is CPU
+headroom the resolution is restored first, then the stride. For a few
+seconds after any detection both knobs are forced back to full quality.
+"""
+
+import threading
+import time
+
+
+class AdaptiveScheduler:
+    """Chooses detector stride and input size from measured load."""
+
+    def __init__(self, config=None, base_stride=1, base_imgsz=640):
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.target_fps = config.get('target_fps', 5)
+        self.max_cpu = config.get('max_cpu', 0.6)
+        self.max_stride = max(base_stride, config.get('max_stride', 10))
+        self.levels = sorted(config.get('resolution_levels', [1.0, 0.75, 0.5]), reverse=True) or [1.0]
+        self.adjust_interval = config.get('adjust_interval', 2)
+        self.boost_duration = config.get('boost_duration', 5)
+        self.latency_smoothing = config.get('latency_smoothing', 0.2)
+
+        self.min_stride = max(1, base_stride)
+        self.base_imgsz = base_imgsz
+        self.stride = self.min_stride
+        self.level = 0
+        self.latency = 0.0
+        self.boost_until = 0.0
+
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_cpu = time.process_time()
+        self._offered = 0
+        self._runs = 0
+        self._cameras = 1
+        self.cpu = 0.0
+        self.offered_fps = 0.0
+        self.effective_fps = 0.0
+
+    @property
+    def scale(self):
+        return self.levels[self.level]
+
+    def imgsz(self):
+        """Model input size for the current resolution level (multiple of 32)."""
+        return max(32, int(round(self.base_imgsz * self.scale / 32)) * 32)
+
+    def input_size(self, width, height):
+        """Scale a (width, height) processing size to the current resolution level."""
+        return max(32, int(width * self.scale)), max(32, int(height * self.scale))
+
+    def offer(self, cameras=1):
+        """Count a frame offered to the inference stage (before stride / motion checks)."""
+        with self._lock:
+            self._offered += 1
+            self._cameras = max(1, cameras)
+
+    def record(self, latency):
+        """Record the wall time of one batched model call."""
+        with self._lock:
+            self._runs += 1
+            if self.latency == 0.0:
+                self.latency = latency
+            else:
+                self.latency += self.latency_smoothing * (latency - self.latency)
+        self._maybe_adjust()
+
+    def boost(self):
+        """Run at full rate and resolution for boost_duration seconds (called after a detection)."""
+        with self._lock:
+            self.boost_until = time.time() + self.boost_duration
+            self.stride = self.min_stride
+            self.level = 0
+
+    @property
+    def boosted(self):
+        return time.time() < self.boost_until
+
+    def _maybe_adjust(self):
+        now = time.time()
+        with self._lock:
+            elapsed = now - self._window_start
+            if elapsed < self.adjust_interval:
+                return
+            cpu_now = time.process_time()
+            self.cpu = (cpu_now - self._window_cpu) / elapsed
+            self.offered_fps = self._offered / self._cameras / elapsed
+            self.effective_fps = self._runs / elapsed
+            self._window_start = now
+            self._window_cpu = cpu_now
+            self._offered = 0
+            self._runs = 0
+
+            if not self.enabled or now < self.boost_until:
+                return
+
+            last_level = len(self.levels) - 1
+            latency_fps = 1.0 / self.latency if self.latency > 0 else float('inf')
+            if self.cpu > self.max_cpu:
+                # Shed load: skip more frames while the detection rate stays on target, then drop resolution
+                if self.stride < self.max_stride and self.offered_fps / (self.stride + 1) >= self.target_fps:
+                    self.stride += 1
+                elif self.level < last_level:
+                    self.level += 1
+                elif self.stride < self.max_stride:
+                    self.stride += 1
+            elif latency_fps < self.target_fps and self.level < last_level:
+                # The model itself is too slow to reach the target rate
+                self.level += 1
+            elif self.cpu < self.max_cpu * 0.75:
+                # Headroom: restore resolution first, then frame rate
+                if self.level > 0:
+                    self.level -= 1
+                elif self.stride > self.min_stride:
+                    self.stride -= 1
+
+    def status(self):
+        mode = ' BOOST' if self.boosted else ''
+        return (f"scheduler{mode}: stride {self.stride}, imgsz {self.imgsz()}, "
+                f"{self.effective_fps:.1f} eff fps, {self.latency * 1000:.0f}ms/batch, cpu {self.cpu:.0%}")
@@ -0,0 +1,273 @@
+"""
+Preloaded alert sounds and a single long-lived player.
+
+At startup every file in ANIMAL_SOUNDS is decoded once into raw 16-bit PCM
+(mp3 through the ffmpeg command line tool, .wav through the wave module) and
+a beep is synthesized from SOUND_CONFIG as the fallback sound. Playback goes
+through one player thread that owns one output for the life of the process:
+
+- 'sounddevice': an in-process output stream (if the package is installed)
+- 'winsound':    in-memory WAV playback on Windows
+- 'aplay' / 'pacat': one persistent process fed raw PCM on stdin
+
+Requests go into a priority queue and are played one at a time, so sounds
+never overlap; a burst of the same animal collapses into one pending play.
+The delay between play() and the first sample being handed to the output
+(play-start latency) is measured.
+"""
+
+import io
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+BEEP = 'beep'
+
+
+def decode_pcm(path, sample_rate, channels):
+    """Decode an audio file into interleaved int16 PCM bytes, or return None."""
+    if path.lower().endswith('.wav'):
+        try:
+            with wave.open(path, 'rb') as w:
+                if (w.getsampwidth(), w.getframerate(), w.getnchannels()) == (2, sample_rate, channels):
+                    return w.readframes(w.getnframes())
+        except (wave.Error, OSError):
+            pass
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-i', path, '-f', 's16le', '-acodec', 'pcm_s16le',
+             '-ar', str(sample_rate), '-ac', str(channels), '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30, check=True)
+    except (subprocess.SubprocessError, OSError):
+        return None
+    return result.stdout or None
+
+
+def synthesize_beep(frequency, duration_ms, count, sample_rate, channels, gap_ms=200):
+    """Build `count` sine beeps separated by silence as int16 PCM bytes."""
+    t = np.arange(int(sample_rate * duration_ms / 1000)) / sample_rate
+    tone = (0.5 * 32767 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+    gap = np.zeros(int(sample_rate * gap_ms / 1000), dtype=np.int16)
+    mono = np.concatenate([np.concatenate([tone, gap]) for _ in range(max(1, count))])
+    return np.repeat(mono[:, None], channels, axis=1).tobytes()
+
+
+class SoundBank:
+    """Decoded PCM for every alert sound, loaded once."""
+
+    def __init__(self, sound_files, config=None):
+        config = config or {}
+        self.sample_rate = config.get('sample_rate', 44100)
+        self.channels = config.get('channels', 1)
+        self.clips = {}
+        for name, path in sound_files.items():
+            if not os.path.exists(path):
+                continue
+            pcm = decode_pcm(path, self.sample_rate, self.channels)
+            if pcm:
+                self.clips[name.lower()] = pcm
+            else:
+                print(f"⚠️  Could not decode {path} (is ffmpeg installed?), using beep")
+        self.clips[BEEP] = synthesize_beep(
+            config.get('beep_frequency', 1000), config.get('beep_duration', 500),
+            config.get('beep_count', 3), self.sample_rate, self.channels)
+
+    def get(self, name):
+        """PCM for an animal, falling back to the beep."""
+        return self.clips.get((name or BEEP).lower(), self.clips[BEEP])
+
+    def duration(self, pcm):
+        return len(pcm) / (2 * self.channels * self.sample_rate)
+
+
+class _SounddeviceOutput:
+    name = 'sounddevice'
+
+    def __init__(self, sample_rate, channels):
+        import sounddevice
+        self.channels = channels
+        self.stream = sounddevice.OutputStream(samplerate=sample_rate, channels=channels, dtype='int16')
+        self.stream.start()
+
+    def play(self, pcm, duration):
+        # write() blocks until the samples are queued, which paces playback
+        self.stream.write(np.frombuffer(pcm, dtype=np.int16).reshape(-1, self.channels))
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class _WinsoundOutput:
+    name = 'winsound'
+
+    def __init__(self, sample_rate, channels):
+        import winsound
+        self.winsound = winsound
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self._wavs = {}
+
+    def play(self, pcm, duration):
+        wav = self._wavs.get(id(pcm))
+        if wav is None:
+            buffer = io.BytesIO()
+            with wave.open(buffer, 'wb') as w:
+                w.setnchannels(self.channels)
+                w.setsampwidth(2)
+                w.setframerate(self.sample_rate)
+                w.writeframes(pcm)
+            wav = self._wavs[id(pcm)] = buffer.getvalue()
+        self.winsound.PlaySound(wav, self.winsound.SND_MEMORY)
+
+    def close(self):
+        pass
+
+
+class _PipeOutput:
+    """One long-running command-line player reading raw PCM from stdin."""
+
+    COMMANDS = {
+        'aplay': lambda rate, ch: ['aplay', '-q', '-t', 'raw', '-f', 'S16_LE', '-r', str(rate), '-c', str(ch), '-'],
+        'pacat': lambda rate, ch: ['pacat', '--raw', '--format=s16le', f'--rate={rate}', f'--channels={ch}'],
+    }
+
+    def __init__(self, sample_rate, channels, command):
+        if not shutil.which(command):
+            raise OSError(f"{command} not found")
+        self.name = command
+        self.args = self.COMMANDS[command](sample_rate, channels)
+        self.proc = None
+        self._start()
+
+    def _start(self):
+        self.proc = subprocess.Popen(self.args, stdin=subprocess.PIPE,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def play(self, pcm, duration):
+        if self.proc.poll() is not None:
+            self._start()
+        self.proc.stdin.write(pcm)
+        self.proc.stdin.flush()
+        # The pipe accepts data faster than real time; wait for the clip so sounds don't pile up
+        time.sleep(duration)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=2)
+        except Exception:
+            self.proc.kill()
+
+
+def open_output(sample_rate, channels, preferred=None):
+    """Open the first available output backend, or return None."""
+    candidates = [preferred] if preferred else ['sounddevice', 'winsound' if sys.platform == 'win32' else 'aplay', 'pacat']
+    for backend in candidates:
+        try:
+            if backend == 'sounddevice':
+                return _SounddeviceOutput(sample_rate, channels)
+            if backend == 'winsound':
+                return _WinsoundOutput(sample_rate, channels)
+            return _PipeOutput(sample_rate, channels, backend)
+        except Exception:
+            continue
+    return None
+
+
+class SoundPlayer:
+    """Plays preloaded sounds one at a time from a priority queue.
+
+    Config keys (SOUND_CONFIG): backend (None = auto), priorities (animal ->
+    number, lower plays first; default 10), max_pending and the beep_* /
+    sample_rate / channels settings used by SoundBank.
+    """
+
+    def __init__(self, sound_files, config=None):
+        config = config or {}
+        self.bank = SoundBank(sound_files, config)
+        self.priorities = {k.lower(): v for k, v in config.get('priorities', {}).items()}
+        self.max_pending = config.get('max_pending', 4)
+        self.output = open_output(self.bank.sample_rate, self.bank.channels, config.get('backend'))
+        self._queue = queue.PriorityQueue()
+        self._pending = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.counters = {'played': 0, 'dropped': 0, 'failed': 0}
+        self.latency_avg = 0.0
+        self.latency_max = 0.0
+        self._thread = None
+        if self.output is None:
+            print("⚠️  Sound alert not available on this platform")
+        else:
+            print(f"🔊 Sound player ready ({self.output.name}, {len(self.bank.clips) - 1} sounds preloaded)")
+            self._thread = threading.Thread(target=self._run, name='sound-player', daemon=True)
+            self._thread.start()
+
+    @property
+    def available(self):
+        return self.output is not None
+
+    def play(self, animal_type=None):
+        """Queue the sound for an animal (beep if it has none); returns False if not queued."""
+        if self.output is None:
+            return False
+        name = (animal_type or BEEP).lower()
+        if name not in self.bank.clips:
+            name = BEEP
+        with self._lock:
+            if name in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.counters['dropped'] += 1
+                return False
+            self._pending.add(name)
+        self._queue.put((self.priorities.get(name, 10), next(self._seq), name, time.time()))
+        return True
+
+    def _run(self):
+        while True:
+            _, _, name, queued_at = self._queue.get()
+            if name is None:
+                return
+            with self._lock:
+                self._pending.discard(name)
+            pcm = self.bank.get(name)
+            latency = time.time() - queued_at
+            try:
+                self.output.play(pcm, self.bank.duration(pcm))
+                with self._lock:
+                    self.counters['played'] += 1
+                    self.latency_avg += 0.2 * (latency - self.latency_avg)
+                    self.latency_max = max(self.latency_max, latency)
+            except Exception as e:
+                with self._lock:
+                    self.counters['failed'] += 1
+                print(f"⚠️  Sound alert error: {e}")
+
+    def format_stats(self):
+        if self.output is None:
+            return 'sound: unavailable'
+        with self._lock:
+            c = dict(self.counters)
+            return (f"sound: {c['played']} played via {self.output.name}, start latency "
+                    f"{self.latency_avg * 1000:.0f}ms avg / {self.latency_max * 1000:.0f}ms max"
+                    + (f" (dropped={c['dropped']}, failed={c['failed']})" if c['dropped'] or c['failed'] else ''))
+
+    def close(self, timeout=2):
+        if self._thread is not None:
+            self._queue.put((-1, -1, None, 0.0))
+            self._thread.join(timeout)
+        if self.output is not None:
+            self.output.close()
@@ -116,9 +116,24 @@ def show_config():
         
         print("\n🎯 Detection Settings:")
         print(f"   Confidence Threshold: {DETECTION_CONFIG.get('confidence_threshold', 0.5)}")
-        print(f"   Alert Cooldown: {DETECTION_CONFIG.get('alert_cooldown', 60)}s")
+        print(f"   Detector Interval: every {DETECTION_CONFIG.get('detect_interval', 1)} frame(s)")
         print(f"   Camera Index: {DETECTION_CONFIG.get('camera_index', 0)}")
         print(f"   Save Images: {DETECTION_CONFIG.get('save_detection_images', True)}")
+        try:
+            from config import MODEL_CONFIG
+        except ImportError:
+            MODEL_CONFIG = {}
+        print(f"   Model: {MODEL_CONFIG.get('weights', 'yolov8n.pt')} "
+              f"({MODEL_CONFIG.get('backend', 'pytorch')}{', INT8' if MODEL_CONFIG.get('int8') else ''})")
+        
+        try:
+            from config import CAMERAS
+        except ImportError:
+            CAMERAS = []
+        if CAMERAS:
+            print(f"\n📷 Cameras ({len(CAMERAS)}):")
+            for cam in CAMERAS:
+                print(f"   {cam.get('id')}: {cam.get('source')} - {cam.get('location', 'Camera Feed')}")
         
         print(f"\n🐾 Target Animals ({len(TARGET_ANIMALS)}):")
         for i in range(0, len(TARGET_ANIMALS), 5):
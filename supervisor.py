@@ -0,0 +1,437 @@
+"""
+Supervisor for detection worker processes.
+
+Every worker is a detection_daemon.py process with its own control port and
+a fixed set of cameras. A camera belongs to at most one worker, and a user
+has at most one running session, so a second user can no longer take over
+(and orphan) someone else's detector. Limits and behaviour come from
+SUPERVISOR_CONFIG:
+
+- capacity: max(1, cpu_count * workers_per_core) live workers (or
+  max_workers), each limited to cpu_count // capacity inference threads so
+  the host is never oversubscribed
+- stopped sessions leave their worker idle and warm for idle_timeout
+  seconds; the next session on the same cameras reuses it, and idle workers
+  are evicted first when capacity is needed
+- a worker that dies during a session is restarted with exponential backoff
+  (restart_backoff doubling up to max_backoff) and its session resumed; after
+  max_restarts crashes without a stable_after period of health it is given up
+- every metrics_interval seconds each worker's CPU, RSS and frame rate are
+  sampled (psutil if installed, /proc otherwise)
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from itertools import count
+from multiprocessing.connection import Client
+
+from events import EventListener
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def process_usage(pid):
+    """Return (cpu_seconds, rss_bytes) of a process, or None if it cannot be read."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            times = proc.cpu_times()
+            return times.user + times.system, proc.memory_info().rss
+        except Exception:
+            return None
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            resident = int(f.read().split()[1])
+        ticks = os.sysconf('SC_CLK_TCK')
+        return (int(fields[11]) + int(fields[12])) / ticks, resident * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Worker:
+    """One detection daemon process and the session it is running."""
+
+    def __init__(self, index, camera_ids, host, port, authkey):
+        self.index = index
+        self.name = f'worker{index}'
+        self.camera_ids = tuple(camera_ids)
+        self.address = (host, port)
+        self.authkey = authkey
+        self.proc = None
+        self.state = 'booting'  # booting | idle | running | backoff | failed
+        self.session = None  # (user_id, sender_email, recipient_email) to run / resume
+        self.restarts = 0
+        self.next_restart = 0.0
+        self.started_at = 0.0
+        self.idle_since = time.time()
+        self.listener = None
+        self.metrics = {'cpu': 0.0, 'rss': 0, 'fps': 0.0, 'frames': 0, 'alerts': 0}
+        self._sample = None  # (time, cpu_seconds, frames)
+
+    @property
+    def user_id(self):
+        return self.session[0] if self.session else None
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def spawn(self, threads, log_dir):
+        env = os.environ.copy()
+        # No one watches a window on the server; skip display and overlay work
+        env['DETECTION_HEADLESS'] = '1'
+        env['DETECTION_CAMERAS'] = ','.join(self.camera_ids)
+        env['DETECTION_THREADS'] = str(threads)
+        os.makedirs(log_dir, exist_ok=True)
+        # The daemon logs to its own rotating file; this only catches output from
+        # before its logging is set up. Never a pipe nobody reads.
+        with open(os.path.join(log_dir, f'detection-startup-{self.name}.log'), 'wb') as startup_log:
+            self.proc = subprocess.Popen(
+                [sys.executable, 'detection_daemon.py', '--port', str(self.address[1]), '--name', self.name],
+                cwd=BASE_DIR,
+                stdin=subprocess.DEVNULL,
+                stdout=startup_log,
+                stderr=subprocess.STDOUT,
+                env=env
+            )
+        self.started_at = time.time()
+        self._sample = None
+
+    def request(self, request, timeout=None):
+        """Send one control request and return the reply; raises ConnectionError if unreachable."""
+        try:
+            with Client(self.address, authkey=self.authkey) as conn:
+                conn.send(request)
+                if timeout is not None and not conn.poll(timeout):
+                    raise ConnectionError(f"{self.name} did not answer")
+                return conn.recv()
+        except (OSError, EOFError) as e:
+            raise ConnectionError(f"{self.name} not reachable: {e}")
+
+    def wait_ready(self, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not self.alive:
+                raise RuntimeError(f"{self.name} exited with code {self.proc.returncode}")
+            try:
+                return self.request({'cmd': 'status'}, timeout=5)
+            except ConnectionError:
+                time.sleep(0.25)
+        raise RuntimeError(f"{self.name} did not become ready in time")
+
+    def begin_session(self, timeout):
+        user_id, sender_email, recipient_email = self.session
+        reply = self.request({'cmd': 'start', 'user_id': user_id, 'sender_email': sender_email,
+                              'recipient_email': recipient_email}, timeout=timeout)
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error', 'Detection could not be started'))
+        self.state = 'running'
+        return reply
+
+    def sample(self):
+        """Update CPU / RSS / FPS metrics."""
+        now = time.time()
+        usage = process_usage(self.proc.pid) if self.alive else None
+        frames = self.metrics['frames']
+        try:
+            current = (self.request({'cmd': 'status'}, timeout=2).get('session') or {})
+            if current.get('running'):
+                frames = current.get('frames', 0)
+                self.metrics['alerts'] = current.get('alerts', 0)
+        except ConnectionError:
+            pass
+        if usage is not None:
+            self.metrics['rss'] = usage[1]
+        if self._sample is not None and usage is not None:
+            then, cpu_then, frames_then = self._sample
+            elapsed = max(now - then, 1e-6)
+            self.metrics['cpu'] = (usage[0] - cpu_then) / elapsed
+            self.metrics['fps'] = max(0, frames - frames_then) / elapsed
+        self.metrics['frames'] = frames
+        if usage is not None:
+            self._sample = (now, usage[0], frames)
+
+    def status(self):
+        return {
+            'worker': self.name,
+            'pid': self.proc.pid if self.proc else None,
+            'state': self.state,
+            'user_id': self.user_id,
+            'cameras': list(self.camera_ids),
+            'port': self.address[1],
+            'restarts': self.restarts,
+            'uptime': time.time() - self.started_at if self.alive else 0.0,
+            'cpu': self.metrics['cpu'],
+            'rss_mb': self.metrics['rss'] / (1024 * 1024),
+            'fps': self.metrics['fps'],
+            'alerts': self.metrics['alerts'],
+        }
+
+    def terminate(self, timeout=10):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if not self.alive:
+            return
+        try:
+            self.request({'cmd': 'shutdown'}, timeout=5)
+        except ConnectionError:
+            self.proc.terminate()
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # Force kill if it does not exit on its own
+            self.proc.kill()
+            self.proc.wait()
+
+
+class Supervisor:
+    """Starts, reuses, restarts and measures detection workers."""
+
+    def __init__(self, camera_ids, config=None, daemon_config=None):
+        config = config or {}
+        daemon_config = daemon_config or {}
+        self.camera_ids = list(camera_ids)
+        cores = os.cpu_count() or 1
+        self.capacity = config.get('max_workers') or max(1, int(cores * config.get('workers_per_core', 0.5)))
+        self.threads_per_worker = config.get('threads_per_worker') or max(1, cores // self.capacity)
+        self.idle_timeout = config.get('idle_timeout', 600)
+        self.restart_backoff = config.get('restart_backoff', 1.0)
+        self.max_backoff = config.get('max_backoff', 60)
+        self.max_restarts = config.get('max_restarts', 5)
+        self.stable_after = config.get('stable_after', 60)
+        self.metrics_interval = config.get('metrics_interval', 5)
+        self.event_history = daemon_config.get('event_history', 50)
+        self.boot_timeout = daemon_config.get('boot_timeout', 120)
+        self.stop_timeout = daemon_config.get('stop_timeout', 15)
+        self.host = daemon_config.get('host', '127.0.0.1')
+        self.base_port = int(daemon_config.get('port', 6010))
+        self.authkey = str(daemon_config.get('authkey', 'animal-detection')).encode()
+        self.log_dir = os.path.join(BASE_DIR, os.path.dirname(daemon_config.get('log_file', 'logs/detection.log')))
+        self.workers = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, name='supervisor', daemon=True)
+        self._monitor.start()
+
+    # -- lookup --------------------------------------------------------------
+
+    def worker_for_user(self, user_id):
+        with self._lock:
+            for worker in self.workers.values():
+                if worker.user_id == user_id and worker.state in ('booting', 'running', 'backoff'):
+                    return worker
+        return None
+
+    def camera_owner(self, camera_id):
+        """user_id whose session is running on this camera, or None."""
+        with self._lock:
+            for worker in self.workers.values():
+                if camera_id in worker.camera_ids and worker.state == 'running':
+                    return worker.user_id
+        return None
+
+    def _free_index(self):
+        used = {w.index for w in self.workers.values()}
+        return next(i for i in count() if i not in used)
+
+    def _live_workers(self):
+        return [w for w in self.workers.values() if w.state != 'failed']
+
+    # -- sessions ------------------------------------------------------------
+
+    def start(self, user_id, camera_ids=None, sender_email=None, recipient_email=None):
+        """Start (or reuse a warm worker for) a user's session on the given cameras (default: all)."""
+        camera_ids = tuple(camera_ids or self.camera_ids)
+        unknown = [c for c in camera_ids if c not in self.camera_ids]
+        if unknown:
+            raise ValueError(f"Unknown camera: {', '.join(unknown)}")
+
+        with self._lock:
+            current = self.worker_for_user(user_id)
+            if current is not None:
+                if current.camera_ids == camera_ids:
+                    return {'ok': True, 'already_running': True, 'worker': current.status()}
+                raise RuntimeError("You already have detection running on other cameras")
+
+            for worker in self.workers.values():
+                busy = set(worker.camera_ids) & set(camera_ids)
+                if busy and worker.state in ('booting', 'running', 'backoff'):
+                    raise RuntimeError(f"Camera {', '.join(sorted(busy))} is in use by another user")
+
+            worker = next((w for w in self.workers.values()
+                           if w.state == 'idle' and w.camera_ids == camera_ids and w.alive), None)
+            if worker is None:
+                # Idle workers holding any of these cameras, then the longest-idle ones, make room
+                for other in list(self.workers.values()):
+                    if other.state == 'idle' and set(other.camera_ids) & set(camera_ids):
+                        self._retire(other, wait=True)
+                while len(self._live_workers()) >= self.capacity:
+                    idle = sorted((w for w in self.workers.values() if w.state == 'idle'),
+                                  key=lambda w: w.idle_since)
+                    if not idle:
+                        raise RuntimeError(f"All {self.capacity} detection workers are busy, try again later")
+                    self._retire(idle[0], wait=True)
+                for failed in [w for w in self.workers.values() if w.state == 'failed']:
+                    if set(failed.camera_ids) & set(camera_ids):
+                        self.workers.pop(failed.index, None)
+                index = self._free_index()
+                worker = Worker(index, camera_ids, self.host, self.base_port + 1 + index, self.authkey)
+                self.workers[index] = worker
+                worker.spawn(self.threads_per_worker, self.log_dir)
+            worker.state = 'booting'
+            worker.session = (user_id, sender_email, recipient_email)
+
+        # Model load / warm-up happen outside the lock so other users are not blocked
+        try:
+            worker.wait_ready(self.boot_timeout)
+            reply = worker.begin_session(self.stop_timeout + 10)
+        except Exception:
+            with self._lock:
+                worker.session = None
+                self._retire(worker)
+            raise
+        return dict(reply, worker=worker.status())
+
+    def stop(self, user_id):
+        """Stop the user's session; the worker stays warm for idle_timeout seconds."""
+        worker = self.worker_for_user(user_id)
+        if worker is None:
+            return {'ok': True, 'stopped': False}
+        with self._lock:
+            worker.session = None
+            if worker.state == 'backoff':
+                self._retire(worker)
+                return {'ok': True, 'stopped': True}
+        try:
+            reply = worker.request({'cmd': 'stop', 'user_id': user_id}, timeout=self.stop_timeout + 5)
+        except ConnectionError:
+            reply = {'ok': True, 'stopped': False}
+        with self._lock:
+            worker.state = 'idle'
+            worker.idle_since = time.time()
+        return reply
+
+    def status(self, user_id):
+        """The daemon status of the user's worker, or None."""
+        worker = self.worker_for_user(user_id)
+        if worker is None:
+            return None
+        try:
+            return dict(worker.request({'cmd': 'status'}, timeout=5), worker=worker.status())
+        except ConnectionError:
+            return {'ok': False, 'worker': worker.status()}
+
+    def events(self, user_id):
+        """Live event snapshot (events.EventListener) of the user's worker, or None."""
+        worker = self.worker_for_user(user_id)
+        if worker is None:
+            return None
+        if worker.listener is None:
+            # Same port after a restart, so the listener simply reconnects
+            worker.listener = EventListener(worker.address, worker.authkey, history=self.event_history)
+        return worker.listener.snapshot(user_id)
+
+    def workers_status(self):
+        with self._lock:
+            workers = [w.status() for w in self.workers.values()]
+        return {'capacity': self.capacity, 'threads_per_worker': self.threads_per_worker, 'workers': workers}
+
+    # -- lifecycle -----------------------------------------------------------
+
+    def _retire(self, worker, wait=False):
+        """Forget a worker and shut its process down (in the background unless `wait`)."""
+        self.workers.pop(worker.index, None)
+        if wait:
+            # The cameras must be released before another worker opens them
+            worker.terminate(self.stop_timeout)
+        else:
+            threading.Thread(target=worker.terminate, args=(self.stop_timeout,),
+                             name=f'retire-{worker.name}', daemon=True).start()
+
+    def _schedule_restart(self, worker, now):
+        worker.restarts += 1
+        if worker.restarts > self.max_restarts:
+            worker.state = 'failed'
+            print(f"❌ {worker.name} crashed {worker.restarts - 1} times, giving up on user {worker.user_id}")
+            return
+        delay = min(self.max_backoff, self.restart_backoff * 2 ** (worker.restarts - 1))
+        worker.state = 'backoff'
+        worker.next_restart = now + delay
+        code = worker.proc.returncode if worker.proc else None
+        print(f"⚠️  {worker.name} exited with code {code}, restarting in {delay:.0f}s")
+
+    def _restart(self, worker):
+        try:
+            worker.spawn(self.threads_per_worker, self.log_dir)
+            worker.wait_ready(self.boot_timeout)
+            if worker.session is not None:
+                worker.begin_session(self.stop_timeout + 10)
+                print(f"🔁 {worker.name} restarted, session for user {worker.user_id} resumed")
+            else:
+                worker.state = 'idle'
+                worker.idle_since = time.time()
+        except Exception as e:
+            print(f"⚠️  Restarting {worker.name} failed: {e}")
+            if worker.alive:
+                worker.proc.kill()
+                worker.proc.wait()
+            with self._lock:
+                if self.workers.get(worker.index) is worker:
+                    self._schedule_restart(worker, time.time())
+
+    def _check(self, worker, now):
+        if worker.state in ('failed', 'booting'):
+            # Boot failures are handled by start() / _restart()
+            return
+        if worker.state == 'backoff':
+            if now >= worker.next_restart:
+                worker.state = 'booting'
+                threading.Thread(target=self._restart, args=(worker,), name=f'restart-{worker.name}',
+                                 daemon=True).start()
+            return
+        if worker.alive:
+            if worker.restarts and now - worker.started_at > self.stable_after:
+                worker.restarts = 0
+            if worker.state == 'idle' and now - worker.idle_since > self.idle_timeout:
+                print(f"💤 {worker.name} idle for {self.idle_timeout}s, shutting it down")
+                self._retire(worker)
+            return
+
+        # The process died on its own
+        if worker.session is None:
+            self.workers.pop(worker.index, None)
+            return
+        self._schedule_restart(worker, now)
+
+    def _monitor_loop(self):
+        last_metrics = 0.0
+        while not self._stop.wait(1.0):
+            now = time.time()
+            with self._lock:
+                workers = list(self.workers.values())
+                for worker in workers:
+                    self._check(worker, now)
+            if now - last_metrics >= self.metrics_interval:
+                last_metrics = now
+                for worker in workers:
+                    if worker.alive and worker.state in ('idle', 'running'):
+                        worker.sample()
+
+    def shutdown(self):
+        """Stop every worker (used when the web app exits)."""
+        self._stop.set()
+        with self._lock:
+            workers = list(self.workers.values())
+            self.workers = {}
+        for worker in workers:
+            worker.terminate()
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the database at a scratch file before anything imports database.py
+import config
+
+_tmp = tempfile.mkdtemp(prefix='wildlife-tests-')
+config.DATABASE_CONFIG['path'] = os.path.join(_tmp, 'test.db')
+config.DATABASE_CONFIG['write_buffer'] = {'enabled': False}
+config.DATABASE_CONFIG['slow_query_ms'] = 0
+
+import database
+
+TABLES = ['detections', 'alerts', 'detection_counts_hourly', 'detection_counts_daily', 'archive_segments']
+
+
+@pytest.fixture
+def db():
+    """The database module on an emptied test database."""
+    database.ensure_ready()
+    with database.pool.connection() as conn:
+        for table in TABLES:
+            conn.execute(f'DELETE FROM {table}')
+        conn.commit()
+    return database
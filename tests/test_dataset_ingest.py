@@ -0,0 +1,151 @@
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from PIL import Image
+
+from dataset_ingest import DatasetIngestor, _safe_member_path, validate_image
+
+
+def _png(color, size=(64, 64)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return str(path)
+
+
+def _files(folder):
+    return sorted(os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/')
+                  for root, _, names in os.walk(folder) for name in names if not name.startswith('.'))
+
+
+@pytest.fixture
+def ingest(tmp_path):
+    """Run one ZIP through a fresh ingestor and return the finished job."""
+    ingestors = []
+
+    def run(zip_path, config=None, folder=tmp_path / 'dataset'):
+        ingestor = DatasetIngestor(str(folder), dict({'workers': 1}, **(config or {})))
+        ingestors.append(ingestor)
+        job = ingestor.submit(zip_path, os.path.basename(zip_path))
+        deadline = time.time() + 60
+        while job.state not in ('done', 'failed'):
+            assert time.time() < deadline, 'ingestion did not finish'
+            time.sleep(0.05)
+        return job
+
+    yield run
+    for ingestor in ingestors:
+        ingestor.close()
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('deer/001.jpg', 'deer/001.jpg'),
+    ('deer\\002.jpg', 'deer/002.jpg'),
+    ('deer/./003.jpg', 'deer/003.jpg'),
+    ('../escape.jpg', None),
+    ('deer/../../escape.jpg', None),
+    ('/etc/passwd.jpg', None),
+    ('C:/Windows/x.jpg', None),
+    ('__MACOSX/deer/._001.jpg', None),
+    ('deer/.hidden.jpg', None),
+])
+def test_safe_member_path(name, expected):
+    assert _safe_member_path(name) == expected
+
+
+def test_validate_image():
+    assert validate_image(_png('red'))[0]
+    assert validate_image(_png('red', (8, 8)), min_size=32) == (False, 'too small (8x8)')
+    assert validate_image(_png('red', (200, 200)), max_pixels=10_000) == (False, 'too large (200x200)')
+    assert not validate_image(b'not an image')[0]
+
+
+def test_ingest_adds_new_images_and_skips_the_rest(tmp_path, ingest):
+    dataset = tmp_path / 'dataset'
+    (dataset / 'fox').mkdir(parents=True)
+    (dataset / 'fox' / 'existing.png').write_bytes(_png('blue'))
+    zip_path = _zip(tmp_path / 'upload.zip', {
+        'deer/a.png': _png('red'),
+        'deer/copy-of-a.png': _png('red'),
+        'fox/same-as-existing.png': _png('blue'),
+        'fox/b.png': _png('green'),
+        'tiny/c.png': _png('yellow', (8, 8)),
+        'broken/d.jpg': b'not an image',
+        'readme.txt': b'hello',
+        '../escape.png': _png('black'),
+    })
+
+    job = ingest(zip_path)
+
+    assert job.state == 'done', job.error
+    assert job.counts == {'members': 8, 'processed': 8, 'added': 2, 'duplicates': 2, 'invalid': 2, 'skipped': 2}
+    assert _files(dataset) == ['deer/a.png', 'fox/b.png', 'fox/existing.png']
+    assert not os.path.exists(tmp_path / 'escape.png')
+    assert not os.path.exists(zip_path)
+
+
+def test_reupload_is_all_duplicates(tmp_path, ingest):
+    members = {'deer/a.png': _png('red'), 'deer/b.png': _png('green')}
+    assert ingest(_zip(tmp_path / 'first.zip', members)).counts['added'] == 2
+
+    # Renamed files with the same content are still found through the hash index
+    job = ingest(_zip(tmp_path / 'second.zip', {'other/' + name.split('/')[1]: data
+                                                 for name, data in members.items()}))
+
+    assert job.counts['added'] == 0
+    assert job.counts['duplicates'] == 2
+    assert _files(tmp_path / 'dataset') == ['deer/a.png', 'deer/b.png']
+
+
+def test_same_name_different_content_keeps_both(tmp_path, ingest):
+    ingest(_zip(tmp_path / 'first.zip', {'deer/a.png': _png('red')}))
+    job = ingest(_zip(tmp_path / 'second.zip', {'deer/a.png': _png('green')}))
+
+    assert job.counts['added'] == 1
+    files = _files(tmp_path / 'dataset')
+    assert len(files) == 2 and 'deer/a.png' in files
+
+
+def test_zip_bomb_is_refused_before_extraction(tmp_path, ingest):
+    zip_path = _zip(tmp_path / 'bomb.zip', {'deer/a.png': _png('red'), 'deer/bomb.png': b'\0' * (5 * 1024 * 1024)})
+
+    job = ingest(zip_path, {'max_ratio': 100})
+
+    assert job.state == 'failed'
+    assert 'zip bomb' in job.error
+    assert _files(tmp_path / 'dataset') == []
+
+
+@pytest.mark.parametrize('config, message', [
+    ({'max_files': 2}, 'Too many files'),
+    ({'max_total_mb': 0.0001}, 'expands to'),
+])
+def test_archive_limits(tmp_path, ingest, config, message):
+    zip_path = _zip(tmp_path / 'big.zip', {f'deer/{i}.png': _png((i, 0, 0)) for i in range(3)},
+                    compression=zipfile.ZIP_STORED)
+
+    job = ingest(zip_path, config)
+
+    assert job.state == 'failed'
+    assert message in job.error
+
+
+def test_oversized_member_is_rejected(tmp_path, ingest):
+    big = _png('red', (1024, 1024))
+    zip_path = _zip(tmp_path / 'upload.zip', {'deer/big.png': big, 'deer/small.png': _png('green')},
+                    compression=zipfile.ZIP_STORED)
+
+    job = ingest(zip_path, {'max_file_mb': len(big) / (1024 * 1024) / 2})
+
+    assert job.state == 'done'
+    assert job.counts['invalid'] == 1
+    assert _files(tmp_path / 'dataset') == ['deer/small.png']
@@ -0,0 +1,83 @@
+import pytest
+
+
+def _add_detections(db, user_id, rows):
+    db.write_rows('add_detection', [(user_id, animal, 'garden', ts) for animal, ts in rows])
+
+
+def _walk(fetch, **kwargs):
+    """Every row of every page, following the cursors."""
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = fetch(cursor=cursor, **kwargs)
+        rows.extend(page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_cursor_round_trip(db):
+    cursor = db.encode_cursor({'timestamp': '2024-05-01 12:00:00', 'id': 42})
+    assert '=' not in cursor
+    assert db.decode_cursor(cursor) == ('2024-05-01 12:00:00', 42)
+
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'bm9waXBl', '!!!'])
+def test_decode_cursor_rejects_garbage(db, cursor):
+    with pytest.raises(ValueError):
+        db.decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once(db):
+    # Many rows share a timestamp, so the id has to break ties between pages
+    rows = [('deer' if i % 3 else 'fox', f'2024-05-{1 + i // 10:02d} 08:00:00') for i in range(95)]
+    _add_detections(db, 1, rows)
+    _add_detections(db, 2, [('bear', '2024-05-03 08:00:00')])
+
+    seen, pages = _walk(lambda **kw: db.get_detections_page(1, limit=10, **kw))
+
+    assert pages == 10
+    assert len(seen) == 95
+    assert len({row['id'] for row in seen}) == 95
+    keys = [(row['timestamp'], row['id']) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_last_page_has_no_cursor(db):
+    _add_detections(db, 1, [('deer', '2024-05-01 08:00:00')] * 10)
+    rows, cursor = db.get_detections_page(1, limit=10)
+    assert len(rows) == 10
+    assert cursor is None
+
+
+def test_filters_apply_on_every_page(db):
+    rows = [('fox' if i % 2 else 'deer', f'2024-05-{1 + i:02d} 08:00:00') for i in range(20)]
+    _add_detections(db, 1, rows)
+
+    foxes, _ = _walk(lambda **kw: db.get_detections_page(1, limit=3, animal_type='fox', **kw))
+    assert len(foxes) == 10
+    assert {row['animal_type'] for row in foxes} == {'fox'}
+
+    ranged, _ = _walk(lambda **kw: db.get_detections_page(1, limit=3, since='2024-05-05', until='2024-05-10', **kw))
+    assert [row['timestamp'][:10] for row in ranged] == [f'2024-05-{d:02d}' for d in range(9, 4, -1)]
+
+
+def test_new_rows_do_not_shift_later_pages(db):
+    _add_detections(db, 1, [('deer', f'2024-05-01 08:00:{s:02d}') for s in range(20)])
+    first, cursor = db.get_detections_page(1, limit=5)
+    # A detection arriving between two page loads must not repeat or skip rows
+    _add_detections(db, 1, [('fox', '2024-06-01 08:00:00')])
+    second, _ = db.get_detections_page(1, cursor=cursor, limit=5)
+    assert [row['timestamp'] for row in second] == [f'2024-05-01 08:00:{s:02d}' for s in range(14, 9, -1)]
+    assert not {row['id'] for row in first} & {row['id'] for row in second}
+
+
+def test_alerts_page(db):
+    db.write_rows('add_alert', [(1, f'alert {i}', 'warning' if i % 2 else 'info', f'2024-05-01 08:{i:02d}:00')
+                                for i in range(7)])
+    seen, pages = _walk(lambda **kw: db.get_alerts_page(1, limit=3, **kw))
+    assert pages == 3
+    assert [row['message'] for row in seen] == [f'alert {i}' for i in range(6, -1, -1)]
+
+    warnings, _ = db.get_alerts_page(1, alert_type='warning')
+    assert [row['message'] for row in warnings] == ['alert 5', 'alert 3', 'alert 1']
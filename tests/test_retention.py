@@ -0,0 +1,124 @@
+import gzip
+import json
+import os
+import time
+
+import pytest
+
+import retention
+
+
+@pytest.fixture
+def worker(db, tmp_path):
+    config = {'archive_dir': str(tmp_path / 'archive'), 'batch_size': 3, 'segment_rows': 5, 'pause': 0,
+              'vacuum_pages': 8, 'images_max_age_days': None, 'images_max_mb': None}
+    return retention.RetentionWorker(config, images_folder=str(tmp_path / 'detections'))
+
+
+def _detections(db):
+    with db.pool.connection() as conn:
+        return [dict(row) for row in conn.execute('SELECT * FROM detections ORDER BY timestamp, id')]
+
+
+def _add(db, days, user_id=1):
+    db.write_rows('add_detection', [(user_id, 'deer', 'garden', f'2024-05-{day:02d} 08:00:00') for day in days])
+
+
+def test_archive_moves_old_rows_without_loss_or_duplicates(db, worker):
+    _add(db, range(1, 21))
+    _add(db, range(1, 5), user_id=2)
+    before = _detections(db)
+
+    archived = worker.archive('detections', cutoff='2024-05-11')
+
+    old = [row for row in before if row['timestamp'] < '2024-05-11']
+    assert archived == len(old) == 14
+    assert _detections(db) == [row for row in before if row['timestamp'] >= '2024-05-11']
+    assert sorted(retention.query_archive('detections'), key=lambda r: r['id']) == sorted(old, key=lambda r: r['id'])
+    # segment_rows=5: the 14 rows are spread over several segments
+    with db.pool.connection() as conn:
+        segments = conn.execute("SELECT rows FROM archive_segments WHERE table_name = 'detections'").fetchall()
+    assert sum(row[0] for row in segments) == 14
+    assert len(segments) > 1
+
+
+def test_archive_keeps_rollups(db, worker):
+    _add(db, range(1, 11))
+    totals = db.get_detection_totals(user_id=1)
+
+    worker.archive('detections', cutoff='2024-05-06')
+    db.rebuild_rollups()
+
+    assert db.get_detection_totals(user_id=1) == totals
+
+
+def test_query_archive_filters(db, worker):
+    _add(db, range(1, 11))
+    _add(db, range(1, 11), user_id=2)
+    worker.archive('detections', cutoff='2024-06-01')
+
+    rows = list(retention.query_archive('detections', user_id=2, since='2024-05-03', until='2024-05-06'))
+
+    assert [(row['user_id'], row['timestamp'][:10]) for row in rows] == [
+        (2, '2024-05-03'), (2, '2024-05-04'), (2, '2024-05-05')]
+    with pytest.raises(ValueError):
+        list(retention.query_archive('users'))
+
+
+def test_query_archive_ignores_uncommitted_lines(db, worker):
+    _add(db, range(1, 4))
+    archived = [row['id'] for row in _detections(db)]
+    worker.archive('detections', cutoff='2024-06-01')
+    with db.pool.connection() as conn:
+        path = conn.execute('SELECT path FROM archive_segments').fetchone()[0]
+    # A crash between writing the file and deleting the rows leaves extra lines behind
+    with gzip.open(path, 'ab') as f:
+        f.write((json.dumps({'id': 999, 'user_id': 1, 'timestamp': '2024-05-02 09:00:00'}) + '\n').encode())
+
+    assert sorted(row['id'] for row in retention.query_archive('detections')) == archived
+
+
+def test_archive_without_matching_rows_leaves_no_segment(db, worker):
+    _add(db, range(10, 12))
+    assert worker.archive('detections', cutoff='2024-05-01') == 0
+    with db.pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM archive_segments').fetchone()[0] == 0
+    assert [name for name in os.listdir(worker.archive_dir) if name.endswith('.gz')] == []
+
+
+def test_vacuum_frees_the_whole_freelist(db, worker):
+    db.write_rows('add_alert', [(1, 'x' * 2000, 'info', f'2024-05-01 08:00:{i % 60:02d}') for i in range(300)])
+    with db.pool.connection() as conn:
+        assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+        conn.execute('DELETE FROM alerts')
+        conn.commit()
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    assert free > worker.config['vacuum_pages']
+
+    assert worker.vacuum() == free
+    with db.pool.connection() as conn:
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+
+
+def _image(folder, name, size, age_days):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    used = time.time() - age_days * 86400
+    os.utime(path, (used, used))
+    return path
+
+
+def test_evict_images_by_age_then_least_recently_used(worker):
+    folder = worker.images_folder
+    _image(folder, 'ancient.jpg', 1024, 90)
+    _image(folder, 'old.jpg', 512 * 1024, 20)
+    _image(folder, 'older.png', 512 * 1024, 30)
+    _image(folder, 'new.jpg', 512 * 1024, 1)
+    _image(folder, 'notes.txt', 1024, 90)
+    worker.config.update(images_max_age_days=60, images_max_mb=1)
+
+    assert worker.evict_images() == 2
+
+    assert sorted(os.listdir(folder)) == ['new.jpg', 'notes.txt', 'old.jpg']
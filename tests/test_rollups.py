@@ -0,0 +1,113 @@
+from collections import Counter
+
+import pytest
+
+ROWS = [
+    (1, 'deer', 'garden', '2024-05-01 08:10:00'),
+    (1, 'deer', 'garden', '2024-05-01 08:50:00'),
+    (1, 'deer', None, '2024-05-01 09:05:00'),
+    (1, 'fox', 'garden', '2024-05-02 22:00:00'),
+    (1, 'fox', 'field', '2024-05-03 01:00:00'),
+    (2, 'deer', 'field', '2024-05-01 08:20:00'),
+]
+
+
+def _counts(db, period):
+    with db.pool.connection() as conn:
+        rows = conn.execute(f'SELECT user_id, bucket, animal_type, location, count FROM detection_counts_{period}')
+        return {tuple(row[:4]): row[4] for row in rows}
+
+
+def test_trigger_counts_every_insert(db):
+    db.write_rows('add_detection', ROWS)
+
+    assert _counts(db, 'hourly') == {
+        (1, '2024-05-01 08:00:00', 'deer', 'garden'): 2,
+        (1, '2024-05-01 09:00:00', 'deer', ''): 1,
+        (1, '2024-05-02 22:00:00', 'fox', 'garden'): 1,
+        (1, '2024-05-03 01:00:00', 'fox', 'field'): 1,
+        (2, '2024-05-01 08:00:00', 'deer', 'field'): 1,
+    }
+    assert _counts(db, 'daily') == {
+        (1, '2024-05-01', 'deer', 'garden'): 2,
+        (1, '2024-05-01', 'deer', ''): 1,
+        (1, '2024-05-02', 'fox', 'garden'): 1,
+        (1, '2024-05-03', 'fox', 'field'): 1,
+        (2, '2024-05-01', 'deer', 'field'): 1,
+    }
+
+
+def test_rebuild_matches_trigger(db):
+    db.write_rows('add_detection', ROWS)
+    expected = {period: _counts(db, period) for period in ('hourly', 'daily')}
+
+    db.rebuild_rollups()
+
+    assert {period: _counts(db, period) for period in ('hourly', 'daily')} == expected
+
+
+def test_rebuild_fixes_hand_edits(db):
+    db.write_rows('add_detection', ROWS)
+    with db.pool.connection() as conn:
+        conn.execute("DELETE FROM detections WHERE animal_type = 'fox'")
+        conn.commit()
+
+    db.rebuild_rollups()
+
+    totals = {row['animal_type']: row['count'] for row in db.get_detection_totals(user_id=1)}
+    assert totals == {'deer': 3}
+
+
+def test_rebuild_since_recounts_whole_buckets_only_from_there(db):
+    db.write_rows('add_detection', ROWS)
+    with db.pool.connection() as conn:
+        conn.execute("UPDATE detection_counts_daily SET count = 99 WHERE bucket = '2024-05-01'")
+        conn.execute("UPDATE detection_counts_daily SET count = 99 WHERE bucket = '2024-05-02'")
+        conn.commit()
+
+    # Mid-day `since`: the whole 2024-05-02 bucket is recounted, 2024-05-01 is left alone
+    db.rebuild_rollups(since='2024-05-02 12:00:00')
+
+    daily = _counts(db, 'daily')
+    assert daily[(1, '2024-05-02', 'fox', 'garden')] == 1
+    assert daily[(1, '2024-05-01', 'deer', 'garden')] == 99
+
+
+def test_rebuild_keeps_archived_buckets(db):
+    db.write_rows('add_detection', ROWS)
+    expected = _counts(db, 'hourly')
+    # What retention.py does: record the segment, then delete the archived rows
+    with db.pool.connection() as conn:
+        conn.execute("INSERT INTO archive_segments (table_name, path, first_ts, last_ts, rows) "
+                     "VALUES ('detections', '/nonexistent', '2024-05-01 08:10:00', '2024-05-01 08:50:00', 3)")
+        conn.execute("DELETE FROM detections WHERE timestamp <= '2024-05-01 08:50:00'")
+        conn.commit()
+
+    db.rebuild_rollups()
+
+    assert _counts(db, 'hourly') == expected
+    assert _counts(db, 'daily')[(1, '2024-05-01', 'deer', 'garden')] == 2
+
+
+def test_trend_and_totals_read_the_rollups(db):
+    db.write_rows('add_detection', ROWS)
+
+    trend = db.get_detection_trend(user_id=1, period='daily')
+    assert [(row['bucket'], row['animal_type'], row['count']) for row in trend] == [
+        ('2024-05-01', 'deer', 3), ('2024-05-02', 'fox', 1), ('2024-05-03', 'fox', 1)]
+
+    everyone = Counter()
+    for row in db.get_detection_trend(period='hourly', since='2024-05-01 08:00:00', until='2024-05-01 09:00:00'):
+        everyone[row['animal_type']] += row['count']
+    assert everyone == {'deer': 3}
+
+    by_location = {row['location']: row['count']
+                   for row in db.get_detection_totals(since='2024-05-01', until='2024-05-03', group_by='location')}
+    assert by_location == {'garden': 3, 'field': 1, '': 1}
+
+
+def test_unknown_period_and_grouping(db):
+    with pytest.raises(ValueError):
+        db.get_detection_trend(period='weekly')
+    with pytest.raises(ValueError):
+        db.get_detection_totals(group_by='user_id')
@@ -0,0 +1,174 @@
+"""
+Lightweight IoU / centroid multi-object tracker.
+
+Each camera has its own Tracker. Detections from the model are matched to
+existing tracks greedily by IoU (same class only), with a centroid-distance
+fallback for fast movers or frames skipped between detector runs. Every
+track keeps a persistent ID so alerts, database rows and saved images can be
+produced once per animal instead of once per cooldown window. Between
+detector runs tracks coast on a constant-velocity estimate of their box.
+"""
+
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from postprocess import CLS, CONF, DETECTION_COLUMNS, EMPTY_DETECTIONS
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of [x1, y1, x2, y2] boxes."""
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Track:
+    """One tracked animal."""
+
+    __slots__ = ('track_id', 'cls', 'conf', 'box', 'velocity', 'hits', 'misses',
+                 'first_seen', 'last_seen', 'alerted')
+
+    def __init__(self, track_id, detection, now):
+        self.track_id = track_id
+        self.cls = int(detection[CLS])
+        self.conf = float(detection[CONF])
+        self.box = detection[:4].astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.hits = 1
+        self.misses = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.alerted = False
+
+    def update(self, detection, now):
+        box = detection[:4].astype(np.float32)
+        dt = max(now - self.last_seen, 1e-3)
+        # Smoothed per-second velocity of the box corners
+        self.velocity = 0.5 * self.velocity + 0.5 * (box - self.box) / dt
+        self.box = box
+        self.conf = float(detection[CONF])
+        self.hits += 1
+        self.misses = 0
+        self.last_seen = now
+
+    def predicted_box(self, now):
+        return self.box + self.velocity * min(now - self.last_seen, 1.0)
+
+    def as_detection(self, now):
+        row = np.empty(DETECTION_COLUMNS, dtype=np.float32)
+        row[:4] = self.predicted_box(now)
+        row[CONF] = self.conf
+        row[CLS] = self.cls
+        return row
+
+
+class Tracker:
+    """Assigns persistent track IDs to per-frame detections of one camera.
+
+    Config keys (TRACKER_CONFIG): iou_threshold, centroid_threshold (fraction
+    of the track's box diagonal), min_hits before a track is reported,
+    max_misses (detector runs without a match) and max_age (seconds without
+    a match) before a track is dropped.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.iou_threshold = config.get('iou_threshold', 0.3)
+        self.centroid_threshold = config.get('centroid_threshold', 0.5)
+        self.min_hits = config.get('min_hits', 1)
+        self.max_misses = config.get('max_misses', 5)
+        self.max_age = config.get('max_age', 30)
+        self.tracks = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _match(self, detections):
+        """Greedy matching; returns (pairs, unmatched track indices, unmatched detection indices)."""
+        if not self.tracks or len(detections) == 0:
+            return [], list(range(len(self.tracks))), list(range(len(detections)))
+
+        track_boxes = np.array([t.box for t in self.tracks], dtype=np.float32)
+        track_cls = np.array([t.cls for t in self.tracks])
+        same_class = track_cls[:, None] == detections[None, :, CLS].astype(int)
+
+        iou = np.where(same_class, iou_matrix(track_boxes, detections[:, :4]), 0.0)
+
+        # Centroid distance relative to the track's box diagonal, for boxes that moved apart
+        track_centres = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        det_centres = (detections[:, :2] + detections[:, 2:4]) / 2
+        diag = np.linalg.norm(track_boxes[:, 2:] - track_boxes[:, :2], axis=1)
+        dist = np.linalg.norm(track_centres[:, None, :] - det_centres[None, :, :], axis=2)
+        dist = np.where(same_class, dist / np.maximum(diag[:, None], 1.0), np.inf)
+
+        pairs = []
+        free_tracks = set(range(len(self.tracks)))
+        free_dets = set(range(len(detections)))
+        for ti, di in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[ti, di] < self.iou_threshold:
+                break
+            if ti in free_tracks and di in free_dets:
+                pairs.append((ti, di))
+                free_tracks.discard(ti)
+                free_dets.discard(di)
+        for ti, di in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+            if dist[ti, di] > self.centroid_threshold:
+                break
+            if ti in free_tracks and di in free_dets:
+                pairs.append((ti, di))
+                free_tracks.discard(ti)
+                free_dets.discard(di)
+        return pairs, sorted(free_tracks), sorted(free_dets)
+
+    def update(self, detections, now=None):
+        """Feed the detector output for a frame; returns (detections, track_ids) of visible tracks."""
+        now = time.time() if now is None else now
+        with self._lock:
+            pairs, lost, new = self._match(detections)
+            for ti, di in pairs:
+                self.tracks[ti].update(detections[di], now)
+            for ti in lost:
+                self.tracks[ti].misses += 1
+            for di in new:
+                self.tracks.append(Track(next(self._ids), detections[di], now))
+            self.tracks = [
+                t for t in self.tracks
+                if t.misses <= self.max_misses and now - t.last_seen <= self.max_age
+            ]
+            visible = [t for t in self.tracks if t.misses == 0 and t.hits >= self.min_hits]
+            return self._report(visible, now)
+
+    def coast(self, now=None):
+        """Report tracks for a frame the detector skipped, at their predicted positions."""
+        now = time.time() if now is None else now
+        with self._lock:
+            visible = [t for t in self.tracks if t.misses == 0 and t.hits >= self.min_hits]
+            return self._report(visible, now)
+
+    def _report(self, tracks, now):
+        if not tracks:
+            return EMPTY_DETECTIONS, np.empty(0, dtype=np.int64)
+        detections = np.stack([t.as_detection(now) for t in tracks])
+        return detections, np.array([t.track_id for t in tracks], dtype=np.int64)
+
+    def claim_alert(self, track_id):
+        """Return True exactly once per track, the first time an alert is requested for it."""
+        with self._lock:
+            for t in self.tracks:
+                if t.track_id == track_id:
+                    if t.alerted:
+                        return False
+                    t.alerted = True
+                    return True
+            return False
+
+    def __len__(self):
+        with self._lock:
+            return len(self.tracks)
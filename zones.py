@@ -0,0 +1,114 @@
+"""
+Region-of-interest zones and tiled inference for a camera.
+
+Zones are polygons given in normalized coordinates (0.0-1.0 of the frame
+width/height) so they survive resolution changes. Inference only runs on the
+bounding rectangle of each zone; large regions can be cut into overlapping
+tiles that are fed to the model at native resolution, which keeps small
+animals at the far fence line from being shrunk away. Detections whose
+bottom-centre point (where the animal stands) lies outside every zone are
+dropped.
+"""
+
+import cv2
+import numpy as np
+
+from postprocess import X1, X2, Y2
+
+
+class Region:
+    """A rectangle of the frame that is sent to the model as one image."""
+
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'native')
+
+    def __init__(self, x0, y0, x1, y1, native=False):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        # Tiles are inferred at native resolution; other regions are downscaled to fit
+        self.native = native
+
+    def crop(self, frame):
+        return frame[self.y0:self.y1, self.x0:self.x1]
+
+
+def tile_range(start, stop, tile, overlap):
+    """Return evenly spaced tile offsets covering [start, stop) with at least `overlap` pixels shared."""
+    length = stop - start
+    if length <= tile:
+        return [start]
+    step = max(1, tile - overlap)
+    count = int(np.ceil((length - tile) / step)) + 1
+    return [int(round(v)) for v in np.linspace(start, stop - tile, count)]
+
+
+class ZoneLayout:
+    """Zones, regions and tiling for one camera.
+
+    `camera` is an entry from config.CAMERAS (optional 'zones', 'tile_size',
+    'tile_overlap'); `defaults` is DETECTION_CONFIG.
+    """
+
+    def __init__(self, camera, defaults):
+        self.zones = [np.asarray(z, dtype=np.float32) for z in camera.get('zones') or [] if len(z) >= 3]
+        self.tile_size = int(camera.get('tile_size', defaults.get('tile_size', 0)) or 0)
+        self.tile_overlap = float(camera.get('tile_overlap', defaults.get('tile_overlap', 0.2)))
+        self._shape = None
+        self._regions = None
+        self._mask = None
+        self._polygons = None
+
+    @property
+    def has_zones(self):
+        return bool(self.zones)
+
+    def _build(self, frame_shape):
+        h, w = frame_shape[:2]
+        self._shape = (h, w)
+        scale = np.array([w, h], dtype=np.float32)
+        self._polygons = [np.round(z * scale).astype(np.int32) for z in self.zones]
+
+        if self._polygons:
+            self._mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(self._mask, self._polygons, 255)
+            rects = []
+            for poly in self._polygons:
+                x, y, rw, rh = cv2.boundingRect(poly)
+                rects.append((max(0, x), max(0, y), min(w, x + rw), min(h, y + rh)))
+        else:
+            self._mask = None
+            rects = [(0, 0, w, h)]
+
+        regions = []
+        for x0, y0, x1, y1 in rects:
+            if x1 <= x0 or y1 <= y0:
+                continue
+            if self.tile_size and (x1 - x0 > self.tile_size or y1 - y0 > self.tile_size):
+                tile_w = min(self.tile_size, x1 - x0)
+                tile_h = min(self.tile_size, y1 - y0)
+                overlap = int(self.tile_size * self.tile_overlap)
+                for ty in tile_range(y0, y1, tile_h, overlap):
+                    for tx in tile_range(x0, x1, tile_w, overlap):
+                        regions.append(Region(tx, ty, tx + tile_w, ty + tile_h, native=True))
+            else:
+                regions.append(Region(x0, y0, x1, y1))
+        self._regions = regions
+
+    def regions(self, frame_shape):
+        """Return the list of Regions to infer for a frame of this shape."""
+        if self._shape != tuple(frame_shape[:2]):
+            self._build(frame_shape)
+        return self._regions
+
+    def polygons(self, frame_shape):
+        """Zone polygons in pixel coordinates, for drawing."""
+        self.regions(frame_shape)
+        return self._polygons
+
+    def filter(self, detections, frame_shape):
+        """Drop detections whose bottom-centre point lies outside every zone."""
+        if not self.zones or len(detections) == 0:
+            return detections
+        self.regions(frame_shape)
+        h, w = self._shape
+        cx = np.clip(((detections[:, X1] + detections[:, X2]) / 2).astype(np.intp), 0, w - 1)
+        cy = np.clip((detections[:, Y2] - 1).astype(np.intp), 0, h - 1)
+        return detections[self._mask[cy, cx] > 0]